@@ -0,0 +1,109 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils import timezone
+
+from .importing import chunked, iter_records
+from .models import Invitation, OutboundEmail
+from .outbox import queue_emails
+from .stats import invitation_tenants, move_count
+
+CHUNK_SIZE = 1000
+
+INVITATION_SUBJECTS = {
+    Invitation.InvitationType.FREIGHT_ADMIN: 'Invitation to Join Freight Company',
+    Invitation.InvitationType.END_CUSTOMER_ADMIN: 'Invitation to Join End Customer',
+    Invitation.InvitationType.END_CUSTOMER_STAFF: 'Invitation to Join End Customer',
+}
+
+INVITATION_ROLES = {
+    Invitation.InvitationType.FREIGHT_ADMIN: 'an admin',
+    Invitation.InvitationType.END_CUSTOMER_ADMIN: 'an admin',
+    Invitation.InvitationType.END_CUSTOMER_STAFF: 'a staff member',
+}
+
+
+def iter_emails(stream, fmt):
+    """Yield raw email strings from a binary CSV or JSONL stream, one row at a time."""
+    for record in iter_records(stream, fmt):
+        yield str(record.get('email') or '')
+
+
+def bulk_invite(emails, invitation_type, invited_by, build_url,
+                freight_company=None, end_customer=None, chunk_size=CHUNK_SIZE):
+    """Create invitations for an iterable of emails and queue their emails.
+
+    Emails are consumed ``chunk_size`` at a time, so memory stays flat however
+    long the input is. Each chunk is deduplicated against existing users and
+    pending invitations to the same tenant with two set-based queries; pending
+    invitations from earlier chunks catch duplicates across chunks.
+    """
+    tenant = freight_company or end_customer
+    subject = INVITATION_SUBJECTS[invitation_type]
+    body = (f'You have been invited to join {tenant.name} as {INVITATION_ROLES[invitation_type]}. '
+            'Click here to accept: ')
+    stats = Counter()
+
+    for chunk in chunked(emails, chunk_size):
+        candidates = {}
+        for raw in chunk:
+            email = User.objects.normalize_email(raw.strip())
+            try:
+                validate_email(email)
+            except ValidationError:
+                stats['invalid'] += 1
+                continue
+            if email in candidates:
+                stats['duplicate'] += 1
+                continue
+            candidates[email] = None
+
+        existing = set(User.objects.filter(email__in=candidates).values_list('email', flat=True))
+        pending = set(Invitation.objects.filter(
+            email__in=candidates,
+            invitation_type=invitation_type,
+            freight_company=freight_company,
+            end_customer=end_customer,
+            accepted=False,
+            expires_at__gt=timezone.now()
+        ).values_list('email', flat=True))
+        stats['existing_user'] += len(existing & candidates.keys())
+        stats['pending'] += len(pending & candidates.keys() - existing)
+
+        expires_at = timezone.now() + timedelta(days=7)
+        invitations = [
+            Invitation(
+                email=email,
+                invitation_type=invitation_type,
+                invited_by=invited_by,
+                freight_company=freight_company,
+                end_customer=end_customer,
+                expires_at=expires_at
+            )
+            for email in candidates if email not in existing and email not in pending
+        ]
+        if not invitations:
+            continue
+
+        with transaction.atomic():
+            invitations = Invitation.objects.bulk_create(invitations)
+            queue_emails([
+                OutboundEmail(
+                    invitation=invitation,
+                    subject=subject,
+                    body=body + build_url(invitation.signed_token()),
+                    to_email=invitation.email
+                )
+                for invitation in invitations
+            ])
+            # bulk_create sends no post_save, so count them as pending here
+            move_count('pending_invitation_count', [], invitation_tenants(
+                False, freight_company and freight_company.pk, end_customer and end_customer.pk
+            ), len(invitations))
+        stats['created'] += len(invitations)
+
+    return stats
@@ -0,0 +1,43 @@
+import os
+import stat
+
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+from .versioning import versions_are_shared
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    if versions_are_shared():
+        return []
+    return [Warning(
+        'The default cache is local to each process, so version bumps made by one '
+        'worker never reach the others.',
+        hint='Authorization checks skip the relationship graph, and profiles, visibility sets, '
+             'rate cards, tracking positions and dashboard fragments are read fresh on every '
+             'request instead of cached. '
+             'Configure a shared cache, or set CACHE_DIR when every worker runs on one host.',
+        id='core.W001',
+    )]
+
+
+@register()
+def check_cache_dir(app_configs, **kwargs):
+    # Cached fragments are rendered tenant pages, names and emails included
+    config = settings.CACHES['default']
+    if config['BACKEND'] != 'django.core.cache.backends.filebased.FileBasedCache':
+        return []
+    try:
+        mode = os.stat(config['LOCATION']).st_mode
+    except FileNotFoundError:
+        # The backend creates it readable by its owner only
+        return []
+    if not stat.S_IMODE(mode) & 0o077:
+        return []
+    return [Error(
+        f'The cache directory {config["LOCATION"]} is open to other users, and the cache '
+        'holds rendered tenant pages.',
+        hint='Give the app its own directory with mode 700, not a shared one such as /tmp.',
+        id='core.E001',
+    )]
@@ -0,0 +1,192 @@
+import csv
+import io
+import re
+import zlib
+from datetime import date, datetime
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .importing import chunked
+
+# Rows fetched per round trip from the server-side cursor, and sent per chunk
+EXPORT_CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+# Spreadsheet apps evaluate cells starting with these as formulas, and skip
+# a leading tab or carriage return before looking
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+# (column, lookup) pairs for the exported datasets. Invitation tokens are
+# never exported; they are as good as a password until accepted.
+CUSTOMER_LINK_COLUMNS = [
+    ('customer_id', 'end_customer_id'),
+    ('name', 'end_customer__name'),
+    ('email', 'end_customer__email'),
+    ('phone', 'end_customer__phone'),
+    ('status', 'status'),
+    ('linked_at', 'created_at'),
+]
+
+COMPANY_LINK_COLUMNS = [
+    ('company_id', 'freight_company_id'),
+    ('name', 'freight_company__name'),
+    ('email', 'freight_company__email'),
+    ('phone', 'freight_company__phone'),
+    ('status', 'status'),
+    ('linked_at', 'created_at'),
+]
+
+TENANT_COLUMNS = [
+    ('id', 'id'),
+    ('name', 'name'),
+    ('email', 'email'),
+    ('phone', 'phone'),
+    ('address', 'address'),
+]
+
+STAFF_COLUMNS = [
+    ('user_id', 'user_id'),
+    ('username', 'user__username'),
+    ('email', 'user__email'),
+    ('first_name', 'user__first_name'),
+    ('last_name', 'user__last_name'),
+    ('role', 'user_type'),
+    ('freight_company', 'linked_company__name'),
+    ('end_customer', 'linked_customer__name'),
+    ('date_joined', 'user__date_joined'),
+    ('last_login', 'user__last_login'),
+]
+
+INVITATION_COLUMNS = [
+    ('email', 'email'),
+    ('type', 'invitation_type'),
+    ('freight_company', 'freight_company__name'),
+    ('end_customer', 'end_customer__name'),
+    ('invited_by', 'invited_by__username'),
+    ('created_at', 'created_at'),
+    ('expires_at', 'expires_at'),
+    ('accepted', 'accepted'),
+    ('accepted_at', 'accepted_at'),
+    ('email_status', 'email_status'),
+]
+
+SHIPMENT_COLUMNS = [
+    ('reference', 'reference'),
+    ('status', 'status'),
+    ('freight_company', 'freight_company__name'),
+    ('end_customer', 'end_customer__name'),
+    ('origin', 'origin'),
+    ('destination', 'destination'),
+    ('weight_kg', 'weight_kg'),
+    ('pickup_date', 'pickup_date'),
+    ('delivery_date', 'delivery_date'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_export(queryset, columns, fmt):
+    """Yield the export as encoded chunks of ``EXPORT_CHUNK_SIZE`` rows.
+
+    Rows are read through a server-side cursor where the database has one,
+    so only one chunk is in memory at a time. The CSV header is yielded
+    before the query runs.
+    """
+    names = [name for name, _ in columns]
+    rows = queryset.order_by('pk').values_list(*[lookup for _, lookup in columns]).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        yield buffer.getvalue().encode()
+        for batch in chunked(rows, EXPORT_CHUNK_SIZE):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([_csv_value(value) for value in row] for row in batch)
+            yield buffer.getvalue().encode()
+    else:
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        for batch in chunked(rows, EXPORT_CHUNK_SIZE):
+            yield ''.join(encoder.encode(dict(zip(names, row))) + '\n' for row in batch).encode()
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        # Flushed per chunk so the client gets bytes as soon as rows are read
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+async def _pull(chunks):
+    # Under ASGI Django would read a sync iterator into a list before sending
+    # anything. Each chunk is instead produced on the request's sync thread,
+    # where its connection and server-side cursor live.
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await next_chunk(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close, thread_sensitive=True)()
+
+
+def export_response(request, queryset, columns, filename):
+    """Stream ``queryset`` as a CSV or JSONL download.
+
+    ``?format=jsonl`` picks JSON lines. The body is gzipped on the fly when
+    the client accepts it, or saved as a ``.gz`` file with
+    ``?compress=gzip``. Build ``queryset`` in the view: tenant scoping is
+    applied when the queryset is created, and the rows are read after the
+    view has returned.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in CONTENT_TYPES:
+        return JsonResponse({'error': f'format must be one of {", ".join(CONTENT_TYPES)}'}, status=400)
+
+    chunks = iter_export(queryset, columns, fmt)
+    filename = f'{filename}.{fmt}'
+    content_type = CONTENT_TYPES[fmt]
+    encoding = None
+    if request.GET.get('compress') == 'gzip':
+        chunks = _gzipped(chunks)
+        filename += '.gz'
+        content_type = 'application/gzip'
+    elif ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', '')):
+        chunks = _gzipped(chunks)
+        encoding = 'gzip'
+    if isinstance(request, ASGIRequest):
+        chunks = _pull(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    # Let the first rows through proxies without waiting for the rest
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -48,4 +48,9 @@ class SelectFreightCompaniesForm(forms.Form):
         queryset=FreightCompany.objects.all(),
         widget=forms.CheckboxSelectMultiple,
         required=True
-    ) 
\ No newline at end of file
+    )
+
+
+class BulkInviteForm(forms.Form):
+    file = forms.FileField(help_text='CSV with an "email" column, or JSONL with an "email" key per line.')
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('jsonl', 'JSONL')], initial='csv')
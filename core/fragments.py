@@ -0,0 +1,104 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.crypto import get_random_string
+from django.utils.safestring import mark_safe
+
+from .versioning import bump_version, get_version, versions_are_shared
+
+# Cached fragments are rendered with this in place of the CSRF token, and
+# each request swaps its own token in
+CSRF_PLACEHOLDER = 'CSRF_TOKEN_PLACEHOLDER'
+
+DIRECTORY_VERSION_KEY = 'core:fragments:directory:version'
+
+# Seconds a renderer may hold a fragment's lock before others stop waiting
+RENDER_LOCK_TIMEOUT = 10
+
+# Seconds between checks while another request renders the same fragment
+RENDER_WAIT_INTERVAL = 0.05
+
+# The file-based backend's add() is a check then a write, so threads in one
+# process take turns at it; across processes two renders may still overlap
+_add_lock = threading.Lock()
+
+
+def tenant_version_key(tenant_type, tenant_id):
+    return f'core:fragments:{tenant_type}:{tenant_id}:version'
+
+
+def invalidate_fragments(tenant_type=None, tenant_ids=(), directory=False):
+    """Retire the cached fragments of these tenants, and of the directory pages.
+
+    Bumped after commit, or a render running meanwhile could cache the old
+    rows under the new version.
+    """
+    keys = [tenant_version_key(tenant_type, pk) for pk in set(tenant_ids) if pk is not None]
+    if directory:
+        keys.append(DIRECTORY_VERSION_KEY)
+    if keys:
+        transaction.on_commit(lambda: [bump_version(key) for key in keys])
+
+
+def _render_once(key, render):
+    lock_key = f'{key}:lock'
+    with _add_lock:
+        won = cache.add(lock_key, get_random_string(12), RENDER_LOCK_TIMEOUT)
+    if won:
+        try:
+            html = render()
+            cache.set(key, html, settings.FRAGMENT_CACHE_TIMEOUT)
+            return html
+        finally:
+            cache.delete(lock_key)
+
+    # Someone else is rendering it; wait for their copy rather than pile on
+    deadline = time.monotonic() + RENDER_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(RENDER_WAIT_INTERVAL)
+        html = cache.get(key)
+        if html is not None:
+            return html
+        if not cache.has_key(lock_key):
+            break
+    return render()
+
+
+def _render(template, get_context):
+    return render_to_string(template, {**get_context(), 'csrf_token': CSRF_PLACEHOLDER})
+
+
+def _with_token(request, html):
+    return mark_safe(html.replace(CSRF_PLACEHOLDER, get_token(request)))
+
+
+def render_fragment(request, template, get_context):
+    """Render ``template`` as ``cached_fragment`` would, without caching it."""
+    return _with_token(request, _render(template, get_context))
+
+
+def cached_fragment(request, name, version_key, template, get_context):
+    """Render ``template`` once per data version and serve it from the cache.
+
+    ``name`` identifies the fragment, and ``version_key`` the counter its
+    data is tied to. ``get_context`` only runs on a miss, so a hit costs no
+    queries. Concurrent misses render once: the others wait for that copy.
+    Every distinct ``name`` is a cache entry, so it must not come from
+    request input.
+
+    Needs a cache shared by every worker: with a process-local one, a bump
+    made by one worker would leave the others serving the old fragment, so
+    every request renders instead.
+    """
+    if not versions_are_shared():
+        return render_fragment(request, template, get_context)
+    key = f'core:fragment:{name}:v{get_version(version_key)}'
+    html = cache.get(key)
+    if html is None:
+        html = _render_once(key, lambda: _render(template, get_context))
+    return _with_token(request, html)
@@ -0,0 +1,140 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from major_clients.models import FreightCompanyCustomer
+from .versioning import bump_version, get_version, versions_are_shared
+
+GRAPH_VERSION_KEY = 'core:graph:version'
+
+
+class Adjacency:
+    """One direction of the company/customer graph in CSR form.
+
+    ``nodes`` holds the sorted ids that have neighbours, ``offsets[i]`` and
+    ``offsets[i + 1]`` bound the slice of ``neighbours`` that belongs to
+    ``nodes[i]``, and every slice is sorted, so a membership check is two
+    binary searches over flat integer arrays.
+    """
+
+    def __init__(self, pairs):
+        self.nodes = array('q')
+        self.offsets = array('q', [0])
+        self.neighbours = array('q')
+        for node, neighbour in pairs:
+            if not self.nodes or self.nodes[-1] != node:
+                if self.nodes:
+                    self.offsets.append(len(self.neighbours))
+                self.nodes.append(node)
+            self.neighbours.append(neighbour)
+        if self.nodes:
+            self.offsets.append(len(self.neighbours))
+
+    def _slice(self, node):
+        i = bisect_left(self.nodes, node)
+        if i == len(self.nodes) or self.nodes[i] != node:
+            return 0, 0
+        return self.offsets[i], self.offsets[i + 1]
+
+    def neighbours_of(self, node):
+        start, end = self._slice(node)
+        return self.neighbours[start:end]
+
+    def contains(self, node, neighbour):
+        start, end = self._slice(node)
+        i = bisect_left(self.neighbours, neighbour, start, end)
+        return i < end and self.neighbours[i] == neighbour
+
+
+def load_graph():
+    # Streamed in the order of the link table's unique index, so building
+    # the arrays needs no sort and no intermediate list
+    return Adjacency(
+        FreightCompanyCustomer.objects.filter(status=FreightCompanyCustomer.Status.ACTIVE)
+        .order_by('freight_company_id', 'end_customer_id')
+        .values_list('freight_company_id', 'end_customer_id').iterator(chunk_size=10000)
+    )
+
+
+class RelationshipGraph:
+    """Process-wide index of which freight companies serve which customers.
+
+    The graph is tagged with the version counter it was built at. Link
+    changes bump the counter; a reader that sees a newer version falls back
+    to SQL for its own check and starts one background rebuild, so an
+    authorization answer is never served from a stale graph. The counter
+    lives in the default cache: when that is local to the process, a bump
+    would not reach the other workers, so the graph is not used at all and
+    every check goes to SQL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self._graph = None
+        self._version = None
+        self._built_at = 0.0
+
+    def _current(self):
+        if not versions_are_shared():
+            return None
+        graph = self._graph
+        if graph is not None:
+            fresh = (
+                self._version == get_version(GRAPH_VERSION_KEY) and
+                time.monotonic() - self._built_at < settings.RELATIONSHIP_GRAPH_MAX_AGE
+            )
+            if fresh:
+                return graph
+        self.rebuild_async()
+        return None
+
+    def rebuild(self):
+        version = get_version(GRAPH_VERSION_KEY)
+        graph = load_graph()
+        with self._lock:
+            self._graph, self._version, self._built_at = graph, version, time.monotonic()
+
+    def rebuild_async(self):
+        if not versions_are_shared():
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild_in_thread, name='relationship-graph', daemon=True).start()
+
+    def _rebuild_in_thread(self):
+        try:
+            self.rebuild()
+        finally:
+            self._rebuilding = False
+            # The thread has its own connection; do not leave it open
+            connection.close()
+
+    def is_linked(self, company_id, customer_id):
+        try:
+            company_id, customer_id = int(company_id), int(customer_id)
+        except (TypeError, ValueError):
+            return False
+        graph = self._current()
+        if graph is None:
+            return FreightCompanyCustomer.objects.filter(
+                freight_company_id=company_id,
+                end_customer_id=customer_id,
+                status=FreightCompanyCustomer.Status.ACTIVE
+            ).exists()
+        return graph.contains(company_id, customer_id)
+
+
+graph = RelationshipGraph()
+
+
+def invalidate_graph():
+    # Bumped only once the link change is committed, or a rebuild racing the
+    # transaction could load the old rows and tag them with the new version
+    transaction.on_commit(lambda: bump_version(GRAPH_VERSION_KEY))
@@ -0,0 +1,41 @@
+from django.core.exceptions import ValidationError
+from django.http import Http404
+
+from .models import UserProfile
+
+
+def identity_map(request):
+    """Return the request's ``{(model, pk): instance}`` map, creating it once.
+
+    The map starts out holding the profile's own company and customer, which
+    the profile snapshot already loaded, so a tenant looking at its own
+    portal never fetches itself.
+    """
+    objects = getattr(request, '_identity_map', None)
+    if objects is None:
+        objects = request._identity_map = {}
+        user_profile = getattr(request, 'user_profile', None)
+        if user_profile is not None:
+            for field in (UserProfile.linked_company, UserProfile.linked_customer):
+                # Only take what is already loaded; never query to seed the map
+                if field.is_cached(user_profile):
+                    obj = getattr(user_profile, field.field.name)
+                    if obj is not None:
+                        objects[type(obj), obj.pk] = obj
+    return objects
+
+
+def cached_get_or_404(request, model, pk):
+    """Fetch ``model`` by primary key at most once per request."""
+    try:
+        pk = model._meta.pk.to_python(pk)
+    except ValidationError:
+        raise Http404(f'Invalid {model._meta.object_name} id.')
+    objects = identity_map(request)
+    obj = objects.get((model, pk))
+    if obj is None:
+        obj = model._default_manager.filter(pk=pk).first()
+        if obj is None:
+            raise Http404(f'No {model._meta.object_name} matches the given query.')
+        objects[model, pk] = obj
+    return obj
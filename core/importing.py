@@ -0,0 +1,46 @@
+import codecs
+import csv
+import io
+import json
+
+
+def iter_records(stream, fmt):
+    """Yield one dict per CSV row or JSONL line from a binary stream.
+
+    Rows are decoded lazily, so a file of any size is read in constant memory.
+    Blank JSONL lines are skipped and malformed ones yield an empty dict.
+    """
+    # Uploaded files wrap the real file object, which TextIOWrapper needs
+    raw = getattr(stream, 'file', stream)
+    if hasattr(raw, 'readable'):
+        text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+    else:
+        # A request body is not a file object, but it iterates line by line
+        text = codecs.iterdecode(raw, 'utf-8-sig')
+    if fmt == 'jsonl':
+        for line in text:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield record if isinstance(record, dict) else {}
+    else:
+        yield from csv.DictReader(text)
+
+
+def detect_format(filename):
+    return 'jsonl' if filename.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,119 @@
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from django.conf import settings
+from django.db import connection
+
+# Collapse placeholder lists so "IN (%s, %s)" and "IN (%s)" share a fingerprint
+_PLACEHOLDER_LIST = re.compile(r'\((?:%s,\s*)+%s\)')
+_NUMBER = re.compile(r'\b\d+\b')
+
+_lock = threading.Lock()
+_buffers = defaultdict(lambda: deque(maxlen=settings.SQL_INSTRUMENTATION_RING_SIZE))
+
+
+def fingerprint(sql):
+    return _NUMBER.sub('?', _PLACEHOLDER_LIST.sub('(...)', sql))
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = []
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.total += duration
+            self.fingerprints[fingerprint(sql)] += 1
+            self.slowest.append((duration, sql))
+            if len(self.slowest) > settings.SQL_INSTRUMENTATION_SLOWEST * 4:
+                self.slowest.sort(reverse=True)
+                del self.slowest[settings.SQL_INSTRUMENTATION_SLOWEST:]
+
+
+def record(url_name, recorder, elapsed):
+    slowest = sorted(recorder.slowest, reverse=True)[:settings.SQL_INSTRUMENTATION_SLOWEST]
+    repeated = {
+        sql: count for sql, count in recorder.fingerprints.items()
+        if count >= settings.SQL_INSTRUMENTATION_REPEAT_THRESHOLD
+    }
+    sample = {
+        'queries': recorder.count,
+        'sql_ms': recorder.total * 1000,
+        'total_ms': elapsed * 1000,
+        'slowest': [(duration * 1000, sql) for duration, sql in slowest],
+        'repeated': repeated,
+    }
+    with _lock:
+        _buffers[url_name].append(sample)
+
+
+def snapshot():
+    """Aggregate the ring buffers into one summary per URL name."""
+    with _lock:
+        buffers = {name: list(samples) for name, samples in _buffers.items()}
+
+    summary = []
+    for name, samples in buffers.items():
+        queries = [s['queries'] for s in samples]
+        slowest = sorted(
+            (entry for s in samples for entry in s['slowest']), reverse=True
+        )[:settings.SQL_INSTRUMENTATION_SLOWEST]
+        repeated = Counter()
+        for s in samples:
+            for sql, count in s['repeated'].items():
+                repeated[sql] = max(repeated[sql], count)
+        summary.append({
+            'url_name': name,
+            'samples': len(samples),
+            'avg_queries': statistics.fmean(queries),
+            'max_queries': max(queries),
+            'avg_sql_ms': statistics.fmean(s['sql_ms'] for s in samples),
+            'avg_total_ms': statistics.fmean(s['total_ms'] for s in samples),
+            'slowest': [{'ms': round(ms, 2), 'sql': sql} for ms, sql in slowest],
+            'repeated': [{'count': count, 'sql': sql} for sql, count in repeated.most_common()],
+        })
+    summary.sort(key=lambda row: row['avg_sql_ms'], reverse=True)
+    return summary
+
+
+def reset():
+    with _lock:
+        _buffers.clear()
+
+
+class SQLInstrumentationMiddleware:
+    """Samples requests and records their SQL per URL name.
+
+    Only a ``SQL_INSTRUMENTATION_SAMPLE_RATE`` fraction of requests is wrapped,
+    so the rest pay a single ``random()`` call.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.SQL_INSTRUMENTATION_SAMPLE_RATE:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        # Unresolved paths share one bucket so 404 scans cannot grow the buffers
+        record(match.view_name if match else '<unresolved>', recorder, elapsed)
+        return response
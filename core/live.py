@@ -0,0 +1,422 @@
+import asyncio
+import json
+import logging
+import threading
+import weakref
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.http import HttpResponse
+
+from end_customers.models import EndCustomer
+from major_clients.models import FreightCompany, FreightCompanyCustomer
+from .models import UserProfile
+from .versioning import versions_are_shared
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'portal_events'
+
+# NOTIFY payloads are capped at 8000 bytes; larger changes ask for a reload
+MAX_PAYLOAD = 7900
+MAX_ITEMS = 100
+
+# Comment lines keep idle connections open through proxies
+HEARTBEAT = 25
+RECONNECT_DELAY = 5
+
+# Messages a slow client may fall behind by before it is told to reload
+QUEUE_SIZE = 100
+
+# Hubs advertise their topics in the shared cache so writers can skip
+# changes nobody is watching; entries outlive a missed refresh
+LISTENING_TIMEOUT = HEARTBEAT * 3
+
+
+def company_topic(company_id):
+    return f'company:{company_id}'
+
+
+def customer_topic(customer_id):
+    return f'customer:{customer_id}'
+
+
+def _listening_key(topic):
+    return f'live:listening:{topic}'
+
+
+def listening(topics):
+    """Return the ``topics`` some dashboard is currently streaming."""
+    topics = set(topics)
+    if not topics:
+        return topics
+    if connection.vendor != 'postgresql':
+        # Events only reach this process's hubs
+        return {topic for topic in topics if any(topic in hub._subscribers for hub in list(_hubs.values()))}
+    if not versions_are_shared():
+        # Other workers' hubs cannot advertise here; assume they listen
+        return topics
+    found = cache.get_many([_listening_key(topic) for topic in topics])
+    return {topic for topic in topics if _listening_key(topic) in found}
+
+
+def publish(topics, event, **data):
+    """Send ``event`` to every dashboard subscribed to one of ``topics``.
+
+    On PostgreSQL this is a NOTIFY, which the server only delivers once the
+    surrounding transaction commits, so a rolled back change is never shown.
+    """
+    topics = sorted(set(topics))
+    if not topics:
+        return
+    payload = json.dumps({'topics': topics, 'event': event, 'data': data})
+    if len(payload.encode()) > MAX_PAYLOAD:
+        payload = json.dumps({'topics': topics, 'event': 'refresh', 'data': {}})
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, payload])
+    else:
+        # No cross-process channel; only dashboards on this process hear it
+        transaction.on_commit(lambda: _dispatch_local(payload))
+
+
+def _dispatch_local(payload):
+    for loop, hub in list(_hubs.items()):
+        loop.call_soon_threadsafe(hub.dispatch, payload)
+
+
+class Hub:
+    """Fans notifications out to the SSE streams of one event loop.
+
+    Subscribers only hold an ``asyncio.Queue``; the single LISTEN connection
+    wakes the loop when a notification arrives, so idle dashboards cost no
+    queries and no threads.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self._subscribers = defaultdict(set)
+        self._listener = None
+        self._advertiser = None
+
+    def subscribe(self, topics):
+        if self._listener is None and connection.vendor == 'postgresql':
+            self._listener = self.loop.create_task(self._listen())
+            self._advertiser = self.loop.create_task(self._advertise())
+        new = [topic for topic in topics if topic not in self._subscribers]
+        queue = asyncio.Queue(QUEUE_SIZE)
+        for topic in topics:
+            self._subscribers[topic].add(queue)
+        if new and self._advertiser is not None:
+            self.loop.create_task(self._announce(new))
+        return queue
+
+    def unsubscribe(self, topics, queue):
+        for topic in topics:
+            queues = self._subscribers.get(topic)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[topic]
+
+    def dispatch(self, payload):
+        try:
+            message = json.loads(payload)
+            topics = message['topics']
+        except (ValueError, KeyError, TypeError):
+            return
+        # Encoded once, however many dashboards receive it
+        chunk = f'event: {message.get("event", "message")}\ndata: {json.dumps(message.get("data", {}))}\n\n'
+        queues = set()
+        for topic in topics:
+            queues.update(self._subscribers.get(topic, ()))
+        for queue in queues:
+            self._put(queue, chunk)
+
+    def _put(self, queue, chunk):
+        try:
+            queue.put_nowait(chunk)
+        except asyncio.QueueFull:
+            # The client missed changes; drop the backlog and have it reload
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait('event: refresh\ndata: {}\n\n')
+
+    async def _announce(self, topics):
+        try:
+            await cache.aset_many({_listening_key(topic): True for topic in topics}, LISTENING_TIMEOUT)
+        except Exception:
+            logger.exception('Could not advertise the portal event topics')
+
+    async def _advertise(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT)
+            if self._subscribers:
+                await self._announce(list(self._subscribers))
+
+    def _connect(self):
+        wrapper = connections['default']
+        conn = wrapper.Database.connect(**wrapper.get_connection_params())
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+        return conn
+
+    async def _listen(self):
+        reconnecting = False
+        while True:
+            try:
+                conn = await self.loop.run_in_executor(None, self._connect)
+            except Exception:
+                logger.exception('Could not open the portal event listener')
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            if reconnecting:
+                # Notifications sent while disconnected are gone
+                for queue in set().union(*self._subscribers.values()):
+                    self._put(queue, 'event: refresh\ndata: {}\n\n')
+            reconnecting = True
+
+            readable = asyncio.Event()
+            fd = conn.fileno()
+            self.loop.add_reader(fd, readable.set)
+            try:
+                while True:
+                    await readable.wait()
+                    readable.clear()
+                    conn.poll()
+                    while conn.notifies:
+                        self.dispatch(conn.notifies.pop(0).payload)
+            except Exception:
+                logger.exception('The portal event listener failed')
+            finally:
+                self.loop.remove_reader(fd)
+                conn.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+# One hub per running event loop; an ASGI server has one per process
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = Hub(loop)
+    return hub
+
+
+# Set by the portal views; the ASGI wrapper streams the topics it lists
+TOPICS_HEADER = 'X-Live-Topics'
+TOPICS_KEY = TOPICS_HEADER.lower().encode()
+
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    # Stop nginx from buffering the stream
+    (b'x-accel-buffering', b'no'),
+]
+
+
+def event_stream(request, topics):
+    """Hand the request over to ``live_application`` to stream ``topics``.
+
+    The view only authorizes. Streaming from inside Django would hold the
+    request's worker thread, and its database connection, for as long as
+    the dashboard stays open, so Django answers 204 and the ASGI wrapper
+    takes the connection over once the request is finished. Under WSGI the
+    204 reaches the browser, and EventSource does not retry it.
+    """
+    response = HttpResponse(status=204)
+    response[TOPICS_HEADER] = ','.join(topics)
+    return response
+
+
+async def _stream(topics, receive, send, headers):
+    hub = get_hub()
+    queue = hub.subscribe(topics)
+    disconnect = asyncio.ensure_future(receive())
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers + SSE_HEADERS})
+        chunk = f'retry: {RECONNECT_DELAY * 1000}\n\n'
+        while True:
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            message = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({message, disconnect}, timeout=HEARTBEAT, return_when=asyncio.FIRST_COMPLETED)
+            if disconnect in done:
+                message.cancel()
+                return
+            if message in done:
+                chunk = message.result()
+            else:
+                message.cancel()
+                chunk = ': keepalive\n\n'
+    finally:
+        disconnect.cancel()
+        hub.unsubscribe(topics, queue)
+
+
+def live_application(application):
+    """Wrap the Django ASGI app so handed-over live requests are streamed here."""
+    async def app(scope, receive, send):
+        if scope['type'] != 'http':
+            return await application(scope, receive, send)
+
+        handover = {}
+
+        async def intercept(message):
+            if message['type'] == 'http.response.start' and message['status'] == 204:
+                topics = dict((key.lower(), value) for key, value in message['headers']).get(TOPICS_KEY)
+                if topics:
+                    handover['topics'] = topics.decode().split(',')
+                    # Keep e.g. a refreshed session cookie, but not the 204's own headers
+                    handover['headers'] = [
+                        (key, value) for key, value in message['headers']
+                        if key.lower() not in (TOPICS_KEY, b'content-type', b'content-length')
+                    ]
+                    return
+            if not handover:
+                await send(message)
+
+        await application(scope, receive, intercept)
+        if handover:
+            await _stream(handover['topics'], receive, send, handover['headers'])
+    return app
+
+
+def _names(model, ids):
+    return {
+        pk: {'id': pk, 'name': name}
+        for pk, name in model._base_manager.filter(pk__in=ids).values_list('pk', 'name')
+    }
+
+
+class LinkBatch:
+    """The link changes of one transaction, published once it commits.
+
+    Bulk adds, removals and cascading deletes change links row by row;
+    collecting them means the totals are counted once per transaction
+    rather than once per row, and only for the dashboards that are open.
+    """
+
+    def __init__(self):
+        # The last change wins when a link is added and removed again
+        self.links = {}
+
+    def add(self, company_ids, customer_ids, added):
+        for company_id in company_ids:
+            for customer_id in customer_ids:
+                self.links[company_id, customer_id] = added
+
+    def __call__(self):
+        if getattr(_batches, 'current', None) is self:
+            _batches.current = None
+        company_ids = {company_id for company_id, _ in self.links}
+        customer_ids = {customer_id for _, customer_id in self.links}
+        topics = listening([company_topic(pk) for pk in company_ids] + [customer_topic(pk) for pk in customer_ids])
+        company_ids = {pk for pk in company_ids if company_topic(pk) in topics}
+        customer_ids = {pk for pk in customer_ids if customer_topic(pk) in topics}
+        if not company_ids and not customer_ids:
+            return
+
+        links = FreightCompanyCustomer.objects
+        sides = []
+        if company_ids:
+            totals = dict(
+                links.filter(freight_company_id__in=company_ids)
+                .values_list('freight_company_id').annotate(total=Count('id')).order_by()
+            )
+            sides.append(('customers', company_ids, EndCustomer, totals, company_topic))
+        if customer_ids:
+            totals = dict(
+                links.filter(end_customer_id__in=customer_ids)
+                .values_list('end_customer_id').annotate(total=Count('id')).order_by()
+            )
+            sides.append(('companies', customer_ids, FreightCompany, totals, customer_topic))
+
+        for side, ids, other, totals, topic in sides:
+            changes = {True: defaultdict(set), False: defaultdict(set)}
+            for link, added in self.links.items():
+                pk, other_id = link if side == 'customers' else link[::-1]
+                if pk in ids:
+                    changes[added][pk].add(other_id)
+            named = {other_id for others in changes[True].values() if len(others) <= MAX_ITEMS for other_id in others}
+            names = _names(other, named) if named else {}
+
+            # Dashboards told the same thing share one notification
+            groups = defaultdict(list)
+            refresh = []
+            for added, by_id in changes.items():
+                for pk, other_ids in by_id.items():
+                    if added and len(other_ids) > MAX_ITEMS:
+                        refresh.append(topic(pk))
+                        continue
+                    groups[added, totals.get(pk, 0), frozenset(other_ids)].append(topic(pk))
+            for start in range(0, len(refresh), MAX_ITEMS):
+                publish(refresh[start:start + MAX_ITEMS], 'refresh')
+            for (added, total, other_ids), recipients in groups.items():
+                change = {'list': side}
+                if added:
+                    change['items'] = sorted((names[pk] for pk in other_ids if pk in names), key=lambda item: item['name'])
+                else:
+                    change['ids'] = sorted(other_ids)
+                for start in range(0, len(recipients), MAX_ITEMS):
+                    publish(
+                        recipients[start:start + MAX_ITEMS], f'{side}_added' if added else f'{side}_removed',
+                        counts={f'total_{side}': total},
+                        added=change if added else None,
+                        removed=None if added else change,
+                    )
+
+
+_batches = threading.local()
+
+
+def publish_links(company_ids, customer_ids, added):
+    """Tell both sides' dashboards that company/customer links changed.
+
+    ``company_ids`` and ``customer_ids`` are the two ends of the changed
+    links; one side normally has a single id. Nothing is sent until the
+    transaction commits, and then once for all of its link changes.
+    """
+    company_ids, customer_ids = set(company_ids), set(customer_ids)
+    if not company_ids or not customer_ids:
+        return
+    batch = getattr(_batches, 'current', None)
+    # A batch whose transaction rolled back is no longer waiting to run
+    if batch is not None and connection.in_atomic_block and any(
+        func is batch for _, func, _ in connection.run_on_commit
+    ):
+        batch.add(company_ids, customer_ids, added)
+        return
+    batch = _batches.current = LinkBatch()
+    batch.add(company_ids, customer_ids, added)
+    # Outside a transaction this runs straight away
+    transaction.on_commit(batch)
+
+
+def publish_staff(user_profile):
+    if user_profile.user_type == UserProfile.UserType.FREIGHT_ADMIN and user_profile.linked_company_id:
+        topic = company_topic(user_profile.linked_company_id)
+        staff = UserProfile.objects.filter(linked_company_id=user_profile.linked_company_id)
+    elif user_profile.user_type == UserProfile.UserType.END_CUSTOMER_ADMIN and user_profile.linked_customer_id:
+        topic = customer_topic(user_profile.linked_customer_id)
+        staff = UserProfile.objects.filter(linked_customer_id=user_profile.linked_customer_id)
+    else:
+        return
+    publish([topic], 'staff_changed', counts={
+        'total_staff': staff.filter(user_type=user_profile.user_type).count()
+    })
+
+
+def publish_invitation_accepted(invitation):
+    topics = []
+    if invitation.freight_company_id:
+        topics.append(company_topic(invitation.freight_company_id))
+    if invitation.end_customer_id:
+        topics.append(customer_topic(invitation.end_customer_id))
+    publish(topics, 'invitation_accepted', notice=f'{invitation.email} accepted their invitation.')
@@ -0,0 +1,28 @@
+from django.db.models import ForeignKey, Lookup
+
+
+@ForeignKey.register_lookup
+class Any(Lookup):
+    """``field = ANY(%s)`` with the ids bound as a single array parameter.
+
+    PostgreSQL plans a bound array the same way whatever its length, where a
+    literal ``IN (...)`` list grows the statement with every id.
+    """
+    lookup_name = 'any'
+    prepare_rhs = False
+
+    def get_db_prep_lookup(self, value, connection):
+        return ('%s', [list(value)])
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        values = self.rhs
+        if not values:
+            return '1 = 0', []
+        placeholders = ', '.join(['%s'] * len(values))
+        return f'{lhs} IN ({placeholders})', list(lhs_params) + list(values)
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} = ANY({rhs})', list(lhs_params) + list(rhs_params)
@@ -0,0 +1,67 @@
+import time
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import DataScope
+
+
+class Command(BaseCommand):
+    help = 'Copies DataScope rows onto the tenant columns of a TenantScopedModel in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='app_label.ModelName of a TenantScopedModel')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to pause between batches')
+        parser.add_argument('--delete', action='store_true', help='Delete the DataScope rows once copied')
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError) as e:
+            raise CommandError(str(e))
+        if not getattr(model, 'denormalized_scope', False):
+            raise CommandError(f'{options["model"]} does not store tenant columns on the row.')
+
+        content_type = ContentType.objects.get_for_model(model)
+        scopes = DataScope.objects.filter(content_type=content_type).order_by('id')
+        last_id = 0
+        copied = 0
+
+        while True:
+            # Keyset pagination: each batch is its own short transaction, so
+            # row locks are held for one batch at a time
+            batch = list(scopes.filter(id__gt=last_id).values(
+                'id', 'object_id', 'freight_company_id', 'end_customer_id'
+            )[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1]['id']
+
+            by_object = {row['object_id']: row for row in batch}
+            with transaction.atomic():
+                pending = model._base_manager.filter(
+                    pk__in=list(by_object),
+                    freight_company__isnull=True,
+                    end_customer__isnull=True
+                ).values_list('pk', flat=True)
+                objs = [
+                    model(
+                        pk=pk,
+                        freight_company_id=by_object[pk]['freight_company_id'],
+                        end_customer_id=by_object[pk]['end_customer_id']
+                    )
+                    for pk in pending
+                ]
+                model._base_manager.bulk_update(objs, ['freight_company', 'end_customer'])
+                if options['delete']:
+                    DataScope.objects.filter(id__in=[row['id'] for row in batch]).delete()
+
+            copied += len(objs)
+            self.stdout.write(f'Copied {copied} rows (scope id {last_id})')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {copied} {model._meta.label} rows.'))
@@ -0,0 +1,96 @@
+import time
+import zlib
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+
+from core import exports
+from core.models import Invitation
+from major_clients.models import FreightCompany
+from superadmin.models import SaaSProvider
+
+
+class Rollback(Exception):
+    pass
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * 4096 / 1e6
+
+
+class Command(BaseCommand):
+    help = 'Streams a large invitation export and reports time to first byte, throughput and memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        provider = SaaSProvider.objects.create(
+            name='Benchmark Provider',
+            contact_email=f'bench-{time.time_ns()}@example.com'
+        )
+        company = FreightCompany.objects.create(name='Benchmark Carrier', saas_provider=provider)
+        start = time.perf_counter()
+        created = 0
+        while created < options['rows']:
+            n = min(options['batch_size'], options['rows'] - created)
+            Invitation.objects.bulk_create([
+                Invitation(
+                    email=f'user{created + i}@example.com',
+                    invitation_type=Invitation.InvitationType.FREIGHT_ADMIN,
+                    freight_company=company,
+                    expires_at='2030-01-01T00:00:00Z'
+                )
+                for i in range(n)
+            ])
+            created += n
+        self.stdout.write(f'Seeded {created} invitations in {time.perf_counter() - start:.1f}s ({connection.vendor})')
+
+        factory = RequestFactory()
+        for label, query, headers in (
+            ('csv', '', {}),
+            ('jsonl', 'format=jsonl', {}),
+            ('csv, gzip', '', {'Accept-Encoding': 'gzip, deflate'}),
+        ):
+            request = factory.get(f'/export/?{query}', headers=headers)
+            queryset = Invitation.objects.filter(freight_company=company)
+            baseline = peak = rss_mb()
+            start = time.perf_counter()
+            response = exports.export_response(request, queryset, exports.INVITATION_COLUMNS, 'invitations')
+            first_byte = None
+            size = 0
+            body = []
+            for i, chunk in enumerate(response.streaming_content):
+                if first_byte is None and chunk:
+                    first_byte = time.perf_counter() - start
+                size += len(chunk)
+                # Keep only the beginning, to check it decodes
+                if i < 3:
+                    body.append(chunk)
+                if i % 50 == 0:
+                    peak = max(peak, rss_mb())
+            elapsed = time.perf_counter() - start
+
+            head = b''.join(body)
+            if response.get('Content-Encoding') == 'gzip':
+                # Only the first chunks were kept, so inflate what there is
+                head = zlib.decompressobj(zlib.MAX_WBITS | 16).decompress(head)
+            lines = head.decode().splitlines()
+            self.stdout.write(
+                f'{label:10} {size / 1e6:7.1f}MB in {elapsed:5.2f}s, {created / elapsed:8.0f} rows/s, '
+                f'first byte after {first_byte * 1000:.1f}ms, RSS +{peak - baseline:.1f}MB; '
+                f'starts {lines[0][:60]!r}'
+            )
+
@@ -0,0 +1,245 @@
+import io
+import json
+import statistics
+import tempfile
+import time
+from collections import namedtuple
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template.backends.django import Template
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.models import Invitation
+from core.versioning import versions_are_shared
+
+# ``cold_budget`` covers the first request after the cache is cleared;
+# ``broken`` names why a view is known to fail, which is the only way a
+# 5xx passes. It is spelled out here so the baseline can never bless one.
+Scenario = namedtuple(
+    'Scenario', ['name', 'user', 'method', 'url', 'data', 'budget', 'cold_budget', 'broken'],
+    defaults=[None]
+)
+
+# Neither is defined in this project
+NO_BASE_TEMPLATE = "core views render base.html and redirect to 'dashboard'"
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'portal_baseline.json'
+
+# Views this fast jitter by more than the threshold from run to run
+LATENCY_SLACK_MS = 1.0
+
+
+class Command(BaseCommand):
+    help = ('Seeds a large hierarchy in a throwaway test database and measures every portal view. '
+            'Fails when a view exceeds its query budget or regresses against the stored baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=20)
+        parser.add_argument('--customers', type=int, default=2000)
+        parser.add_argument('--staff-per-customer', type=int, default=3)
+        parser.add_argument('--links-per-customer', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--update-baseline', action='store_true')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Allowed latency regression against the baseline, as a fraction')
+
+    def handle(self, *args, **options):
+        if versions_are_shared():
+            return self.run(options)
+        # Without a shared cache nothing is cached between requests in
+        # production either; measure the setup deployments need
+        self.stdout.write('The default cache is process-local; measuring with a temporary file cache.')
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}):
+            return self.run(options)
+
+    def run(self, options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            call_command(
+                'seed_hierarchy',
+                companies=options['companies'],
+                customers=options['customers'],
+                staff_per_customer=options['staff_per_customer'],
+                links_per_customer=options['links_per_customer'],
+                verify=False,
+                stdout=io.StringIO(),
+            )
+            scenarios = {scenario.name: scenario for scenario in self.scenarios()}
+            results = {
+                name: self.measure(scenario, options['repeat'])
+                for name, scenario in scenarios.items()
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.report(results, scenarios)
+        baseline_path = Path(options['baseline'])
+        if options['update_baseline']:
+            # Only a run that meets every budget may become the baseline
+            failures = self.check_results(results, scenarios, {}, options['threshold'])
+            if failures:
+                raise CommandError('Baseline not written:\n' + '\n'.join(failures))
+            recorded = {name: r for name, r in results.items() if not scenarios[name].broken}
+            baseline_path.write_text(json.dumps(recorded, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(f'Baseline written to {baseline_path}')
+            return
+
+        if not baseline_path.exists():
+            raise CommandError(f'No baseline at {baseline_path}; run with --update-baseline first.')
+        baseline = json.loads(baseline_path.read_text())
+        failures = self.check_results(results, scenarios, baseline, options['threshold'])
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('All views within budget.'))
+
+    def scenarios(self):
+        saas = User.objects.get(username='saas_admin')
+        freight = User.objects.get(username='freight_admin_1')
+        customer_admin = User.objects.get(username='customer_admin_1')
+        company = freight.profile.linked_company
+        customer = customer_admin.profile.linked_customer
+        provider = customer.freight_companies.first()
+        invitation = Invitation.objects.create(
+            email='bench-accept@example.com',
+            invitation_type=Invitation.InvitationType.END_CUSTOMER_STAFF,
+            end_customer=customer
+        )
+
+        return [
+            Scenario('saas_dashboard', saas, 'get', reverse('saas_admin:dashboard'), None, 10, 10),
+            Scenario('freight_dashboard', freight, 'get',
+                     reverse('freight_portal:dashboard', args=[company.id]), None, 10, 10),
+            Scenario('freight_manage_end_customers', freight, 'get',
+                     reverse('freight_portal:manage_end_customers', args=[company.id]), None, 10, 10),
+            Scenario('freight_manage_staff', freight, 'get',
+                     reverse('freight_portal:manage_staff', args=[company.id]), None, 10, 10),
+            Scenario('freight_search_end_customers', freight, 'get',
+                     reverse('freight_portal:search_end_customers', args=[company.id]), {'q': 'Customer 1'}, 10, 10),
+            Scenario('freight_search_staff', freight, 'get',
+                     reverse('freight_portal:search_staff', args=[company.id]), {'q': 'staff'}, 10, 10),
+            Scenario('customer_dashboard', customer_admin, 'get',
+                     reverse('customer_portal:dashboard', args=[customer.id]), None, 10, 10),
+            Scenario('customer_freight_company_view', customer_admin, 'get',
+                     reverse('customer_portal:freight_company_view', args=[customer.id, provider.id]), None, 10, 10),
+            Scenario('customer_manage_staff', customer_admin, 'get',
+                     reverse('customer_portal:manage_staff', args=[customer.id]), None, 10, 10),
+            Scenario('customer_search_staff', customer_admin, 'get',
+                     reverse('customer_portal:search_staff', args=[customer.id]), {'q': 'staff'}, 10, 10),
+            Scenario('invite_freight_admin', saas, 'post', reverse('invite_freight_admin'),
+                     lambda i: {'email': f'bench-freight-{i}@example.com', 'company': company.id}, 10, 10,
+                     NO_BASE_TEMPLATE),
+            Scenario('invite_end_customer_staff', customer_admin, 'post', reverse('invite_end_customer_staff'),
+                     lambda i: {'email': f'bench-staff-{i}@example.com', 'customer': customer.id}, 10, 10,
+                     NO_BASE_TEMPLATE),
+            Scenario('accept_invitation', None, 'get',
+                     reverse('accept_invitation', args=[invitation.signed_token()]), None, 10, 10,
+                     NO_BASE_TEMPLATE),
+        ]
+
+    def measure(self, scenario, repeat):
+        client = Client(raise_request_exception=False, SERVER_NAME='localhost')
+        if scenario.user:
+            client.force_login(scenario.user)
+
+        render_times = []
+        original_render = Template.render
+
+        def timed_render(template, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original_render(template, *args, **kwargs)
+            finally:
+                render_times.append(time.perf_counter() - start)
+
+        query_times = []
+
+        def timed_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                query_times.append(time.perf_counter() - start)
+
+        def sample(i):
+            data = scenario.data(i) if callable(scenario.data) else scenario.data
+            render_times.clear()
+            query_times.clear()
+            with connection.execute_wrapper(timed_query), \
+                    mock.patch.object(Template, 'render', timed_render):
+                start = time.perf_counter()
+                response = getattr(client, scenario.method)(scenario.url, data)
+                total = time.perf_counter() - start
+            return {
+                'status': response.status_code,
+                'queries': len(query_times),
+                'sql_ms': sum(query_times) * 1000,
+                'render_ms': sum(render_times) * 1000,
+                'total_ms': total * 1000,
+            }
+
+        # The first request after a restart or a deploy finds nothing
+        # cached; it is measured and budgeted on its own
+        cache.clear()
+        cold = sample(0)
+        samples = [sample(i) for i in range(1, repeat + 1)]
+
+        return {
+            'status': max(s['status'] for s in [cold] + samples),
+            'queries': max(s['queries'] for s in samples),
+            'budget': scenario.budget,
+            'cold_queries': cold['queries'],
+            'cold_budget': scenario.cold_budget,
+            'cold_ms': cold['total_ms'],
+            'sql_ms': statistics.median(s['sql_ms'] for s in samples),
+            'render_ms': statistics.median(s['render_ms'] for s in samples),
+            'total_ms': statistics.median(s['total_ms'] for s in samples),
+        }
+
+    def report(self, results, scenarios):
+        self.stdout.write(f"{'view':<32} {'status':>6} {'queries':>8} {'budget':>6} {'cold':>5} {'budget':>6} "
+                          f"{'sql ms':>8} {'render ms':>10} {'total ms':>9} {'cold ms':>8}")
+        for name, r in results.items():
+            self.stdout.write(f"{name:<32} {r['status']:>6} {r['queries']:>8} {r['budget']:>6} "
+                              f"{r['cold_queries']:>5} {r['cold_budget']:>6} "
+                              f"{r['sql_ms']:>8.1f} {r['render_ms']:>10.1f} {r['total_ms']:>9.1f} {r['cold_ms']:>8.1f}"
+                              + (f"  (known broken: {scenarios[name].broken})" if scenarios[name].broken else ''))
+
+    def check_results(self, results, scenarios, baseline, threshold):
+        failures = []
+        for name, r in results.items():
+            broken = scenarios[name].broken
+            if broken:
+                # Fixed views have to be budgeted like the rest
+                if r['status'] < 500:
+                    failures.append(f'{name}: returned {r["status"]}; it is no longer broken, so drop its note')
+                continue
+            if r['status'] >= 500:
+                failures.append(f'{name}: returned {r["status"]}')
+                continue
+            if r['queries'] > r['budget']:
+                failures.append(f'{name}: {r["queries"]} queries, budget is {r["budget"]}')
+            if r['cold_queries'] > r['cold_budget']:
+                failures.append(f'{name}: {r["cold_queries"]} queries uncached, budget is {r["cold_budget"]}')
+            previous = baseline.get(name)
+            if previous:
+                if r['queries'] > previous['queries']:
+                    failures.append(f'{name}: {r["queries"]} queries, baseline was {previous["queries"]}')
+                if r['cold_queries'] > previous['cold_queries']:
+                    failures.append(f'{name}: {r["cold_queries"]} queries uncached, baseline was {previous["cold_queries"]}')
+                if r['total_ms'] > max(previous['total_ms'] * (1 + threshold), previous['total_ms'] + LATENCY_SLACK_MS):
+                    failures.append(f'{name}: {r["total_ms"]:.1f} ms, baseline was {previous["total_ms"]:.1f} ms')
+            elif baseline:
+                failures.append(f'{name}: not in the baseline')
+        return failures
@@ -0,0 +1,99 @@
+import statistics
+import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from core.models import DataScope, UserProfile, FreightCompany, EndCustomer
+from core.scoping import company_version_key, scope_queryset
+from core.versioning import bump_version
+from major_clients.models import FreightCompanyCustomer
+from superadmin.models import SaaSProvider
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measures scoped-query latency for a freight admin at several linked-customer counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10, 1000, 50000])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--explain', action='store_true', help='Print the query plan of each variant')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'customers':>10} {'legacy ms':>10} {'cold ms':>10} {'warm ms':>10}")
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    row = self.run_size(size, options['repeat'], options['explain'])
+                    raise Rollback
+            except Rollback:
+                pass
+            self.stdout.write(f'{size:>10} {row[0]:>10.2f} {row[1]:>10.2f} {row[2]:>10.2f}')
+
+    def run_size(self, size, repeat, explain=False):
+        provider = SaaSProvider.objects.create(
+            name='Benchmark Provider',
+            contact_email=f'bench-{time.time_ns()}@example.com'
+        )
+        company = FreightCompany.objects.create(name='Benchmark Company', saas_provider=provider)
+        other = FreightCompany.objects.create(name='Other Company', saas_provider=provider)
+
+        customers = EndCustomer.objects.bulk_create(
+            [EndCustomer(name=f'Customer {i}') for i in range(size * 2)],
+            batch_size=5000
+        )
+        linked, unlinked = customers[:size], customers[size:]
+        FreightCompanyCustomer.objects.bulk_create(
+            [FreightCompanyCustomer(freight_company_id=company.id, end_customer_id=c.id) for c in linked] +
+            [FreightCompanyCustomer(freight_company_id=other.id, end_customer_id=c.id) for c in unlinked],
+            batch_size=5000
+        )
+
+        # Scope each customer row to itself so the scoped model is EndCustomer
+        content_type = ContentType.objects.get_for_model(EndCustomer)
+        DataScope.objects.bulk_create(
+            [DataScope(content_type=content_type, object_id=c.id, end_customer_id=c.id) for c in customers],
+            batch_size=5000
+        )
+
+        profile = UserProfile(user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company=company)
+
+        def legacy():
+            scoped_ids = DataScope.objects.filter(
+                Q(freight_company=company) | Q(end_customer__in=company.end_customers.all()),
+                content_type=content_type,
+            ).values('object_id')
+            return EndCustomer.objects.filter(pk__in=scoped_ids)
+
+        def compiled():
+            return scope_queryset(EndCustomer.objects.all(), UserProfile(
+                user_type=profile.user_type, linked_company_id=profile.linked_company_id
+            ))
+
+        # Everything runs in a transaction that is rolled back, so bump now
+        bump_version(company_version_key(company.id))
+        if explain:
+            self.stdout.write(f'-- legacy plan ({size} customers)\n{legacy().explain()}')
+            self.stdout.write(f'-- compiled plan ({size} customers)\n{compiled().explain()}')
+        cold = self.time_query(compiled, 1)
+        return (
+            self.time_query(legacy, repeat),
+            cold,
+            self.time_query(compiled, repeat),
+        )
+
+    def time_query(self, build, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            qs = build()
+            qs.count()
+            list(qs.order_by('pk')[:50])
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
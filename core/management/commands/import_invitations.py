@@ -0,0 +1,55 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core.bulk_invites import CHUNK_SIZE, bulk_invite, iter_emails
+from core.importing import detect_format
+from core.models import Invitation, FreightCompany, EndCustomer
+
+
+class Command(BaseCommand):
+    help = 'Creates invitations in bulk from a CSV or JSONL file and queues their emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--type', choices=Invitation.InvitationType.values,
+                            default=Invitation.InvitationType.END_CUSTOMER_STAFF)
+        parser.add_argument('--company', type=int, help='FreightCompany id for FREIGHT_ADMIN invitations')
+        parser.add_argument('--customer', type=int, help='EndCustomer id for end customer invitations')
+        parser.add_argument('--invited-by', help='Username recorded as the inviter')
+        parser.add_argument('--base-url', required=True, help='Site root used to build invitation links')
+        parser.add_argument('--format', choices=['csv', 'jsonl'])
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        invitation_type = options['type']
+        freight_company = end_customer = None
+        try:
+            if invitation_type == Invitation.InvitationType.FREIGHT_ADMIN:
+                freight_company = FreightCompany.objects.get(id=options['company'])
+            else:
+                end_customer = EndCustomer.objects.get(id=options['customer'])
+            invited_by = User.objects.get(username=options['invited_by']) if options['invited_by'] else None
+        except (FreightCompany.DoesNotExist, EndCustomer.DoesNotExist, User.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        fmt = options['format'] or detect_format(options['path'])
+        base_url = options['base_url'].rstrip('/')
+
+        start = time.perf_counter()
+        with open(options['path'], 'rb') as f:
+            stats = bulk_invite(
+                iter_emails(f, fmt),
+                invitation_type,
+                invited_by,
+                lambda signed: base_url + reverse('accept_invitation', args=[signed]),
+                freight_company=freight_company,
+                end_customer=end_customer,
+                chunk_size=options['chunk_size']
+            )
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(', '.join(f'{key}: {value}' for key, value in sorted(stats.items())))
+        self.stdout.write(self.style.SUCCESS(f"Created {stats['created']} invitations in {elapsed:.2f}s."))
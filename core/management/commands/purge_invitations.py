@@ -0,0 +1,31 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.retention import purge_invitations
+
+
+class Command(BaseCommand):
+    help = 'Archives and deletes invitations that expired more than the retention period ago, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.INVITATION_RETENTION_DAYS,
+                            help='Days after expiry an invitation is kept')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to wait between batches')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        total = 0
+        while True:
+            purged = purge_invitations(cutoff, options['batch_size'])
+            if not purged:
+                break
+            total += purged
+            self.stdout.write(f'Archived {purged} invitations')
+            # Leave room for other writers between batches
+            time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {total} invitations that expired before {cutoff:%Y-%m-%d}.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.models import TenantStats
+from core.stats import reconcile_stats
+
+
+class Command(BaseCommand):
+    help = 'Recounts the per-tenant dashboard stats, fixing drift from writes that bypass signals; run nightly'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for tenant_type in TenantStats.TenantType:
+            checked, fixed, deleted = reconcile_stats(tenant_type, options['batch_size'])
+            self.stdout.write(
+                f'{tenant_type.label}: {checked} checked, {fixed} fixed, {deleted} orphaned rows deleted'
+            )
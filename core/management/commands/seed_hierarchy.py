@@ -1,156 +1,260 @@
-from django.core.management.base import BaseCommand
-from django.contrib.auth.models import User
-from core.models import UserProfile, FreightCompany, EndCustomer
-from django.db import transaction
+import csv
+import io
 import random
+import time
+from argparse import BooleanOptionalAction
+from datetime import datetime, timezone
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from core.models import UserProfile, FreightCompany, EndCustomer, TenantStats
+from core.stats import reconcile_stats
+from major_clients.models import FreightCompanyCustomer
+from superadmin.counters import refresh_count
 from superadmin.models import SaaSProvider
 
+# Fixed so the same seed always produces identical rows
+DATE_JOINED = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+# Written for None by --copy; no seeded value looks like it
+COPY_NULL = r'\N'
+
+
 class Command(BaseCommand):
     help = 'Seeds the database with a hierarchy of SaaS provider, freight companies, and end customers'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', type=int, default=1)
+        parser.add_argument('--companies', type=int, default=3, help='Freight companies per provider')
+        parser.add_argument('--customers', type=int, default=5, help='End customers per provider')
+        parser.add_argument('--staff-per-customer', type=int, default=2)
+        parser.add_argument('--links-per-customer', type=int, default=2,
+                            help='Freight companies each end customer is linked to')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--copy', action='store_true', help='Load rows with PostgreSQL COPY')
+        parser.add_argument('--verify', action=BooleanOptionalAction, default=None,
+                            help='Run the data isolation report (default: only for small datasets)')
+
+    def handle(self, *args, **options):
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy needs PostgreSQL.')
+
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.buffers = {}
+        self.counts = {}
+        self.write = self.copy_rows if options['copy'] else self.insert_rows
+
         self.stdout.write('Starting to seed the database...')
-        
+        start = time.perf_counter()
+
+        # One hash per role, computed once with a seed-derived salt, instead
+        # of a full PBKDF2 run for every user
+        self.passwords = {
+            role: make_password(password, salt=f'seed{options["seed"]}{role}')
+            for role, password in [('saas', 'saas123'), ('freight', 'freight123'),
+                                   ('customer', 'customer123'), ('staff', 'staff123')]
+        }
+
         with transaction.atomic():
-            # Create SaaS Provider
-            self.stdout.write('Creating SaaS Provider...')
-            saas_provider = self.create_saas_provider()
-            
-            # Create Freight Companies
-            self.stdout.write('Creating Freight Companies...')
-            freight_companies = self.create_freight_companies(saas_provider)
-            
-            # Create End Customers
-            self.stdout.write('Creating End Customers...')
-            end_customers = self.create_end_customers(freight_companies)
-            
-            # Verify Data Isolation
-            self.stdout.write('Verifying Data Isolation...')
-            self.verify_data_isolation(saas_provider, freight_companies, end_customers)
-            
+            self.next_ids = {
+                model: (model.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+                for model in self.seeded_models()
+            }
+            company_ids, customer_ids = [], []
+            for p in range(options['providers']):
+                self.stdout.write(f'Creating SaaS Provider {p + 1}...')
+                provider_id = self.create_saas_provider(p)
+                companies = self.create_freight_companies(provider_id, p)
+                customers = self.create_end_customers(companies, p)
+                company_ids.extend(companies)
+                customer_ids.extend(customers)
+            self.flush()
+            self.reset_sequences()
+            # Bulk writes bypass the signals that maintain the dashboard totals
+            refresh_count(FreightCompany)
+            refresh_count(EndCustomer)
+            for tenant_type in TenantStats.TenantType:
+                reconcile_stats(tenant_type)
+
+            verify = options['verify']
+            if verify is None:
+                verify = len(customer_ids) <= 50
+            if verify:
+                # Verify Data Isolation
+                self.stdout.write('Verifying Data Isolation...')
+                self.verify_data_isolation(
+                    FreightCompany.objects.filter(id__in=company_ids),
+                    EndCustomer.objects.filter(id__in=customer_ids)
+                )
+
+        elapsed = time.perf_counter() - start
+        summary = ', '.join(f'{count} {model._meta.db_table}' for model, count in self.counts.items())
+        self.stdout.write(f'Wrote {summary} in {elapsed:.1f}s')
         self.stdout.write(self.style.SUCCESS('Successfully seeded the database!'))
 
-    def create_saas_provider(self):
-        # Create SaaS Provider
-        saas = SaaSProvider.objects.create(
-            name='Main SaaS Provider',
-            contact_email='saas@example.com'
+    def seeded_models(self):
+        return [
+            SaaSProvider, User, UserProfile, FreightCompany, EndCustomer, FreightCompanyCustomer,
+        ]
+
+    def add(self, model, **values):
+        pk = self.next_ids[model]
+        self.next_ids[model] += 1
+        buffer = self.buffers.setdefault(model, [])
+        buffer.append({'id': pk, **values})
+        if len(buffer) >= self.options['batch_size']:
+            self.flush()
+        return pk
+
+    def add_user(self, username, email, role, user_type, company_id=None, customer_id=None):
+        user_id = self.add(
+            User, password=self.passwords[role], last_login=None, is_superuser=False,
+            username=username, first_name='', last_name='', email=email,
+            is_staff=False, is_active=True, date_joined=DATE_JOINED
         )
-        # Create SaaS Provider User
-        saas_user = User.objects.create_user(
-            username='saas_admin',
-            email='saas@example.com',
-            password='saas123'
+        self.add(
+            UserProfile, user_id=user_id, user_type=user_type,
+            linked_company_id=company_id, linked_customer_id=customer_id
         )
-        # Create SaaS Provider Profile
-        saas_profile = UserProfile.objects.create(
-            user=saas_user,
-            user_type=UserProfile.UserType.SAAS_PROVIDER
+
+    def flush(self):
+        # Parents are buffered first, so flushing in insertion order keeps
+        # foreign keys satisfied
+        for model, rows in self.buffers.items():
+            if rows:
+                self.write(model, rows)
+                self.counts[model] = self.counts.get(model, 0) + len(rows)
+                self.buffers[model] = []
+
+    def insert_rows(self, model, rows):
+        model.objects.bulk_create([model(**row) for row in rows], batch_size=self.options['batch_size'])
+
+    def copy_rows(self, model, rows):
+        fields = [model._meta.get_field(name) for name in rows[0]]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # COPY's csv format reads an unquoted empty field as NULL, and the
+        # writer never quotes one, so NULL gets its own marker and blank
+        # names stay blank
+        for row in rows:
+            writer.writerow([COPY_NULL if value is None else value for value in row.values()])
+        buffer.seek(0)
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')", buffer)
+
+    def reset_sequences(self):
+        # Rows were written with explicit ids, so move the sequences past them
+        statements = connection.ops.sequence_reset_sql(no_style(), self.seeded_models())
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def create_saas_provider(self, p):
+        suffix = '' if p == 0 else str(p + 1)
+        # Create SaaS Provider
+        provider_id = self.add(
+            SaaSProvider,
+            name='Main SaaS Provider' if p == 0 else f'SaaS Provider {p + 1}',
+            contact_email=f'saas{suffix}@example.com'
         )
-        return saas
+        # Create SaaS Provider User and Profile
+        self.add_user(
+            'saas_admin' if p == 0 else f'saas_admin_{p + 1}',
+            f'saas{suffix}@example.com', 'saas', UserProfile.UserType.SAAS_PROVIDER
+        )
+        return provider_id
 
-    def create_freight_companies(self, saas_provider):
+    def create_freight_companies(self, provider_id, p):
+        self.stdout.write('Creating Freight Companies...')
         companies = []
-        for i in range(3):
+        count = self.options['companies']
+        for n in range(p * count + 1, (p + 1) * count + 1):
             # Create Freight Company
-            company = FreightCompany.objects.create(
-                name=f'Freight Company {i+1}',
-                email=f'company{i+1}@example.com',
-                phone=f'+1234567890{i}',
-                address=f'Address {i+1}, City, Country',
-                saas_provider=saas_provider
-            )
-            
-            # Create Freight Company Admin
-            admin_user = User.objects.create_user(
-                username=f'freight_admin_{i+1}',
-                email=f'admin{i+1}@company{i+1}.com',
-                password='freight123'
+            company_id = self.add(
+                FreightCompany,
+                name=f'Freight Company {n}',
+                email=f'company{n}@example.com',
+                phone=f'+1234567890{n - 1}',
+                address=f'Address {n}, City, Country',
+                saas_provider_id=provider_id
             )
-            
-            # Create Freight Company Admin Profile
-            admin_profile = UserProfile.objects.create(
-                user=admin_user,
-                user_type=UserProfile.UserType.FREIGHT_ADMIN,
-                linked_company=company
+            # Create Freight Company Admin and Profile
+            self.add_user(
+                f'freight_admin_{n}', f'admin{n}@company{n}.com', 'freight',
+                UserProfile.UserType.FREIGHT_ADMIN, company_id=company_id
             )
-            
-            companies.append(company)
-        
+            companies.append(company_id)
         return companies
 
-    def create_end_customers(self, freight_companies):
+    def create_end_customers(self, freight_companies, p):
+        self.stdout.write('Creating End Customers...')
         customers = []
-        for i in range(5):
+        count = self.options['customers']
+        links = min(self.options['links_per_customer'], len(freight_companies))
+        for n in range(p * count + 1, (p + 1) * count + 1):
             # Create End Customer
-            customer = EndCustomer.objects.create(
-                name=f'End Customer {i+1}',
-                email=f'customer{i+1}@example.com',
-                phone=f'+9876543210{i}',
-                address=f'Customer Address {i+1}, City, Country'
-            )
-            
-            # Link to 2-3 random freight companies
-            num_companies = random.randint(2, 3)
-            selected_companies = random.sample(freight_companies, num_companies)
-            customer.freight_companies.set(selected_companies)
-            
-            # Create End Customer Admin
-            admin_user = User.objects.create_user(
-                username=f'customer_admin_{i+1}',
-                email=f'admin{i+1}@customer{i+1}.com',
-                password='customer123'
-            )
-            
-            # Create End Customer Admin Profile
-            admin_profile = UserProfile.objects.create(
-                user=admin_user,
-                user_type=UserProfile.UserType.END_CUSTOMER_ADMIN,
-                linked_customer=customer
+            customer_id = self.add(
+                EndCustomer,
+                name=f'End Customer {n}',
+                email=f'customer{n}@example.com',
+                phone=f'+9876543210{n - 1}',
+                address=f'Customer Address {n}, City, Country'
             )
-            
-            # Create 2-3 Staff Members
-            for j in range(random.randint(2, 3)):
-                staff_user = User.objects.create_user(
-                    username=f'customer{i+1}_staff_{j+1}',
-                    email=f'staff{j+1}@customer{i+1}.com',
-                    password='staff123'
+
+            # Link to random freight companies of the same provider
+            for company_id in self.rng.sample(freight_companies, links):
+                self.add(
+                    FreightCompanyCustomer, freight_company_id=company_id, end_customer_id=customer_id,
+                    status=FreightCompanyCustomer.Status.ACTIVE, created_at=DATE_JOINED
                 )
-                
-                # Create Staff Profile
-                staff_profile = UserProfile.objects.create(
-                    user=staff_user,
-                    user_type=UserProfile.UserType.END_CUSTOMER_STAFF,
-                    linked_customer=customer
+
+            # Create End Customer Admin and Profile
+            self.add_user(
+                f'customer_admin_{n}', f'admin{n}@customer{n}.com', 'customer',
+                UserProfile.UserType.END_CUSTOMER_ADMIN, customer_id=customer_id
+            )
+
+            # Create Staff Members
+            for j in range(self.options['staff_per_customer']):
+                self.add_user(
+                    f'customer{n}_staff_{j + 1}', f'staff{j + 1}@customer{n}.com', 'staff',
+                    UserProfile.UserType.END_CUSTOMER_STAFF, customer_id=customer_id
                 )
-            
-            customers.append(customer)
-        
+
+            customers.append(customer_id)
         return customers
 
-    def verify_data_isolation(self, saas_provider, freight_companies, end_customers):
+    def verify_data_isolation(self, freight_companies, end_customers):
         # Verify SaaS Provider Access
         self.stdout.write('Verifying SaaS Provider Access...')
         saas_companies = FreightCompany.objects.all()
         self.stdout.write(f'SaaS Provider can see {saas_companies.count()} freight companies')
-        
+
         # Verify Freight Company Admin Access
         self.stdout.write('Verifying Freight Company Admin Access...')
         for company in freight_companies:
             admin = UserProfile.objects.get(linked_company=company)
             customers = EndCustomer.objects.filter(freight_companies=company)
             self.stdout.write(f'Freight Company {company.name} admin can see {customers.count()} customers')
-        
+
         # Verify End Customer Admin Access
         self.stdout.write('Verifying End Customer Admin Access...')
         for customer in end_customers:
             admin = UserProfile.objects.get(linked_customer=customer, user_type=UserProfile.UserType.END_CUSTOMER_ADMIN)
             providers = customer.freight_companies.all()
             self.stdout.write(f'End Customer {customer.name} admin can see {providers.count()} freight companies')
-            
+
             # Verify Staff Access
             staff = UserProfile.objects.filter(
                 linked_customer=customer,
                 user_type=UserProfile.UserType.END_CUSTOMER_STAFF
             )
-            self.stdout.write(f'End Customer {customer.name} has {staff.count()} staff members') 
\ No newline at end of file
+            self.stdout.write(f'End Customer {customer.name} has {staff.count()} staff members')
@@ -0,0 +1,130 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from core.middleware import DataScopeMiddleware
+from core.models import DataScope, UserProfile, FreightCompany, EndCustomer
+from core.scoping import get_current_profile
+from major_clients.models import FreightCompanyCustomer
+from shipments.models import Shipment
+from superadmin.models import SaaSProvider
+
+
+class Command(BaseCommand):
+    help = 'Fires concurrent requests from many tenants through DataScopeMiddleware and checks for scope leaks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=20)
+        parser.add_argument('--customers-per-tenant', type=int, default=5)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=32)
+
+    def handle(self, *args, **options):
+        run_id = time.time_ns()
+        provider = SaaSProvider.objects.create(
+            name='Scoping Stress Provider',
+            contact_email=f'stress-{run_id}@example.com'
+        )
+        try:
+            tenants = self.create_tenants(provider, run_id, options)
+            failures = self.run_threaded(tenants, options)
+            failures += asyncio.run(self.run_async(tenants, options))
+        finally:
+            EndCustomer.objects.filter(name__startswith=f'stress-{run_id}-').delete()
+            User.objects.filter(username__startswith=f'stress-{run_id}-').delete()
+            provider.delete()
+
+        if failures:
+            raise CommandError(f'{failures} requests saw rows outside their tenant.')
+        self.stdout.write(self.style.SUCCESS(f'{options["requests"] * 2} requests, no cross-tenant rows.'))
+
+    def create_tenants(self, provider, run_id, options):
+        content_type = ContentType.objects.get_for_model(Shipment)
+        tenants = []
+        for i in range(options['tenants']):
+            company = FreightCompany.objects.create(name=f'Stress Company {i}', saas_provider=provider)
+            customers = EndCustomer.objects.bulk_create([
+                EndCustomer(name=f'stress-{run_id}-{i}-{j}')
+                for j in range(options['customers_per_tenant'])
+            ])
+            FreightCompanyCustomer.objects.bulk_create([
+                FreightCompanyCustomer(freight_company=company, end_customer=c) for c in customers
+            ])
+            shipments = Shipment.objects.bulk_create([
+                Shipment(freight_company=company, end_customer=c, reference=f'stress-{run_id}-{c.id}')
+                for c in customers
+            ])
+            DataScope.objects.bulk_create([
+                DataScope(content_type=content_type, object_id=s.id, freight_company=company, end_customer=s.end_customer)
+                for s in shipments
+            ])
+            user = User.objects.create(username=f'stress-{run_id}-{i}', password='!')
+            UserProfile.objects.create(
+                user=user,
+                user_type=UserProfile.UserType.FREIGHT_ADMIN,
+                linked_company=company
+            )
+            tenants.append((user, {s.id for s in shipments}))
+        return tenants
+
+    def make_request(self, tenants):
+        user, allowed = random.choice(tenants)
+        request = RequestFactory().get('/')
+        request.user = user
+        return request, allowed
+
+    def check_request(self, request, allowed):
+        # Yield mid-request so other requests interleave with this one
+        time.sleep(random.random() / 1000)
+        user_profile = get_current_profile()
+        if user_profile is None or user_profile.user_id != request.user.id:
+            return False
+        # Scoped by the manager from the ContextVar, as a view's queries are
+        seen = set(Shipment.objects.values_list('id', flat=True))
+        return seen == allowed
+
+    def run_threaded(self, tenants, options):
+        def view(request):
+            return HttpResponse(status=200 if self.check_request(request, request.allowed) else 500)
+
+        middleware = DataScopeMiddleware(view)
+
+        def fire(_):
+            request, allowed = self.make_request(tenants)
+            request.allowed = allowed
+            try:
+                return middleware(request).status_code != 200
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            failures = sum(pool.map(fire, range(options['requests'])))
+        self.stdout.write(f'threaded: {options["requests"]} requests, {failures} leaks')
+        return failures
+
+    async def run_async(self, tenants, options):
+        async def view(request):
+            await asyncio.sleep(random.random() / 1000)
+            ok = await sync_to_async(self.check_request)(request, request.allowed)
+            return HttpResponse(status=200 if ok else 500)
+
+        middleware = DataScopeMiddleware(view)
+
+        async def fire():
+            request, allowed = self.make_request(tenants)
+            request.allowed = allowed
+            response = await middleware(request)
+            return response.status_code != 200
+
+        failures = sum(await asyncio.gather(*(fire() for _ in range(options['requests']))))
+        self.stdout.write(f'async: {options["requests"]} requests, {failures} leaks')
+        return failures
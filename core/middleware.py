@@ -1,38 +1,49 @@
-from django.contrib.auth.models import User
-from .models import UserProfile
-from django.utils.deprecation import MiddlewareMixin
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from .profiles import get_request_profile
+from .scoping import reset_current_profile, set_current_profile
 
 class UserProfileMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        if request.user.is_authenticated:
-            try:
-                request.user_profile = request.user.profile
-            except UserProfile.DoesNotExist:
-                # Create profile if it doesn't exist
-                request.user_profile = UserProfile.objects.create(
-                    user=request.user,
-                    user_type=UserProfile.UserType.END_CUSTOMER_ADMIN
-                )
-        else:
-            request.user_profile = None
+        request.user_profile = get_request_profile(request)
 
         response = self.get_response(request)
         return response 
 
-class DataScopeMiddleware(MiddlewareMixin):
+class DataScopeMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        self.process_request(request)
+        # Scope is carried in a ContextVar rather than on a class attribute,
+        # so threaded and ASGI workers cannot leak it across requests
+        token = set_current_profile(request.user_profile)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_current_profile(token)
+
+    async def __acall__(self, request):
+        if not hasattr(request, 'user_profile'):
+            await sync_to_async(self.process_request, thread_sensitive=True)(request)
+        token = set_current_profile(request.user_profile)
+        try:
+            return await self.get_response(request)
+        finally:
+            reset_current_profile(token)
+
     def process_request(self, request):
-        if request.user.is_authenticated:
-            try:
-                request.user_profile = UserProfile.objects.get(user=request.user)
-            except UserProfile.DoesNotExist:
-                request.user_profile = None
-        else:
-            request.user_profile = None
-
-    def process_view(self, request, view_func, view_args, view_kwargs):
-        # Add request to model for scoped queries
-        from django.db import models
-        models.Model._request = request 
\ No newline at end of file
+        # UserProfileMiddleware normally resolved the profile already
+        if not hasattr(request, 'user_profile'):
+            request.user_profile = get_request_profile(request)
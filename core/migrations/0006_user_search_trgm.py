@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:16
+
+from django.db import migrations
+
+# auth.User is not ours to add Meta indexes to, so the staff picker's
+# trigram indexes are created here directly
+USER_INDEXES = {
+    'auth_user_username_trgm': 'username',
+    'auth_user_email_trgm': 'email',
+}
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in USER_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON auth_user USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in USER_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0005_invitation_email_outbox'),
+        # pg_trgm is created there
+        ('end_customers', '0004_name_trgm'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
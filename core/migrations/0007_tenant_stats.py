@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_user_search_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_type', models.CharField(choices=[('provider', 'SaaS Provider'), ('company', 'Freight Company'), ('customer', 'End Customer')], max_length=10)),
+                ('tenant_id', models.BigIntegerField()),
+                ('company_count', models.BigIntegerField(default=0)),
+                ('customer_count', models.BigIntegerField(default=0)),
+                ('staff_count', models.BigIntegerField(default=0)),
+                ('pending_invitation_count', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Tenant Stats',
+                'verbose_name_plural': 'Tenant Stats',
+                'constraints': [models.UniqueConstraint(fields=('tenant_type', 'tenant_id'), name='tenantstats_tenant_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_tenant_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvitationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invitation_id', models.BigIntegerField(unique=True)),
+                ('email', models.EmailField(max_length=254)),
+                ('invitation_type', models.CharField(choices=[('FREIGHT_ADMIN', 'Freight Company Admin'), ('END_CUSTOMER_ADMIN', 'End Customer Admin'), ('END_CUSTOMER_STAFF', 'End Customer Staff')], max_length=20)),
+                ('invited_by_id', models.BigIntegerField(blank=True, null=True)),
+                ('freight_company_id', models.BigIntegerField(blank=True, null=True)),
+                ('end_customer_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+                ('accepted', models.BooleanField()),
+                ('accepted_at', models.DateTimeField(blank=True, null=True)),
+                ('email_status', models.CharField(choices=[('QUEUED', 'Queued'), ('SENT', 'Sent'), ('FAILED', 'Failed')], max_length=10)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='invitation',
+            index=models.Index(condition=models.Q(('accepted', False)), fields=['email'], name='invitation_pending_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invitation',
+            index=models.Index(fields=['expires_at'], name='invitation_expires_idx'),
+        ),
+    ]
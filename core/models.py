@@ -5,8 +5,10 @@ from django.contrib.contenttypes.models import ContentType
 from major_clients.models import FreightCompany
 from end_customers.models import EndCustomer
 import uuid
+from django.core import signing
+from django.db import transaction
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 
 
 class UserProfile(models.Model):
@@ -72,27 +74,15 @@ class DataScope(models.Model):
 
 class ScopedModelManager(models.Manager):
     def get_queryset(self):
+        from .scoping import get_current_profile, scope_queryset
+
         qs = super().get_queryset()
-        request = getattr(self.model, '_request', None)
+        user_profile = get_current_profile()
         
-        if not request or not hasattr(request, 'user_profile'):
+        if not user_profile:
             return qs
 
-        user_profile = request.user_profile
-        
-        if user_profile.user_type == UserProfile.UserType.SAAS_PROVIDER:
-            return qs
-        
-        if user_profile.user_type == UserProfile.UserType.FREIGHT_ADMIN:
-            return qs.filter(
-                models.Q(datascope__freight_company=user_profile.linked_company) |
-                models.Q(datascope__end_customer__in=user_profile.linked_company.end_customers.all())
-            )
-        
-        if user_profile.user_type == UserProfile.UserType.END_CUSTOMER_ADMIN:
-            return qs.filter(datascope__end_customer=user_profile.linked_customer)
-        
-        return qs.none()
+        return scope_queryset(qs, user_profile)
 
 class ScopedModel(models.Model):
     class Meta:
@@ -100,12 +90,16 @@ class ScopedModel(models.Model):
 
     objects = ScopedModelManager()
 
+    # Tenant keys live in DataScope unless a subclass stores them on the row
+    denormalized_scope = False
+
     def save(self, *args, **kwargs):
+        from .scoping import get_current_profile
+
         super().save(*args, **kwargs)
-        request = getattr(self, '_request', None)
+        user_profile = get_current_profile()
         
-        if request and hasattr(request, 'user_profile'):
-            user_profile = request.user_profile
+        if user_profile:
             DataScope.objects.get_or_create(
                 content_type=ContentType.objects.get_for_model(self),
                 object_id=self.id,
@@ -115,6 +109,94 @@ class ScopedModel(models.Model):
                 }
             )
 
+class TenantScopedModel(ScopedModel):
+    """ScopedModel that keeps its tenant keys on the row itself.
+
+    Scoped reads filter these columns directly, so they are a single-table
+    index scan instead of a join through DataScope. Existing DataScope rows
+    are copied over with the ``backfill_scope_columns`` command.
+    """
+    freight_company = models.ForeignKey(
+        FreightCompany,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        db_index=False
+    )
+    end_customer = models.ForeignKey(
+        EndCustomer,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        db_index=False
+    )
+
+    denormalized_scope = True
+
+    class Meta:
+        abstract = True
+        indexes = [
+            models.Index(fields=['freight_company', 'id']),
+            models.Index(fields=['end_customer', 'id']),
+        ]
+
+    def save(self, *args, **kwargs):
+        from .scoping import get_current_profile
+
+        user_profile = get_current_profile()
+
+        if user_profile and self.freight_company_id is None and self.end_customer_id is None:
+            self.freight_company_id = user_profile.linked_company_id
+            self.end_customer_id = user_profile.linked_customer_id
+        # Skip ScopedModel.save, there is no DataScope row to write
+        super(ScopedModel, self).save(*args, **kwargs)
+
+class TenantStats(models.Model):
+    """Running totals for one provider, company or customer, kept current by signals.
+
+    The ``reconcile_tenant_stats`` command recounts them to fix drift from
+    writes that send no signals.
+    """
+    class TenantType(models.TextChoices):
+        PROVIDER = 'provider', 'SaaS Provider'
+        COMPANY = 'company', 'Freight Company'
+        CUSTOMER = 'customer', 'End Customer'
+
+    tenant_type = models.CharField(max_length=10, choices=TenantType.choices)
+    tenant_id = models.BigIntegerField()
+    # A customer's linked companies, or a provider's own companies
+    company_count = models.BigIntegerField(default=0)
+    # A company's linked customers, or the distinct customers of a provider's companies
+    customer_count = models.BigIntegerField(default=0)
+    # Admins as the portal dashboards list them
+    staff_count = models.BigIntegerField(default=0)
+    pending_invitation_count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.tenant_type} {self.tenant_id}"
+
+    class Meta:
+        verbose_name = "Tenant Stats"
+        verbose_name_plural = "Tenant Stats"
+        constraints = [
+            models.UniqueConstraint(fields=['tenant_type', 'tenant_id'], name='tenantstats_tenant_uniq'),
+        ]
+
+class EmailStatus(models.TextChoices):
+    QUEUED = 'QUEUED', 'Queued'
+    # Only outbox rows, while a drain worker holds them
+    SENDING = 'SENDING', 'Sending'
+    SENT = 'SENT', 'Sent'
+    FAILED = 'FAILED', 'Failed'
+
+def invitation_signer():
+    # Built per use so it follows SECRET_KEY and SECRET_KEY_FALLBACKS as they
+    # are now, and importing the models never needs the key
+    return signing.Signer(salt='core.invitation')
+
 class Invitation(models.Model):
     class InvitationType(models.TextChoices):
         FREIGHT_ADMIN = 'FREIGHT_ADMIN', 'Freight Company Admin'
@@ -131,6 +213,16 @@ class Invitation(models.Model):
     expires_at = models.DateTimeField()
     accepted = models.BooleanField(default=False)
     accepted_at = models.DateTimeField(null=True, blank=True)
+    email_status = models.CharField(max_length=10, choices=EmailStatus.choices, default=EmailStatus.QUEUED)
+    email_sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Only pending invitations are looked up by address, and they
+            # are a small slice of the table
+            models.Index(fields=['email'], condition=models.Q(accepted=False), name='invitation_pending_email_idx'),
+            models.Index(fields=['expires_at'], name='invitation_expires_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.expires_at:
@@ -140,26 +232,103 @@ class Invitation(models.Model):
     def is_expired(self):
         return timezone.now() > self.expires_at
 
+    def signed_token(self):
+        """The token as it goes in links: signed, and carrying the expiry."""
+        return invitation_signer().sign(f'{self.token.hex}.{int(self.expires_at.timestamp())}')
+
+    @staticmethod
+    def read_signed_token(value):
+        """Return ``(token, expires_at)`` from a link, or None if it was not signed by us.
+
+        Needs no query, so forged and mangled links cost nothing.
+        """
+        try:
+            token, expires = invitation_signer().unsign(value).split('.')
+            return uuid.UUID(hex=token), datetime.fromtimestamp(int(expires), tz=dt_timezone.utc)
+        except (signing.BadSignature, ValueError):
+            return None
+
     def accept(self, user):
-        if not self.is_expired() and not self.accepted:
-            self.accepted = True
-            self.accepted_at = timezone.now()
-            self.save()
+        """Accept the invitation for ``user``, creating their profile.
+
+        The invitation is claimed with a conditional update, so of two
+        concurrent accepts only one gets to create a profile.
+        """
+        from .stats import invitation_tenants, move_count
 
-            # Create user profile based on invitation type
-            profile = UserProfile.objects.create(
-                user=user,
-                user_type=self.invitation_type
+        now = timezone.now()
+        with transaction.atomic():
+            claimed = Invitation.objects.filter(pk=self.pk, accepted=False, expires_at__gte=now).update(
+                accepted=True, accepted_at=now
             )
+            if not claimed:
+                return False
+            self.accepted = True
+            self.accepted_at = now
+            # The update sends no signals, so take it off the pending counts here
+            move_count('pending_invitation_count', invitation_tenants(
+                False, self.freight_company_id, self.end_customer_id
+            ), [])
 
+            profile = UserProfile(user=user, user_type=self.invitation_type)
             if self.invitation_type == self.InvitationType.FREIGHT_ADMIN:
-                profile.linked_company = self.freight_company
+                profile.linked_company_id = self.freight_company_id
             elif self.invitation_type in [self.InvitationType.END_CUSTOMER_ADMIN, self.InvitationType.END_CUSTOMER_STAFF]:
-                profile.linked_customer = self.end_customer
+                profile.linked_customer_id = self.end_customer_id
+            profile.save(force_insert=True)
 
-            profile.save()
-            return True
-        return False
+        from .live import publish_invitation_accepted
+        publish_invitation_accepted(self)
+        return True
 
     def __str__(self):
         return f"Invitation for {self.email} ({self.invitation_type})"
+
+
+class InvitationArchive(models.Model):
+    """An expired invitation moved out of the live table by ``purge_invitations``."""
+    invitation_id = models.BigIntegerField(unique=True)
+    email = models.EmailField()
+    invitation_type = models.CharField(max_length=20, choices=Invitation.InvitationType.choices)
+    # Plain ids: the archive outlives the users and tenants it refers to
+    invited_by_id = models.BigIntegerField(null=True, blank=True)
+    freight_company_id = models.BigIntegerField(null=True, blank=True)
+    end_customer_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+    accepted = models.BooleanField()
+    accepted_at = models.DateTimeField(null=True, blank=True)
+    email_status = models.CharField(max_length=10, choices=EmailStatus.choices)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived invitation for {self.email} ({self.invitation_type})"
+
+class OutboundEmail(models.Model):
+    """An email waiting to be delivered by the ``drain_outbox`` command."""
+    invitation = models.ForeignKey(
+        Invitation,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='outbound_emails'
+    )
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to_email = models.EmailField()
+    status = models.CharField(max_length=10, choices=EmailStatus.choices, default=EmailStatus.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # While SENDING, when the worker's claim lapses and the row is due again
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"Email to {self.to_email} ({self.status})"
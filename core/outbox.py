@@ -0,0 +1,117 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import EmailStatus, Invitation, OutboundEmail
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=1)
+
+# How long a worker may hold claimed rows before another one retries them;
+# longer than a batch takes to send, or its rows would go out twice
+LEASE = timedelta(minutes=10)
+
+
+def queue_email(subject, body, to_email, invitation=None):
+    return OutboundEmail.objects.create(
+        invitation=invitation,
+        subject=subject,
+        body=body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to_email=to_email,
+    )
+
+
+def queue_emails(emails, batch_size=1000):
+    """Queue many ``OutboundEmail`` instances with multi-row inserts."""
+    for email in emails:
+        email.from_email = email.from_email or settings.DEFAULT_FROM_EMAIL
+    return OutboundEmail.objects.bulk_create(emails, batch_size=batch_size)
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def drain(batch_size=100, max_attempts=MAX_ATTEMPTS, connection=None, lease=LEASE):
+    """Send one batch of due emails over a single connection.
+
+    Rows are claimed with SKIP LOCKED in a short transaction that marks them
+    SENDING until ``now + lease``, so several workers can drain the outbox
+    at once and no lock is held while the mail server is slow. A worker
+    that dies mid-batch leaves its rows to be retried once the lease ends.
+    Returns ``(sent, failed)`` counts for the batch.
+    """
+    now = timezone.now()
+    lease_until = now + lease
+    sent = failed = 0
+
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=[EmailStatus.QUEUED, EmailStatus.SENDING], next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if not batch:
+            return sent, failed
+        claimed = OutboundEmail.objects.filter(pk__in=[email.pk for email in batch])
+        claimed.update(status=EmailStatus.SENDING, next_attempt_at=lease_until, attempts=F('attempts') + 1)
+
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception:
+        # Nothing was sent; hand the rows straight back
+        claimed.filter(status=EmailStatus.SENDING, next_attempt_at=lease_until).update(
+            status=EmailStatus.QUEUED, next_attempt_at=now, attempts=F('attempts') - 1
+        )
+        raise
+    try:
+        for email in batch:
+            message = EmailMessage(
+                email.subject, email.body, email.from_email, [email.to_email],
+                connection=connection
+            )
+            email.attempts += 1
+            try:
+                message.send()
+            except Exception as e:
+                email.last_error = str(e)
+                if email.attempts >= max_attempts:
+                    email.status = EmailStatus.FAILED
+                    failed += 1
+                else:
+                    email.status = EmailStatus.QUEUED
+                    email.next_attempt_at = timezone.now() + backoff(email.attempts)
+            else:
+                email.status = EmailStatus.SENT
+                email.sent_at = timezone.now()
+                email.last_error = ''
+                sent += 1
+    finally:
+        connection.close()
+
+    with transaction.atomic():
+        # Rows whose lease ran out belong to whichever worker reclaimed them
+        OutboundEmail.objects.filter(status=EmailStatus.SENDING, next_attempt_at=lease_until).bulk_update(
+            batch, ['status', 'next_attempt_at', 'last_error', 'sent_at']
+        )
+        _record_invitation_status(batch)
+
+    return sent, failed
+
+
+def _record_invitation_status(batch):
+    for status in (EmailStatus.SENT, EmailStatus.FAILED):
+        emails = [e for e in batch if e.invitation_id and e.status == status]
+        if not emails:
+            continue
+        Invitation.objects.filter(id__in=[e.invitation_id for e in emails]).update(
+            email_status=status,
+            email_sent_at=max(e.sent_at for e in emails) if status == EmailStatus.SENT else None
+        )
@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.crypto import constant_time_compare
+
+from .models import UserProfile
+from .versioning import bump_version, get_version, versions_are_shared
+
+PROFILE_TIMEOUT = 15 * 60
+
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+def profile_version_key(user_id):
+    return f'core:profile:{user_id}:version'
+
+
+def invalidate_profile(user_id):
+    # Bumped only once the change is committed, or a request loading the
+    # snapshot meanwhile could cache the old row under the new version
+    transaction.on_commit(lambda: bump_version(profile_version_key(user_id)))
+
+
+def _query_profile(user_id):
+    return UserProfile.objects.select_related(
+        'user', 'linked_company', 'linked_customer'
+    ).filter(user_id=user_id).first()
+
+
+def load_profile(user_id):
+    """Return the profile for ``user_id`` with its user, company and customer.
+
+    The snapshot is cached under the user's profile version, so a hot cache
+    costs no queries and a cold one costs a single select_related query.
+    When the default cache is local to the process, a bump would only reach
+    the worker that made it and the others would keep authenticating the old
+    user, so every load queries instead.
+    """
+    if not versions_are_shared():
+        return _query_profile(user_id)
+    version = get_version(profile_version_key(user_id))
+    key = f'core:profile:{user_id}:v{version}'
+    user_profile = cache.get(key)
+    if user_profile is None:
+        user_profile = _query_profile(user_id)
+        if user_profile is None:
+            return None
+        cache.set(key, user_profile, PROFILE_TIMEOUT)
+    return user_profile
+
+
+def _session_user(request, user_profile):
+    # Mirrors the checks django.contrib.auth.get_user() makes, for the
+    # default backend only; anything else takes the regular path.
+    session = request.session
+    if session.get(BACKEND_SESSION_KEY) != MODEL_BACKEND or MODEL_BACKEND not in settings.AUTHENTICATION_BACKENDS:
+        return None
+    user = user_profile.user
+    if not user.is_active:
+        return None
+    session_hash = session.get(HASH_SESSION_KEY)
+    if not session_hash or not constant_time_compare(session_hash, user.get_session_auth_hash()):
+        return None
+    return user
+
+
+def get_request_profile(request):
+    """Resolve ``request.user`` and its profile with at most one query."""
+    session = getattr(request, 'session', None)
+    user_id = session.get(SESSION_KEY) if session is not None else None
+
+    if user_id is not None:
+        user_id = get_user_model()._meta.pk.to_python(user_id)
+        user_profile = load_profile(user_id)
+        if user_profile is not None:
+            user = _session_user(request, user_profile)
+            if user is not None:
+                # Replaces AuthenticationMiddleware's lazy user so it never
+                # runs its own query
+                request.user = user
+                return user_profile
+
+    if not request.user.is_authenticated:
+        return None
+    try:
+        return request.user.profile
+    except UserProfile.DoesNotExist:
+        # Create profile if it doesn't exist
+        return UserProfile.objects.create(
+            user=request.user,
+            user_type=UserProfile.UserType.END_CUSTOMER_ADMIN
+        )
@@ -0,0 +1,46 @@
+from django.db import transaction
+
+from .models import Invitation, InvitationArchive, OutboundEmail
+from .stats import COMPANY, CUSTOMER, PROVIDER, _providers, refresh_stats
+
+ARCHIVE_FIELDS = (
+    'id', 'email', 'invitation_type', 'invited_by_id', 'freight_company_id', 'end_customer_id',
+    'created_at', 'expires_at', 'accepted', 'accepted_at', 'email_status',
+)
+
+
+def purge_invitations(cutoff, batch_size=1000):
+    """Archive and delete one batch of invitations that expired before ``cutoff``.
+
+    Returns the number of invitations purged; call again until it returns 0.
+    Each batch is its own short transaction, and rows a concurrent accept
+    has locked are skipped rather than waited for.
+    """
+    with transaction.atomic():
+        rows = list(
+            Invitation.objects.select_for_update(skip_locked=True)
+            .filter(expires_at__lt=cutoff)
+            .order_by('expires_at')
+            .values_list(*ARCHIVE_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+        InvitationArchive.objects.bulk_create([
+            InvitationArchive(invitation_id=pk, **dict(zip(ARCHIVE_FIELDS[1:], values)))
+            for pk, *values in rows
+        ])
+        ids = [row[0] for row in rows]
+        OutboundEmail.objects.filter(invitation_id__in=ids).delete()
+        # A plain DELETE: the per-row signals would recount the same few
+        # tenants once per invitation, they are recounted once below instead
+        Invitation.objects.filter(pk__in=ids)._raw_delete(Invitation.objects.db)
+
+        pending = [row for row in rows if not row[8]]
+        company_ids = {row[4] for row in pending if row[4]}
+        customer_ids = {row[5] for row in pending if row[5]}
+        if company_ids:
+            refresh_stats(COMPANY, company_ids)
+            refresh_stats(PROVIDER, {pk for pk in _providers(company_ids).values() if pk})
+        if customer_ids:
+            refresh_stats(CUSTOMER, customer_ids)
+    return len(rows)
@@ -0,0 +1,128 @@
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from major_clients.models import FreightCompanyCustomer
+from .models import DataScope, UserProfile
+from .versioning import bump_version, get_version, versions_are_shared
+
+VISIBILITY_TIMEOUT = 60 * 60
+
+# The ids a profile may see. ``None`` in place of a Visibility means unrestricted.
+Visibility = namedtuple('Visibility', ['company_ids', 'customer_ids'])
+
+EMPTY_VISIBILITY = Visibility((), ())
+
+# The profile whose scope applies to the code currently running. A ContextVar
+# is per thread and per asyncio task, so concurrent requests never see each
+# other's scope.
+_current_profile = ContextVar('core_current_profile', default=None)
+
+
+def get_current_profile():
+    return _current_profile.get()
+
+
+def set_current_profile(user_profile):
+    return _current_profile.set(user_profile)
+
+
+def reset_current_profile(token):
+    _current_profile.reset(token)
+
+
+@contextmanager
+def profile_scope(user_profile):
+    """Run a block as ``user_profile``, e.g. from a management command or task."""
+    token = set_current_profile(user_profile)
+    try:
+        yield user_profile
+    finally:
+        reset_current_profile(token)
+
+
+def company_version_key(company_id):
+    return f'core:visibility:company:{company_id}:version'
+
+
+def invalidate_company(company_id):
+    # Bumped only once the change is committed, or a request compiling
+    # meanwhile could read the old rows and cache them under the new version
+    transaction.on_commit(lambda: bump_version(company_version_key(company_id)))
+
+
+def compile_visibility(user_profile):
+    if user_profile.user_type == UserProfile.UserType.SAAS_PROVIDER:
+        return None
+
+    if user_profile.user_type == UserProfile.UserType.FREIGHT_ADMIN:
+        if not user_profile.linked_company_id:
+            return EMPTY_VISIBILITY
+        customer_ids = FreightCompanyCustomer.objects.filter(
+            freight_company_id=user_profile.linked_company_id,
+            status=FreightCompanyCustomer.Status.ACTIVE
+        ).order_by('end_customer_id').values_list('end_customer_id', flat=True)
+        return Visibility((user_profile.linked_company_id,), tuple(customer_ids))
+
+    if user_profile.user_type == UserProfile.UserType.END_CUSTOMER_ADMIN:
+        if not user_profile.linked_customer_id:
+            return EMPTY_VISIBILITY
+        return Visibility((), (user_profile.linked_customer_id,))
+
+    return EMPTY_VISIBILITY
+
+
+def get_visibility(user_profile):
+    if user_profile.user_type != UserProfile.UserType.FREIGHT_ADMIN:
+        # Nothing to look up, so there is nothing worth caching either
+        return compile_visibility(user_profile)
+
+    cached = getattr(user_profile, '_visibility_cache', None)
+    if cached is not None:
+        return cached
+
+    if not versions_are_shared():
+        # Another worker's bump would never reach this one's cache, leaving
+        # an unlinked customer visible here until the entry expired
+        visibility = compile_visibility(user_profile)
+    else:
+        company_id = user_profile.linked_company_id
+        version = get_version(company_version_key(company_id))
+        key = f'core:visibility:{user_profile.user_type}:{company_id}:v{version}'
+        visibility = cache.get(key)
+        if visibility is None:
+            visibility = compile_visibility(user_profile)
+            cache.set(key, visibility, VISIBILITY_TIMEOUT)
+
+    user_profile._visibility_cache = visibility
+    return visibility
+
+
+def scope_queryset(qs, user_profile):
+    visibility = get_visibility(user_profile)
+    if visibility is None:
+        return qs
+
+    condition = Q()
+    if visibility.company_ids:
+        condition |= Q(freight_company_id__any=visibility.company_ids)
+    if visibility.customer_ids:
+        condition |= Q(end_customer_id__any=visibility.customer_ids)
+    if not condition:
+        return qs.none()
+
+    if getattr(qs.model, 'denormalized_scope', False):
+        return qs.filter(condition)
+
+    # A semi-join on the side table keeps one row per object however many
+    # scope rows match, instead of multiplying rows through a join.
+    scoped_ids = DataScope.objects.filter(
+        condition,
+        content_type=ContentType.objects.get_for_model(qs.model),
+    ).values('object_id')
+    return qs.filter(pk__in=scoped_ids)
@@ -0,0 +1,53 @@
+from django.db.models import Q
+from django.http import JsonResponse
+
+from .models import UserProfile
+
+SEARCH_PAGE_SIZE = 20
+
+# Trigram indexes only help once the term has a full trigram; shorter terms
+# fall back to prefix matching, which the same index still serves
+MIN_TRIGRAM_LENGTH = 3
+
+
+def search_queryset(queryset, term, fields):
+    lookup = 'icontains' if len(term) >= MIN_TRIGRAM_LENGTH else 'istartswith'
+    match = Q()
+    for field in fields:
+        match |= Q(**{f'{field}__{lookup}': term})
+    return queryset.filter(match)
+
+
+def search_response(request, queryset, fields, label):
+    """Answer a picker search with one cursor-paginated page of JSON.
+
+    ``?q=`` is matched against ``fields``; ``?after=`` is the ``next`` cursor
+    from the previous page, so every page is a keyset scan on the primary key
+    rather than an OFFSET.
+    """
+    term = request.GET.get('q', '').strip()
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        after = 0
+
+    if term:
+        queryset = search_queryset(queryset, term, fields)
+    page = list(queryset.filter(pk__gt=after).order_by('pk')[:SEARCH_PAGE_SIZE + 1])
+    results = page[:SEARCH_PAGE_SIZE]
+    return JsonResponse({
+        'results': [{'id': obj.pk, 'text': label(obj)} for obj in results],
+        'next': results[-1].pk if len(page) > SEARCH_PAGE_SIZE else None,
+    })
+
+
+def staff_candidates(queryset):
+    """Users that are not attached to any tenant and may be added as staff."""
+    return queryset.filter(
+        Q(profile__isnull=True) |
+        Q(profile__linked_company__isnull=True, profile__linked_customer__isnull=True)
+    ).exclude(profile__user_type=UserProfile.UserType.SAAS_PROVIDER)
+
+
+def user_label(user):
+    return f'{user.username} ({user.email})' if user.email else user.username
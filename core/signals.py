@@ -0,0 +1,229 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from end_customers.models import EndCustomer
+from major_clients.models import FreightCompany, FreightCompanyCustomer
+from superadmin.models import SaaSProvider
+from . import stats
+from .fragments import invalidate_fragments
+from .graph import invalidate_graph
+from .live import publish_links, publish_staff
+from .models import Invitation, UserProfile
+from .profiles import invalidate_profile
+from .scoping import invalidate_company
+
+
+@receiver(m2m_changed, sender=FreightCompanyCustomer)
+def invalidate_company_visibility(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # post_clear carries no pk_set, so note the other side before it goes
+        related = instance.freight_companies if reverse else instance.end_customers
+        instance._cleared_ids = list(related.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    invalidate_graph()
+    if action == 'post_clear' and reverse:
+        pk_set = getattr(instance, '_cleared_ids', ())
+    if not reverse:
+        invalidate_company(instance.pk)
+    elif pk_set:
+        for company_id in pk_set:
+            invalidate_company(company_id)
+
+
+@receiver(post_save, sender=FreightCompanyCustomer)
+@receiver(post_delete, sender=FreightCompanyCustomer)
+def invalidate_link_visibility(sender, instance, **kwargs):
+    # Links saved as rows, e.g. a status change, bypass m2m_changed
+    invalidate_graph()
+    invalidate_company(instance.freight_company_id)
+
+
+@receiver(post_save, sender=FreightCompanyCustomer)
+def invalidate_link_fragments(sender, instance, created, **kwargs):
+    # New links are counted, which retires the fragments; a status change
+    # is not, but the dashboards only list active links
+    if not created:
+        invalidate_fragments(stats.COMPANY, [instance.freight_company_id])
+        invalidate_fragments(stats.CUSTOMER, [instance.end_customer_id])
+
+
+@receiver(m2m_changed, sender=FreightCompanyCustomer)
+def publish_link_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_ids', ())
+    if reverse:
+        publish_links(pk_set or (), [instance.pk], action == 'post_add')
+    else:
+        publish_links([instance.pk], pk_set or (), action == 'post_add')
+
+
+@receiver(post_save, sender=FreightCompanyCustomer)
+def publish_link_created(sender, instance, created, **kwargs):
+    if created:
+        publish_links([instance.freight_company_id], [instance.end_customer_id], True)
+
+
+@receiver(post_delete, sender=FreightCompanyCustomer)
+def publish_link_deleted(sender, instance, **kwargs):
+    publish_links([instance.freight_company_id], [instance.end_customer_id], False)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile_snapshot(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def publish_staff_changes(sender, instance, **kwargs):
+    publish_staff(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_snapshot(sender, instance, **kwargs):
+    invalidate_profile(instance.pk)
+
+
+@receiver(post_save, sender=FreightCompany)
+@receiver(post_save, sender=EndCustomer)
+def invalidate_linked_snapshots(sender, instance, created, **kwargs):
+    # Snapshots embed the linked company/customer, so renames must reach them
+    if created:
+        return
+    for user_id in instance.admin_profiles.values_list('user_id', flat=True):
+        invalidate_profile(user_id)
+
+
+@receiver(pre_delete, sender=FreightCompany)
+@receiver(pre_delete, sender=EndCustomer)
+def invalidate_orphaned_snapshots(sender, instance, **kwargs):
+    # Deleting nulls the link with a bulk UPDATE, which sends no signals
+    for user_id in instance.admin_profiles.values_list('user_id', flat=True):
+        invalidate_profile(user_id)
+
+
+@receiver(m2m_changed, sender=FreightCompanyCustomer)
+def count_links_added(sender, instance, action, reverse, pk_set, **kwargs):
+    # Removals are counted by count_link_deleted: the through rows are
+    # deleted one by one, with post_delete
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        stats.links_added((company_id, instance.pk) for company_id in pk_set)
+    else:
+        stats.links_added((instance.pk, customer_id) for customer_id in pk_set)
+
+
+@receiver(post_save, sender=FreightCompanyCustomer)
+def count_link_created(sender, instance, created, **kwargs):
+    if created:
+        stats.links_added([(instance.freight_company_id, instance.end_customer_id)])
+
+
+@receiver(post_delete, sender=FreightCompanyCustomer)
+def count_link_deleted(sender, instance, **kwargs):
+    # Removing a customer from several companies, or deleting a tenant,
+    # deletes its links one by one; they are recounted once after commit
+    stats.recount_after_commit([(stats.COMPANY, instance.freight_company_id), (stats.CUSTOMER, instance.end_customer_id)])
+
+
+@receiver(pre_save, sender=UserProfile)
+def remember_profile_tenants(sender, instance, **kwargs):
+    old = UserProfile.objects.filter(pk=instance.pk).values_list(
+        'user_type', 'linked_company_id', 'linked_customer_id'
+    ).first() if instance.pk else None
+    instance._stats_tenants = stats.profile_tenants(*old) if old else []
+
+
+@receiver(post_save, sender=UserProfile)
+def count_profile_saved(sender, instance, **kwargs):
+    stats.move_count('staff_count', getattr(instance, '_stats_tenants', []), stats.profile_tenants(
+        instance.user_type, instance.linked_company_id, instance.linked_customer_id
+    ))
+
+
+@receiver(post_delete, sender=UserProfile)
+def count_profile_deleted(sender, instance, **kwargs):
+    stats.move_count('staff_count', stats.profile_tenants(
+        instance.user_type, instance.linked_company_id, instance.linked_customer_id
+    ), [])
+
+
+@receiver(pre_save, sender=Invitation)
+def remember_invitation_tenants(sender, instance, **kwargs):
+    old = Invitation.objects.filter(pk=instance.pk).values_list(
+        'accepted', 'freight_company_id', 'end_customer_id'
+    ).first() if instance.pk else None
+    instance._stats_tenants = stats.invitation_tenants(*old) if old else []
+
+
+@receiver(post_save, sender=Invitation)
+def count_invitation_saved(sender, instance, **kwargs):
+    stats.move_count('pending_invitation_count', getattr(instance, '_stats_tenants', []), stats.invitation_tenants(
+        instance.accepted, instance.freight_company_id, instance.end_customer_id
+    ))
+
+
+@receiver(post_delete, sender=Invitation)
+def count_invitation_deleted(sender, instance, **kwargs):
+    # Deleting a tenant cascades to its invitations row by row
+    if not instance.accepted:
+        stats.recount_after_commit([(stats.COMPANY, instance.freight_company_id), (stats.CUSTOMER, instance.end_customer_id)])
+
+
+@receiver(post_save, sender=FreightCompany)
+def count_company_created(sender, instance, created, **kwargs):
+    # Moving a company to another provider is left to the nightly reconcile
+    if created:
+        stats.adjust_stats({(stats.PROVIDER, instance.saas_provider_id): {'company_count': 1}})
+
+
+@receiver(post_delete, sender=FreightCompany)
+def count_company_deleted(sender, instance, **kwargs):
+    stats.delete_stats(stats.COMPANY, instance.pk)
+    # Its links and admins are gone by now; recount rather than subtract
+    stats.refresh_stats(stats.PROVIDER, [instance.saas_provider_id])
+
+
+@receiver(post_delete, sender=EndCustomer)
+def count_customer_deleted(sender, instance, **kwargs):
+    stats.delete_stats(stats.CUSTOMER, instance.pk)
+
+
+@receiver(post_delete, sender=SaaSProvider)
+def count_provider_deleted(sender, instance, **kwargs):
+    stats.delete_stats(stats.PROVIDER, instance.pk)
+
+
+@receiver(post_save, sender=FreightCompany)
+@receiver(post_delete, sender=FreightCompany)
+def invalidate_company_fragments(sender, instance, created=False, **kwargs):
+    # Counts are retired by the stats they come from; names are not counted
+    invalidate_fragments(stats.COMPANY, [instance.pk], directory=True)
+    if kwargs['signal'] is post_save and not created:
+        invalidate_fragments(stats.CUSTOMER, instance.end_customers.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=EndCustomer)
+@receiver(post_delete, sender=EndCustomer)
+def invalidate_customer_fragments(sender, instance, created=False, **kwargs):
+    invalidate_fragments(stats.CUSTOMER, [instance.pk], directory=True)
+    if kwargs['signal'] is post_save and not created:
+        invalidate_fragments(stats.COMPANY, instance.freight_companies.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=SaaSProvider)
+def invalidate_provider_fragments(sender, instance, created, **kwargs):
+    # Customer dashboards show each company's provider
+    if not created:
+        invalidate_fragments(stats.CUSTOMER, FreightCompanyCustomer.objects.filter(
+            freight_company__saas_provider=instance
+        ).values_list('end_customer_id', flat=True).distinct())
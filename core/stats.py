@@ -0,0 +1,283 @@
+import threading
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from django.utils import timezone
+
+from end_customers.models import EndCustomer
+from major_clients.models import FreightCompany, FreightCompanyCustomer
+from superadmin.models import SaaSProvider
+from .fragments import invalidate_fragments
+from .models import Invitation, TenantStats, UserProfile
+
+PROVIDER = TenantStats.TenantType.PROVIDER
+COMPANY = TenantStats.TenantType.COMPANY
+CUSTOMER = TenantStats.TenantType.CUSTOMER
+
+FIELDS = ('company_count', 'customer_count', 'staff_count', 'pending_invitation_count')
+
+TENANT_MODELS = {PROVIDER: SaaSProvider, COMPANY: FreightCompany, CUSTOMER: EndCustomer}
+
+
+def get_stats(tenant_type, tenant_ids):
+    """Return ``{tenant_id: TenantStats}``, counting any tenant without a row yet."""
+    rows = {
+        row.tenant_id: row
+        for row in TenantStats.objects.filter(tenant_type=tenant_type, tenant_id__in=tenant_ids)
+    }
+    missing = [pk for pk in tenant_ids if pk not in rows]
+    if missing:
+        rows.update(refresh_stats(tenant_type, missing)[0])
+    return rows
+
+
+def get_tenant_stats(tenant_type, tenant_id):
+    return get_stats(tenant_type, [tenant_id]).get(tenant_id) or TenantStats(
+        tenant_type=tenant_type, tenant_id=tenant_id
+    )
+
+
+def adjust_stats(changes):
+    """Apply ``{(tenant_type, tenant_id): {field: delta}}`` to the stored totals.
+
+    Runs in the caller's transaction, so a rolled back change takes its
+    adjustment with it. Each tenant type costs one lookup and one UPDATE
+    however many tenants change; tenants without a row are counted from
+    scratch together.
+    """
+    by_type = defaultdict(dict)
+    for (tenant_type, tenant_id), deltas in changes.items():
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if deltas and tenant_id is not None:
+            by_type[tenant_type][tenant_id] = deltas
+
+    for tenant_type, rows in by_type.items():
+        existing = set(TenantStats.objects.filter(
+            tenant_type=tenant_type, tenant_id__in=rows
+        ).values_list('tenant_id', flat=True))
+        if existing:
+            fields = {field for pk in existing for field in rows[pk]}
+            TenantStats.objects.filter(tenant_type=tenant_type, tenant_id__in=existing).update(
+                updated_at=timezone.now(),
+                **{field: F(field) + Case(
+                    *[When(tenant_id=pk, then=Value(rows[pk][field])) for pk in existing if field in rows[pk]],
+                    default=Value(0), output_field=IntegerField()
+                ) for field in fields}
+            )
+            _invalidate(tenant_type, existing, fields)
+        missing = [pk for pk in rows if pk not in existing]
+        if missing:
+            refresh_stats(tenant_type, missing)
+
+
+def _invalidate(tenant_type, tenant_ids, fields):
+    # The portal dashboards show these figures; the directory lists each
+    # company's customer count
+    if tenant_type != PROVIDER:
+        invalidate_fragments(tenant_type, tenant_ids, directory=tenant_type == COMPANY and 'customer_count' in fields)
+
+
+def _grouped(queryset, key, **aggregate):
+    return dict(queryset.values_list(key).annotate(**aggregate).order_by())
+
+
+def count_stats(tenant_type, tenant_ids):
+    """Count every figure exactly for ``tenant_ids``, a handful of grouped queries per call."""
+    links = FreightCompanyCustomer.objects
+    pending = Invitation.objects.filter(accepted=False)
+    if tenant_type == COMPANY:
+        counts = {
+            'customer_count': _grouped(links.filter(freight_company_id__in=tenant_ids), 'freight_company_id', n=Count('id')),
+            'staff_count': _grouped(UserProfile.objects.filter(
+                user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company_id__in=tenant_ids
+            ), 'linked_company_id', n=Count('id')),
+            'pending_invitation_count': _grouped(
+                pending.filter(freight_company_id__in=tenant_ids), 'freight_company_id', n=Count('id')
+            ),
+        }
+    elif tenant_type == CUSTOMER:
+        counts = {
+            'company_count': _grouped(links.filter(end_customer_id__in=tenant_ids), 'end_customer_id', n=Count('id')),
+            'staff_count': _grouped(UserProfile.objects.filter(
+                user_type=UserProfile.UserType.END_CUSTOMER_ADMIN, linked_customer_id__in=tenant_ids
+            ), 'linked_customer_id', n=Count('id')),
+            'pending_invitation_count': _grouped(
+                pending.filter(end_customer_id__in=tenant_ids), 'end_customer_id', n=Count('id')
+            ),
+        }
+    else:
+        counts = {
+            'company_count': _grouped(
+                FreightCompany.objects.filter(saas_provider_id__in=tenant_ids), 'saas_provider_id', n=Count('id')
+            ),
+            'customer_count': _grouped(
+                links.filter(freight_company__saas_provider_id__in=tenant_ids),
+                'freight_company__saas_provider_id', n=Count('end_customer_id', distinct=True)
+            ),
+            'staff_count': _grouped(UserProfile.objects.filter(
+                user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company__saas_provider_id__in=tenant_ids
+            ), 'linked_company__saas_provider_id', n=Count('id')),
+            'pending_invitation_count': _grouped(
+                pending.filter(freight_company__saas_provider_id__in=tenant_ids),
+                'freight_company__saas_provider_id', n=Count('id')
+            ),
+        }
+    return {
+        pk: {field: counts[field].get(pk, 0) if field in counts else 0 for field in FIELDS}
+        for pk in tenant_ids
+    }
+
+
+def refresh_stats(tenant_type, tenant_ids):
+    """Recount ``tenant_ids`` and store the results, fixing any drift.
+
+    Returns ``({tenant_id: TenantStats}, rows that were wrong or missing)``.
+    Ids of deleted tenants are skipped.
+    """
+    tenant_ids = list(TENANT_MODELS[tenant_type].objects.filter(pk__in=tenant_ids).values_list('pk', flat=True))
+    if not tenant_ids:
+        return {}, 0
+    counts = count_stats(tenant_type, tenant_ids)
+    rows = {
+        row.tenant_id: row
+        for row in TenantStats.objects.filter(tenant_type=tenant_type, tenant_id__in=tenant_ids)
+    }
+    now = timezone.now()
+    changed, created = [], []
+    for pk, values in counts.items():
+        row = rows.get(pk)
+        if row is None:
+            row = rows[pk] = TenantStats(tenant_type=tenant_type, tenant_id=pk, updated_at=now, **values)
+            created.append(row)
+        elif any(getattr(row, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(row, field, value)
+            row.updated_at = now
+            changed.append(row)
+    TenantStats.objects.bulk_update(changed, FIELDS + ('updated_at',))
+    # A concurrent refresh may have created the same row; either count is current
+    TenantStats.objects.bulk_create(created, ignore_conflicts=True)
+    _invalidate(tenant_type, [row.tenant_id for row in changed + created], FIELDS)
+    return rows, len(changed) + len(created)
+
+
+def delete_stats(tenant_type, tenant_id):
+    TenantStats.objects.filter(tenant_type=tenant_type, tenant_id=tenant_id).delete()
+
+
+def _providers(company_ids):
+    return dict(FreightCompany.objects.filter(pk__in=company_ids).values_list('pk', 'saas_provider_id'))
+
+
+def links_added(pairs):
+    """Count new ``(company_id, customer_id)`` links, already written."""
+    pairs = set(pairs)
+    if not pairs:
+        return
+    changes = defaultdict(lambda: defaultdict(int))
+    for company_id, customer_id in pairs:
+        changes[COMPANY, company_id]['customer_count'] += 1
+        changes[CUSTOMER, customer_id]['company_count'] += 1
+
+    # A provider counts a customer once, on its first link to any of the
+    # provider's companies: when all its links there are the new ones
+    providers = _providers({company_id for company_id, _ in pairs})
+    added = Counter(
+        (providers[company_id], customer_id) for company_id, customer_id in pairs
+        if providers.get(company_id) is not None
+    )
+    if added:
+        totals = FreightCompanyCustomer.objects.filter(
+            end_customer_id__in={customer_id for _, customer_id in added},
+            freight_company__saas_provider_id__in={provider_id for provider_id, _ in added},
+        ).values_list('freight_company__saas_provider_id', 'end_customer_id').annotate(n=Count('id')).order_by()
+        for provider_id, customer_id, n in totals:
+            if added.get((provider_id, customer_id)) == n:
+                changes[PROVIDER, provider_id]['customer_count'] += 1
+    adjust_stats(changes)
+
+
+_pending = threading.local()
+
+
+def recount_after_commit(tenants):
+    """Recount ``(tenant_type, tenant_id)`` pairs once the transaction commits.
+
+    For row-by-row deletes such as a cascade, which would otherwise adjust
+    the same few tenants once per row: the tenants collect here and are
+    recounted together, with their companies' providers, by the first
+    callback to run. Tenants left over by a rolled back transaction are just
+    recounted with the next one.
+    """
+    pending = getattr(_pending, 'tenants', None)
+    if pending is None:
+        pending = _pending.tenants = set()
+    pending.update(tenant for tenant in tenants if tenant[1] is not None)
+    transaction.on_commit(_recount_pending)
+
+
+def _recount_pending():
+    pending, _pending.tenants = getattr(_pending, 'tenants', None), set()
+    if not pending:
+        return
+    by_type = defaultdict(set)
+    for tenant_type, tenant_id in pending:
+        by_type[tenant_type].add(tenant_id)
+    if by_type[COMPANY]:
+        by_type[PROVIDER].update(pk for pk in _providers(by_type[COMPANY]).values() if pk)
+    for tenant_type, tenant_ids in by_type.items():
+        if tenant_ids:
+            refresh_stats(tenant_type, tenant_ids)
+
+
+def profile_tenants(user_type, company_id, customer_id):
+    """The tenants whose staff count includes a profile with these values."""
+    if user_type == UserProfile.UserType.FREIGHT_ADMIN and company_id:
+        return [(COMPANY, company_id), (PROVIDER, _providers([company_id]).get(company_id))]
+    if user_type == UserProfile.UserType.END_CUSTOMER_ADMIN and customer_id:
+        return [(CUSTOMER, customer_id)]
+    return []
+
+
+def invitation_tenants(accepted, company_id, customer_id):
+    """The tenants whose pending count includes an invitation with these values."""
+    if accepted:
+        return []
+    tenants = []
+    if company_id:
+        tenants += [(COMPANY, company_id), (PROVIDER, _providers([company_id]).get(company_id))]
+    if customer_id:
+        tenants.append((CUSTOMER, customer_id))
+    return tenants
+
+
+def move_count(field, before, after, n=1):
+    """Take ``n`` off ``field`` for the ``before`` tenants and add it to the ``after`` ones."""
+    changes = defaultdict(lambda: defaultdict(int))
+    for tenant in before:
+        changes[tenant][field] -= n
+    for tenant in after:
+        changes[tenant][field] += n
+    adjust_stats(changes)
+
+
+def reconcile_stats(tenant_type, batch_size=1000):
+    """Recount every tenant of ``tenant_type`` and drop rows of deleted ones.
+
+    Returns ``(tenants checked, rows fixed, rows deleted)``.
+    """
+    model = TENANT_MODELS[tenant_type]
+    checked = fixed = 0
+    after = 0
+    while True:
+        ids = list(model.objects.filter(pk__gt=after).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        fixed += refresh_stats(tenant_type, ids)[1]
+        checked += len(ids)
+        after = ids[-1]
+    deleted, _ = TenantStats.objects.filter(tenant_type=tenant_type).exclude(
+        tenant_id__in=model.objects.values('pk')
+    ).delete()
+    return checked, fixed, deleted
@@ -1,3 +1,718 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import os
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.contenttypes.models import ContentType
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from end_customers.models import EndCustomer
+from major_clients.models import FreightCompany, FreightCompanyCustomer
+from shipments.models import Shipment, TrackingEvent
+from shipments.partitions import ensure_partitions
+from superadmin.models import SaaSProvider
+from . import instrumentation, live
+from .checks import check_cache_dir
+from .fragments import cached_fragment
+from .graph import RelationshipGraph
+from .models import DataScope, EmailStatus, Invitation, InvitationArchive, OutboundEmail, TenantStats, UserProfile
+from .outbox import drain, queue_email
+from .profiles import get_request_profile, load_profile
+from .retention import purge_invitations
+from .search import SEARCH_PAGE_SIZE
+from .scoping import company_version_key, get_current_profile, get_visibility, profile_scope
+from .stats import FIELDS, TENANT_MODELS, count_stats
+from .versioning import get_version
+
+
+def file_cache(location):
+    return override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+    }})
+
+
+def local_cache():
+    return override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests',
+    }})
+
+
+class TenantTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.provider = SaaSProvider.objects.create(name='Provider', contact_email='provider@example.com')
+        self.company = FreightCompany.objects.create(name='Carrier', saas_provider=self.provider)
+        self.customer = EndCustomer.objects.create(name='Shipper')
+
+
+class VisibilityInvalidationTests(TenantTestCase):
+    def test_version_is_bumped_after_commit(self):
+        key = company_version_key(self.company.pk)
+        before = get_version(key)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.company.end_customers.add(self.customer)
+            # A request compiling now would see the uncommitted link
+            self.assertEqual(get_version(key), before)
+        self.assertNotEqual(get_version(key), before)
+
+    def test_new_link_is_visible_after_commit(self):
+        profile = UserProfile(user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company=self.company)
+        self.assertEqual(get_visibility(profile).customer_ids, ())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.company.end_customers.add(self.customer)
+        profile = UserProfile(user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company=self.company)
+        self.assertEqual(get_visibility(profile).customer_ids, (self.customer.pk,))
+
+    def test_process_local_cache_compiles_on_every_request(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.company.end_customers.add(self.customer)
+        with local_cache():
+            profile = UserProfile(user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company=self.company)
+            self.assertEqual(get_visibility(profile).customer_ids, (self.customer.pk,))
+            # Unlinked by another worker, whose bump this cache never sees
+            FreightCompanyCustomer.objects.filter(freight_company=self.company).delete()
+            profile = UserProfile(user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company=self.company)
+            self.assertEqual(get_visibility(profile).customer_ids, ())
+
+
+class ProfileSnapshotTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(file_cache(self.enterContext(tempfile.TemporaryDirectory())))
+        self.user = User.objects.create_user('admin', password='secret')
+        UserProfile.objects.create(
+            user=self.user, user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company=self.company
+        )
+
+    def read(self, profile):
+        return profile.user.username, profile.user.is_active, profile.linked_company.name, profile.linked_customer
+
+    def test_cold_load_is_one_query(self):
+        with self.assertNumQueries(1):
+            profile = load_profile(self.user.pk)
+            self.assertEqual(self.read(profile), ('admin', True, 'Carrier', None))
+
+    def test_warm_load_needs_no_query(self):
+        load_profile(self.user.pk)
+        with self.assertNumQueries(0):
+            self.read(load_profile(self.user.pk))
+
+    def test_request_resolves_user_and_profile_from_the_cache(self):
+        self.client.force_login(self.user)
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.session = self.client.session
+        request.session.load()
+        get_request_profile(request)
+        with self.assertNumQueries(0):
+            profile = get_request_profile(request)
+            self.assertEqual(request.user, self.user)
+            self.assertEqual(profile.linked_company, self.company)
+
+    def test_snapshot_is_replaced_after_commit(self):
+        load_profile(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+            self.assertTrue(load_profile(self.user.pk).user.is_active)
+        self.assertFalse(load_profile(self.user.pk).user.is_active)
+
+    def test_process_local_cache_loads_from_the_database(self):
+        with local_cache():
+            load_profile(self.user.pk)
+            # Another worker deactivates the user; this one never sees the bump
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            with self.assertNumQueries(1):
+                self.assertFalse(load_profile(self.user.pk).user.is_active)
+
+
+class RelationshipGraphTests(TenantTestCase):
+    def test_process_local_cache_checks_the_database(self):
+        graph = RelationshipGraph()
+        graph.rebuild()
+        self.company.end_customers.add(self.customer)
+        with self.assertNumQueries(1):
+            self.assertTrue(graph.is_linked(self.company.pk, self.customer.pk))
+
+    def test_shared_cache_answers_from_the_graph(self):
+        with tempfile.TemporaryDirectory() as directory, file_cache(directory):
+            self.company.end_customers.add(self.customer)
+            graph = RelationshipGraph()
+            graph.rebuild()
+            with self.assertNumQueries(0):
+                self.assertTrue(graph.is_linked(self.company.pk, self.customer.pk))
+                self.assertFalse(graph.is_linked(self.company.pk, self.customer.pk + 1))
+
+
+class TenantStatsTests(TenantTestCase):
+    def assertStatsExact(self):
+        for tenant_type, model in TENANT_MODELS.items():
+            ids = list(model.objects.values_list('pk', flat=True))
+            stored = {
+                row.tenant_id: {field: getattr(row, field) for field in FIELDS}
+                for row in TenantStats.objects.filter(tenant_type=tenant_type)
+            }
+            exact = count_stats(tenant_type, ids)
+            for pk in ids:
+                if pk in stored:
+                    self.assertEqual(stored[pk], exact[pk], f'{tenant_type} {pk}')
+            self.assertLessEqual(set(stored), set(ids))
+
+    def stats_queries(self, ctx):
+        return [query for query in ctx.captured_queries if 'core_tenantstats' in query['sql']]
+
+    def step(self, change):
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertStatsExact()
+
+    def test_counts_follow_every_kind_of_change(self):
+        other = FreightCompany.objects.create(name='Other', saas_provider=self.provider)
+        x, y, z = [EndCustomer.objects.create(name=name) for name in 'XYZ']
+        self.step(lambda: self.company.end_customers.add(x, y))
+        self.step(lambda: z.freight_companies.add(self.company, other))
+        self.step(lambda: other.end_customers.add(x, y))
+        self.step(lambda: self.company.end_customers.remove(x, z))
+        self.step(lambda: z.freight_companies.clear())
+        self.step(lambda: Invitation.objects.create(
+            email='i@example.com', invitation_type='FREIGHT_ADMIN', freight_company=self.company
+        ))
+        self.step(lambda: Invitation.objects.create(
+            email='j@example.com', invitation_type='END_CUSTOMER_ADMIN', end_customer=x, freight_company=other
+        ))
+        self.step(lambda: y.delete())
+        self.step(lambda: other.delete())
+        self.step(lambda: self.provider.delete())
+
+    def test_adding_links_is_batched(self):
+        customers = EndCustomer.objects.bulk_create([EndCustomer(name=f'C{i}') for i in range(100)])
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as ctx:
+            self.company.end_customers.add(*customers)
+        self.assertLess(len(self.stats_queries(ctx)), 10)
+        self.assertStatsExact()
+
+    def test_deleting_a_tenant_recounts_once(self):
+        customers = EndCustomer.objects.bulk_create([EndCustomer(name=f'C{i}') for i in range(200)])
+        self.company.end_customers.add(*customers)
+        Invitation.objects.bulk_create([
+            Invitation(
+                email=f'{i}@example.com', invitation_type='FREIGHT_ADMIN', freight_company=self.company,
+                expires_at=timezone.now() + timedelta(days=7),
+            )
+            for i in range(50)
+        ])
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as ctx:
+            self.company.delete()
+        # The cascade is recounted once after commit, not once per link or invitation,
+        # and nobody is watching its dashboards
+        self.assertLess(len(self.stats_queries(ctx)), 10)
+        self.assertLess(len(ctx.captured_queries), 40)
+        self.assertStatsExact()
+        self.assertEqual(TenantStats.objects.get(tenant_type=TenantStats.TenantType.PROVIDER).customer_count, 0)
+
+
+class LiveUpdateTests(TenantTestCase):
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('NOTIFY is only delivered by a real commit')
+        super().setUp()
+        self.loop = asyncio.new_event_loop()
+        self.hub = live._hubs[self.loop] = live.Hub(self.loop)
+        self.addCleanup(self.loop.close)
+        self.addCleanup(live._hubs.pop, self.loop)
+
+    def received(self, queue):
+        self.loop.run_until_complete(asyncio.sleep(0))
+        messages = []
+        while not queue.empty():
+            event, data = queue.get_nowait().strip().split('\n')
+            messages.append((event.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+        return messages
+
+    def test_link_changes_publish_once_per_transaction(self):
+        queue = self.hub.subscribe([live.company_topic(self.company.pk)])
+        customers = EndCustomer.objects.bulk_create([EndCustomer(name=f'C{i}') for i in range(3)])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.company.end_customers.add(*customers)
+            FreightCompanyCustomer.objects.create(freight_company=self.company, end_customer=self.customer)
+            self.assertEqual(self.received(queue), [])
+
+        [(event, data)] = self.received(queue)
+        self.assertEqual(event, 'customers_added')
+        self.assertEqual(data['counts'], {'total_customers': 4})
+        self.assertEqual([item['name'] for item in data['added']['items']], ['C0', 'C1', 'C2', 'Shipper'])
+
+    def test_rolled_back_changes_are_not_published(self):
+        queue = self.hub.subscribe([live.company_topic(self.company.pk)])
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.company.end_customers.add(self.customer)
+                transaction.set_rollback(True)
+            other = EndCustomer.objects.create(name='Other')
+            self.company.end_customers.add(other)
+
+        [(event, data)] = self.received(queue)
+        self.assertEqual([item['name'] for item in data['added']['items']], ['Other'])
+
+    def test_unwatched_changes_are_not_counted(self):
+        customers = EndCustomer.objects.bulk_create([EndCustomer(name=f'C{i}') for i in range(3)])
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as ctx:
+            self.company.end_customers.add(*customers)
+        self.assertFalse([query for query in ctx.captured_queries if '"end_customers_endcustomer"."name"' in query['sql']])
+
+
+class BulkInviteViewTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user('admin', password='secret')
+        UserProfile.objects.create(
+            user=user, user_type=UserProfile.UserType.END_CUSTOMER_ADMIN, linked_customer=self.customer
+        )
+        self.client.force_login(user)
+        self.url = reverse('bulk_invite_end_customer_staff')
+
+    def test_form_renders_in_the_customer_portal(self):
+        response = self.client.get(self.url)
+        self.assertTemplateUsed(response, 'end_customers/portal_base.html')
+        self.assertContains(response, 'Shipper Portal')
+        self.assertContains(response, 'name="file"')
+
+    def test_upload_queues_invitations(self):
+        upload = SimpleUploadedFile('staff.csv', b'email\na@example.com\nb@example.com\na@example.com\n')
+        response = self.client.post(self.url, {'file': upload, 'format': 'csv'})
+        self.assertRedirects(response, reverse('customer_portal:dashboard', args=[self.customer.pk]), fetch_redirect_response=False)
+        self.assertEqual(Invitation.objects.filter(end_customer=self.customer).count(), 2)
+
+
+class ConcurrentScopeTests(TransactionTestCase):
+    """Two tenants' scopes, active at once, each see only their own rows."""
+
+    def setUp(self):
+        cache.clear()
+        provider = SaaSProvider.objects.create(name='Provider', contact_email='provider@example.com')
+        self.profiles, self.expected = [], []
+        for name in ('A', 'B'):
+            user = User.objects.create_user(name)
+            company = FreightCompany.objects.create(name=name, saas_provider=provider)
+            profile = UserProfile.objects.create(
+                user=user, user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company=company
+            )
+            with profile_scope(profile):
+                for i in range(3):
+                    Shipment.objects.create(freight_company=company, reference=f'{name}{i}')
+            self.profiles.append(profile)
+            self.expected.append({f'{name}{i}' for i in range(3)})
+
+    def visible(self, profile, barrier):
+        with profile_scope(profile):
+            # Both scopes are set before either queries
+            barrier.wait()
+            return set(Shipment.objects.values_list('reference', flat=True))
+
+    def test_threads(self):
+        barrier = threading.Barrier(2)
+
+        def run(profile):
+            try:
+                return self.visible(profile, barrier)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(2) as pool:
+            self.assertEqual(list(pool.map(run, self.profiles)), self.expected)
+
+    def test_async_tasks(self):
+        def read():
+            try:
+                return set(Shipment.objects.values_list('reference', flat=True))
+            finally:
+                connection.close()
+
+        async def run(profile):
+            with profile_scope(profile):
+                # Let the other task set its scope on this same thread
+                await asyncio.sleep(0)
+                return await sync_to_async(read)()
+
+        async def main():
+            return await asyncio.gather(*(run(profile) for profile in self.profiles))
+
+        self.assertEqual(asyncio.run(main()), self.expected)
+        self.assertIsNone(get_current_profile())
+
+
+class IdentityMapTests(TenantTestCase):
+    def login(self, user_type, **links):
+        user = User.objects.create_user(user_type.lower())
+        UserProfile.objects.create(user=user, user_type=user_type, **links)
+        self.client.force_login(user)
+
+    def test_decorator_lookup_is_reused_by_the_view(self):
+        self.login(UserProfile.UserType.SAAS_PROVIDER)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('freight_portal:dashboard', args=[self.company.pk]))
+        self.assertEqual(response.status_code, 200)
+        lookups = [
+            query for query in ctx.captured_queries
+            if 'FROM "major_clients_freightcompany" WHERE "major_clients_freightcompany"."id" =' in query['sql']
+        ]
+        self.assertEqual(len(lookups), 1)
+
+    def test_switch_provider(self):
+        self.login(UserProfile.UserType.END_CUSTOMER_ADMIN, linked_customer=self.customer)
+        other = FreightCompany.objects.create(name='Other', saas_provider=self.provider)
+        self.company.end_customers.add(self.customer)
+        url, referer = reverse('switch_provider'), {'HTTP_REFERER': '/portal/'}
+
+        self.client.post(url, {'provider_id': other.pk}, **referer)
+        self.assertNotIn('selected_provider', self.client.session)
+        self.client.post(url, {'provider_id': self.company.pk}, **referer)
+        self.assertEqual(self.client.session['selected_provider'], {'id': self.company.pk, 'name': 'Carrier'})
+
+
+class RecordingBackend(EmailBackend):
+    """Notes what the database looked like while each message was sent."""
+
+    def __init__(self, fail=(), refuse=False, **kwargs):
+        super().__init__(**kwargs)
+        self.fail, self.refuse, self.seen = fail, refuse, []
+
+    def open(self):
+        if self.refuse:
+            raise OSError('relay unreachable')
+
+    def send_messages(self, messages):
+        for message in messages:
+            self.seen.append((
+                connection.in_atomic_block,
+                OutboundEmail.objects.get(to_email=message.to[0]).status,
+            ))
+            if message.to[0] in self.fail:
+                raise OSError('mailbox unavailable')
+        return super().send_messages(messages)
+
+
+class OutboxDrainTests(TransactionTestCase):
+    def setUp(self):
+        mail.outbox = []
+        for address in ('a@example.com', 'b@example.com'):
+            queue_email('Hello', 'Body', address)
+
+    def test_sends_outside_the_claiming_transaction(self):
+        backend = RecordingBackend()
+        self.assertEqual(drain(connection=backend), (2, 0))
+        # Claimed and committed before the mail server is contacted
+        self.assertEqual(backend.seen, [(False, EmailStatus.SENDING)] * 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(set(OutboundEmail.objects.values_list('status', 'attempts')), {(EmailStatus.SENT, 1)})
+
+    def test_failures_are_retried_later(self):
+        self.assertEqual(drain(connection=RecordingBackend(fail={'a@example.com'})), (1, 0))
+        email = OutboundEmail.objects.get(to_email='a@example.com')
+        self.assertEqual((email.status, email.attempts), (EmailStatus.QUEUED, 1))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+    def test_expired_lease_is_reclaimed(self):
+        OutboundEmail.objects.update(status=EmailStatus.SENDING, next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(drain(connection=RecordingBackend()), (2, 0))
+
+    def test_unreachable_relay_releases_the_claim(self):
+        with self.assertRaises(OSError):
+            drain(connection=RecordingBackend(refuse=True))
+        self.assertEqual(set(OutboundEmail.objects.values_list('status', 'attempts')), {(EmailStatus.QUEUED, 0)})
+        self.assertEqual(drain(connection=RecordingBackend()), (2, 0))
+
+
+class FragmentCacheTests(TenantTestCase):
+    def render(self, calls):
+        request = RequestFactory().get('/')
+
+        def get_context():
+            calls.append(1)
+            return {'customer': self.customer}
+        return cached_fragment(request, 'test', 'test:version', 'end_customers/portal_dashboard_content.html', get_context)
+
+    def test_local_cache_renders_every_time(self):
+        calls = []
+        self.render(calls)
+        self.render(calls)
+        self.assertEqual(len(calls), 2)
+
+    def test_shared_cache_renders_once(self):
+        calls = []
+        with tempfile.TemporaryDirectory() as location, file_cache(location):
+            self.render(calls)
+            self.render(calls)
+        self.assertEqual(len(calls), 1)
+
+    def test_cache_dir_must_be_private(self):
+        with tempfile.TemporaryDirectory() as location:
+            os.chmod(location, 0o755)
+            with file_cache(location):
+                self.assertEqual([error.id for error in check_cache_dir(None)], ['core.E001'])
+            os.chmod(location, 0o700)
+            with file_cache(location):
+                self.assertEqual(check_cache_dir(None), [])
+
+
+class InvitationTokenTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.invitation = Invitation.objects.create(
+            email='admin@example.com',
+            invitation_type=Invitation.InvitationType.FREIGHT_ADMIN,
+            freight_company=self.company,
+        )
+
+    def test_signed_token_carries_the_token_and_expiry(self):
+        token, expires_at = Invitation.read_signed_token(self.invitation.signed_token())
+        self.assertEqual(token, self.invitation.token)
+        self.assertEqual(expires_at, self.invitation.expires_at.replace(microsecond=0))
+
+    def test_forged_token_is_turned_away_without_a_query(self):
+        signed = self.invitation.signed_token()
+        forged = signed[:-1] + ('A' if signed[-1] != 'A' else 'B')
+        self.assertIsNone(Invitation.read_signed_token(forged))
+        self.assertIsNone(Invitation.read_signed_token(self.invitation.token.hex))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('accept_invitation', args=[forged]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_token_follows_key_rotation(self):
+        with override_settings(SECRET_KEY='old-key'):
+            signed = self.invitation.signed_token()
+        with override_settings(SECRET_KEY='new-key', SECRET_KEY_FALLBACKS=['old-key']):
+            self.assertIsNotNone(Invitation.read_signed_token(signed))
+        with override_settings(SECRET_KEY='new-key'):
+            self.assertIsNone(Invitation.read_signed_token(signed))
+
+    def test_expired_invitation_is_not_accepted(self):
+        self.invitation.expires_at = timezone.now() - timedelta(minutes=1)
+        self.invitation.save()
+        _, expires_at = Invitation.read_signed_token(self.invitation.signed_token())
+        self.assertLess(expires_at, timezone.now())
+        user = User.objects.create_user('late')
+        self.assertFalse(self.invitation.accept(user))
+        self.assertFalse(UserProfile.objects.filter(user=user).exists())
+
+    def test_second_accept_is_refused(self):
+        first, second = User.objects.create_user('first'), User.objects.create_user('second')
+        self.assertTrue(Invitation.objects.get(pk=self.invitation.pk).accept(first))
+        self.assertFalse(Invitation.objects.get(pk=self.invitation.pk).accept(second))
+        self.assertEqual(list(UserProfile.objects.values_list('user_id', flat=True)), [first.pk])
+
+    def test_purge_archives_expired_invitations(self):
+        expired = Invitation.objects.create(
+            email='old@example.com',
+            invitation_type=Invitation.InvitationType.FREIGHT_ADMIN,
+            freight_company=self.company,
+            expires_at=timezone.now() - timedelta(days=40),
+        )
+        self.assertEqual(purge_invitations(timezone.now() - timedelta(days=30)), 1)
+        self.assertEqual(purge_invitations(timezone.now() - timedelta(days=30)), 0)
+
+        self.assertEqual(list(Invitation.objects.values_list('pk', flat=True)), [self.invitation.pk])
+        archived = InvitationArchive.objects.get()
+        self.assertEqual(
+            (archived.invitation_id, archived.email, archived.freight_company_id, archived.accepted),
+            (expired.pk, 'old@example.com', self.company.pk, False)
+        )
+
+
+class ExportTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = FreightCompany.objects.create(name='Other carrier', saas_provider=self.provider)
+        self.other_customer = EndCustomer.objects.create(name='Theirs')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.company.end_customers.add(self.customer)
+            self.other.end_customers.add(self.other_customer)
+        for company, reference in ((self.company, 'OURS'), (self.other, 'THEIRS')):
+            # Saved in the carrier's scope, which records the shipment's tenants
+            with profile_scope(UserProfile(user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company=company)):
+                Shipment.objects.create(freight_company=company, reference=reference)
+        user = User.objects.create_user('admin')
+        UserProfile.objects.create(
+            user=user, user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company=self.company
+        )
+        self.client.force_login(user)
+
+    def export(self, company, dataset):
+        response = self.client.get(reverse('freight_portal:export', args=[company.pk, dataset]))
+        self.assertEqual(response.status_code, 200)
+        return list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_rows_come_from_the_requesters_scope(self):
+        self.assertEqual([row['name'] for row in self.export(self.company, 'customers')], ['Shipper'])
+        self.assertEqual([row['reference'] for row in self.export(self.company, 'shipments')], ['OURS'])
+        response = self.client.get(reverse('freight_portal:export', args=[self.other.pk, 'customers']))
+        self.assertEqual(response.status_code, 302)
+
+    def test_formula_cells_are_escaped(self):
+        names = ['=HYPERLINK("http://evil")', '+1', '-1', '@SUM(A1)', '\t=1', '\r=1', 'Plain']
+        EndCustomer.objects.filter(pk=self.customer.pk).update(name=names[0])
+        for name in names[1:]:
+            self.company.end_customers.add(EndCustomer.objects.create(name=name))
+        exported = [row['name'] for row in self.export(self.company, 'customers')]
+        self.assertEqual(exported, ["'" + name for name in names[:-1]] + ['Plain'])
+
+
+class SearchEndpointTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user('admin')
+        UserProfile.objects.create(
+            user=self.admin, user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company=self.company
+        )
+        self.client.force_login(self.admin)
+
+    def pages(self, name, **params):
+        url = reverse(f'freight_portal:{name}', args=[self.company.pk])
+        pages, after = [], None
+        while True:
+            query = dict(params, **({'after': after} if after else {}))
+            data = self.client.get(url, query).json()
+            pages.append([result['id'] for result in data['results']])
+            after = data['next']
+            if after is None:
+                return pages
+
+    def test_staff_search_leaves_out_tenant_users(self):
+        free = User.objects.create_user('free-no-profile')
+        unlinked = User.objects.create_user('free-unlinked')
+        UserProfile.objects.create(user=unlinked, user_type=UserProfile.UserType.END_CUSTOMER_STAFF)
+        customer_staff = User.objects.create_user('free-customer-staff')
+        UserProfile.objects.create(
+            user=customer_staff, user_type=UserProfile.UserType.END_CUSTOMER_STAFF, linked_customer=self.customer
+        )
+        provider = User.objects.create_user('free-provider')
+        UserProfile.objects.create(user=provider, user_type=UserProfile.UserType.SAAS_PROVIDER)
+
+        self.assertEqual(self.pages('search_staff', q='free'), [[free.pk, unlinked.pk]])
+        self.assertEqual(self.pages('search_staff'), [[free.pk, unlinked.pk]])
+
+    def test_customer_search_leaves_out_linked_customers(self):
+        other = EndCustomer.objects.create(name='Shipping Co')
+        self.company.end_customers.add(self.customer)
+        self.assertEqual(self.pages('search_end_customers', q='Ship'), [[other.pk]])
+
+    def test_cursor_pages_without_duplicates_or_gaps(self):
+        self.company.end_customers.add(self.customer)
+        customers = EndCustomer.objects.bulk_create([
+            EndCustomer(name=f'Customer {i}') for i in range(SEARCH_PAGE_SIZE * 2 + 5)
+        ])
+        pages = self.pages('search_end_customers', q='Customer')
+        self.assertEqual([len(page) for page in pages], [SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE, 5])
+        ids = [pk for page in pages for pk in page]
+        self.assertEqual(ids, sorted(customer.pk for customer in EndCustomer.objects.filter(name__startswith='Customer')))
+        self.assertEqual(len(ids), len(customers))
+
+
+class BackfillScopeColumnsTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = FreightCompany.objects.create(name='Other carrier', saas_provider=self.provider)
+        content_type = ContentType.objects.get_for_model(TrackingEvent)
+        now = timezone.now()
+        ensure_partitions([now.date()])
+        self.events = []
+        # Rows written before the tenant columns existed, scoped through DataScope
+        for company, customer in ((self.company, self.customer), (self.company, None), (self.other, None)):
+            event = TrackingEvent._base_manager.create(shipment_id=1, recorded_at=now, received_at=now)
+            DataScope.objects.create(
+                content_type=content_type, object_id=event.pk, freight_company=company, end_customer=customer
+            )
+            self.events.append(event)
+
+    def backfill(self, *args):
+        out = io.StringIO()
+        call_command('backfill_scope_columns', 'shipments.TrackingEvent', '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def columns(self):
+        return list(TrackingEvent._base_manager.order_by('pk').values_list('freight_company_id', 'end_customer_id'))
+
+    def scoped_ids(self, company):
+        profile = UserProfile(user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company=company)
+        with profile_scope(profile):
+            return sorted(TrackingEvent.objects.values_list('pk', flat=True))
+
+    def test_backfill_is_idempotent(self):
+        self.assertIn('Backfilled 3 ', self.backfill())
+        expected = [(self.company.pk, self.customer.pk), (self.company.pk, None), (self.other.pk, None)]
+        self.assertEqual(self.columns(), expected)
+        self.assertIn('Backfilled 0 ', self.backfill('--delete'))
+        self.assertEqual(self.columns(), expected)
+        self.assertFalse(DataScope.objects.exists())
+        self.assertIn('Backfilled 0 ', self.backfill())
+
+    def test_scoped_reads_match_the_side_table(self):
+        with profile_scope(UserProfile(user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company=self.company)):
+            # Rows still missing their columns are not visible until backfilled
+            self.assertEqual(list(TrackingEvent.objects.all()), [])
+        from_side_table = {
+            company.pk: sorted(DataScope.objects.filter(freight_company=company).values_list('object_id', flat=True))
+            for company in (self.company, self.other)
+        }
+        self.backfill()
+        self.assertEqual(self.scoped_ids(self.company), from_side_table[self.company.pk])
+        self.assertEqual(self.scoped_ids(self.other), from_side_table[self.other.pk])
+
+
+@override_settings(SQL_INSTRUMENTATION_SAMPLE_RATE=1, SQL_INSTRUMENTATION_REPEAT_THRESHOLD=3)
+class SQLInstrumentationTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        instrumentation.reset()
+        self.addCleanup(instrumentation.reset)
+
+    def get(self, path, lookups):
+        def view(request):
+            request.resolver_match = resolve(path)
+            # One statement per customer, the N+1 the report is for
+            for _ in range(lookups):
+                EndCustomer.objects.filter(pk=self.customer.pk).first()
+            return HttpResponse()
+        instrumentation.SQLInstrumentationMiddleware(view)(RequestFactory().get(path))
+
+    def test_samples_are_recorded_per_url_name(self):
+        search = reverse('freight_portal:search_staff', args=[self.company.pk])
+        export = reverse('freight_portal:export', args=[self.company.pk, 'customers'])
+        self.get(search, 4)
+        self.get(search, 2)
+        self.get(export, 1)
+
+        summary = {row['url_name']: row for row in instrumentation.snapshot()}
+        self.assertEqual(set(summary), {'freight_portal:search_staff', 'freight_portal:export'})
+        search_stats = summary['freight_portal:search_staff']
+        self.assertEqual((search_stats['samples'], search_stats['avg_queries'], search_stats['max_queries']), (2, 3, 4))
+        self.assertEqual([row['count'] for row in search_stats['repeated']], [4])
+        self.assertEqual(summary['freight_portal:export']['repeated'], [])
+
+    def test_reset_clears_the_samples(self):
+        self.get(reverse('freight_portal:search_staff', args=[self.company.pk]), 1)
+        self.assertEqual(len(instrumentation.snapshot()), 1)
+        instrumentation.reset()
+        self.assertEqual(instrumentation.snapshot(), [])
+
+    @override_settings(SQL_INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        self.get(reverse('freight_portal:search_staff', args=[self.company.pk]), 1)
+        self.assertEqual(instrumentation.snapshot(), [])
@@ -7,7 +7,9 @@ urlpatterns = [
     path('register/end-customer/', views.register_end_customer, name='register_end_customer'),
     path('invite/end-customer-admin/', views.invite_end_customer_admin, name='invite_end_customer_admin'),
     path('invite/end-customer-staff/', views.invite_end_customer_staff, name='invite_end_customer_staff'),
-    path('invitation/<uuid:token>/', views.accept_invitation, name='accept_invitation'),
+    path('invite/end-customer-staff/bulk/', views.bulk_invite_end_customer_staff, name='bulk_invite_end_customer_staff'),
+    path('invitation/<uuid:token>/', views.accept_legacy_invitation, name='accept_legacy_invitation'),
+    path('invitation/<str:token>/', views.accept_invitation, name='accept_invitation'),
     path('select-freight-companies/', views.select_freight_companies, name='select_freight_companies'),
     path('switch-provider/', views.switch_provider, name='switch_provider'),
 ] 
\ No newline at end of file
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Version counters let cached entries be invalidated without deleting them:
+# readers build their keys from the current version, writers bump it, and the
+# stale entries simply age out. That only works when every worker sees the
+# same counters, so the default cache has to be shared between processes.
+
+# Backends whose entries live in one process
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def versions_are_shared():
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter never reuses an old version
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), timeout=None)
@@ -1,14 +1,19 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.mail import send_mail
-from django.conf import settings
+from django.db import transaction
+from django.http import Http404
 from django.urls import reverse
+from django.utils import timezone
 from .models import Invitation, UserProfile, FreightCompany
+from .outbox import queue_email
+from .graph import graph
+from .identity import cached_get_or_404
+from .bulk_invites import bulk_invite, iter_emails
 from .forms import (
     FreightCompanyRegistrationForm, EndCustomerRegistrationForm,
     InviteFreightAdminForm, InviteEndCustomerAdminForm, InviteEndCustomerStaffForm,
-    AcceptInvitationForm, SelectFreightCompaniesForm
+    AcceptInvitationForm, SelectFreightCompaniesForm, BulkInviteForm
 )
 from django.contrib.auth.models import User
 from django.db.models import Q
@@ -46,17 +51,16 @@ def invite_freight_admin(request):
                 freight_company=form.cleaned_data['company']
             )
             
-            # Send invitation email
+            # Queue invitation email for drain_outbox
             invitation_url = request.build_absolute_uri(
-                reverse('accept_invitation', args=[invitation.token])
+                reverse('accept_invitation', args=[invitation.signed_token()])
             )
-            send_mail(
+            queue_email(
                 'Invitation to Join Freight Company',
                 f'You have been invited to join {invitation.freight_company.name} as an admin. '
                 f'Click here to accept: {invitation_url}',
-                settings.DEFAULT_FROM_EMAIL,
-                [invitation.email],
-                fail_silently=False,
+                invitation.email,
+                invitation=invitation,
             )
             messages.success(request, f"Invitation sent to {invitation.email}")
             return redirect('dashboard')
@@ -99,17 +103,16 @@ def invite_end_customer_admin(request):
                 end_customer=form.cleaned_data['customer']
             )
             
-            # Send invitation email
+            # Queue invitation email for drain_outbox
             invitation_url = request.build_absolute_uri(
-                reverse('accept_invitation', args=[invitation.token])
+                reverse('accept_invitation', args=[invitation.signed_token()])
             )
-            send_mail(
+            queue_email(
                 'Invitation to Join End Customer',
                 f'You have been invited to join {invitation.end_customer.name} as an admin. '
                 f'Click here to accept: {invitation_url}',
-                settings.DEFAULT_FROM_EMAIL,
-                [invitation.email],
-                fail_silently=False,
+                invitation.email,
+                invitation=invitation,
             )
             messages.success(request, f"Invitation sent to {invitation.email}")
             return redirect('dashboard')
@@ -136,17 +139,16 @@ def invite_end_customer_staff(request):
                 end_customer=request.user.profile.linked_customer
             )
             
-            # Send invitation email
+            # Queue invitation email for drain_outbox
             invitation_url = request.build_absolute_uri(
-                reverse('accept_invitation', args=[invitation.token])
+                reverse('accept_invitation', args=[invitation.signed_token()])
             )
-            send_mail(
+            queue_email(
                 'Invitation to Join End Customer',
                 f'You have been invited to join {invitation.end_customer.name} as a staff member. '
                 f'Click here to accept: {invitation_url}',
-                settings.DEFAULT_FROM_EMAIL,
-                [invitation.email],
-                fail_silently=False,
+                invitation.email,
+                invitation=invitation,
             )
             messages.success(request, f"Invitation sent to {invitation.email}")
             return redirect('dashboard')
@@ -155,9 +157,51 @@ def invite_end_customer_staff(request):
 
     return render(request, 'core/invite_end_customer_staff.html', {'form': form})
 
+@login_required
+def bulk_invite_end_customer_staff(request):
+    if not request.user.profile.user_type == UserProfile.UserType.END_CUSTOMER_ADMIN:
+        messages.error(request, "Only end customer admins can invite staff members.")
+        return redirect('dashboard')
+
+    if request.method == 'POST':
+        form = BulkInviteForm(request.POST, request.FILES)
+        if form.is_valid():
+            stats = bulk_invite(
+                iter_emails(form.cleaned_data['file'], form.cleaned_data['format']),
+                Invitation.InvitationType.END_CUSTOMER_STAFF,
+                request.user,
+                lambda signed: request.build_absolute_uri(reverse('accept_invitation', args=[signed])),
+                end_customer=request.user.profile.linked_customer
+            )
+            messages.success(
+                request,
+                f"Queued {stats['created']} invitations. Skipped {stats['existing_user']} existing users, "
+                f"{stats['pending']} already invited, {stats['duplicate']} duplicates and {stats['invalid']} invalid rows."
+            )
+            return redirect('customer_portal:dashboard', customer_id=request.user.profile.linked_customer_id)
+    else:
+        form = BulkInviteForm()
+
+    return render(request, 'core/bulk_invite.html', {
+        'form': form, 'customer': request.user.profile.linked_customer
+    })
+
 def accept_invitation(request, token):
-    invitation = get_object_or_404(Invitation, token=token)
-    
+    # Forged and expired links are turned away before any query
+    signed = Invitation.read_signed_token(token)
+    if signed is None:
+        raise Http404
+    token, expires_at = signed
+    if timezone.now() > expires_at:
+        messages.error(request, "This invitation has expired.")
+        return redirect('login')
+    return _accept_invitation(request, get_object_or_404(Invitation, token=token))
+
+def accept_legacy_invitation(request, token):
+    # Links sent before tokens were signed; drop once those have expired
+    return _accept_invitation(request, get_object_or_404(Invitation, token=token))
+
+def _accept_invitation(request, invitation):
     if invitation.is_expired():
         messages.error(request, "This invitation has expired.")
         return redirect('login')
@@ -169,8 +213,13 @@ def accept_invitation(request, token):
     if request.method == 'POST':
         form = AcceptInvitationForm(request.POST, invitation=invitation)
         if form.is_valid():
-            user = form.save()
-            if invitation.accept(user):
+            # The user is only kept if the invitation is theirs to accept
+            with transaction.atomic():
+                user = form.save()
+                accepted = invitation.accept(user)
+                if not accepted:
+                    transaction.set_rollback(True)
+            if accepted:
                 messages.success(request, "Account created successfully. You can now log in.")
                 return redirect('login')
             else:
@@ -209,17 +258,14 @@ def switch_provider(request):
 
     if request.method == 'POST':
         provider_id = request.POST.get('provider_id')
-        try:
-            provider = FreightCompany.objects.get(
-                id=provider_id,
-                end_customers=request.user.profile.linked_customer
-            )
+        if graph.is_linked(provider_id, request.user.profile.linked_customer_id):
+            provider = cached_get_or_404(request, FreightCompany, provider_id)
             request.session['selected_provider'] = {
                 'id': provider.id,
                 'name': provider.name
             }
             messages.success(request, f"Switched to {provider.name}")
-        except FreightCompany.DoesNotExist:
+        else:
             messages.error(request, "Invalid provider selected.")
     
     return redirect(request.META.get('HTTP_REFERER', 'dashboard'))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:14
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Trigram indexes exist on PostgreSQL only, so they are created here rather
+# than declared in Meta
+INDEXES = {
+    'endcustomer_name_trgm': 'name',
+}
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON end_customers_endcustomer USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('end_customers', '0003_endcustomer_address_endcustomer_email_and_more'),
+        ('major_clients', '0002_freightcompany_address_freightcompany_email_and_more'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('end_customers', '0005_email_trgm'),
+        ('major_clients', '0004_freightcompanycustomer'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='endcustomer',
+            name='freight_companies',
+        ),
+    ]
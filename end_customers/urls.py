@@ -5,6 +5,9 @@ app_name = 'customer_portal'
 
 urlpatterns = [
     path('<int:customer_id>/', views.portal_dashboard, name='dashboard'),
+    path('<int:customer_id>/live/', views.live_updates, name='live_updates'),
     path('<int:customer_id>/company/<int:company_id>/', views.freight_company_view, name='freight_company_view'),
     path('<int:customer_id>/staff/', views.manage_staff, name='manage_staff'),
+    path('<int:customer_id>/staff/search/', views.search_staff, name='search_staff'),
+    path('<int:customer_id>/export/<slug:dataset>/', views.export, name='export'),
 ] 
\ No newline at end of file
@@ -3,9 +3,18 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.generic import ListView
 from django.contrib.auth.models import User
+from django.http import Http404
 from .models import EndCustomer
-from major_clients.models import FreightCompany
-from core.models import UserProfile
+from major_clients.models import FreightCompany, FreightCompanyCustomer
+from core import exports
+from core.fragments import cached_fragment, tenant_version_key
+from core.graph import graph
+from core.identity import cached_get_or_404
+from core.live import event_stream, customer_topic
+from core.models import Invitation, TenantStats, UserProfile
+from core.search import search_response, staff_candidates, user_label
+from core.stats import get_tenant_stats
+from shipments.models import Shipment
 
 def customer_admin_required(view_func):
     def wrapper(request, customer_id, *args, **kwargs):
@@ -15,7 +24,9 @@ def customer_admin_required(view_func):
             
         # Allow superadmin access
         if request.user_profile.user_type == UserProfile.UserType.SAAS_PROVIDER:
-            customer = get_object_or_404(EndCustomer, id=customer_id)
+            # 404s for a missing customer; the view gets this instance back from
+            # the request's identity map
+            cached_get_or_404(request, EndCustomer, customer_id)
             return view_func(request, customer_id, *args, **kwargs)
             
         # Check end customer admin permissions
@@ -23,8 +34,7 @@ def customer_admin_required(view_func):
             messages.error(request, "You don't have permission to access this page.")
             return redirect('admin:index')
         
-        customer = get_object_or_404(EndCustomer, id=customer_id)
-        if request.user_profile.linked_customer != customer:
+        if request.user_profile.linked_customer_id != customer_id:
             messages.error(request, "You can only access your own customer portal.")
             return redirect('admin:index')
             
@@ -34,30 +44,37 @@ def customer_admin_required(view_func):
 @login_required
 @customer_admin_required
 def portal_dashboard(request, customer_id):
-    customer = get_object_or_404(EndCustomer, id=customer_id)
-    freight_companies = customer.freight_companies.all()
-    staff_users = UserProfile.objects.filter(
-        user_type=UserProfile.UserType.END_CUSTOMER_ADMIN,
-        linked_customer=customer
+    customer = cached_get_or_404(request, EndCustomer, customer_id)
+
+    def get_context():
+        stats = get_tenant_stats(TenantStats.TenantType.CUSTOMER, customer.id)
+        return {
+            'customer': customer,
+            # Only the links the graph lets through; suspended ones are not served
+            'freight_companies': FreightCompany.objects.filter(
+                customer_links__end_customer=customer,
+                customer_links__status=FreightCompanyCustomer.Status.ACTIVE
+            ).select_related('saas_provider'),
+            'total_companies': stats.company_count,
+            'total_staff': stats.staff_count,
+            'pending_invitations': stats.pending_invitation_count,
+        }
+
+    content = cached_fragment(
+        request, f'customer:{customer.id}:dashboard',
+        tenant_version_key(TenantStats.TenantType.CUSTOMER, customer.id),
+        'end_customers/portal_dashboard_content.html', get_context
     )
-    
-    context = {
-        'customer': customer,
-        'freight_companies': freight_companies,
-        'staff_users': staff_users,
-        'total_companies': freight_companies.count(),
-        'total_staff': staff_users.count(),
-    }
-    return render(request, 'end_customers/portal_dashboard.html', context)
+    return render(request, 'end_customers/portal_dashboard.html', {'customer': customer, 'content': content})
 
 @login_required
 @customer_admin_required
 def freight_company_view(request, customer_id, company_id):
-    customer = get_object_or_404(EndCustomer, id=customer_id)
-    company = get_object_or_404(FreightCompany, id=company_id)
+    customer = cached_get_or_404(request, EndCustomer, customer_id)
+    company = cached_get_or_404(request, FreightCompany, company_id)
     
     # Verify the company is associated with this customer
-    if company not in customer.freight_companies.all():
+    if not graph.is_linked(company.id, customer.id):
         messages.error(request, "This freight company is not associated with your customer account.")
         return redirect('customer_portal:dashboard', customer_id=customer_id)
     
@@ -71,13 +88,13 @@ def freight_company_view(request, customer_id, company_id):
 @login_required
 @customer_admin_required
 def manage_staff(request, customer_id):
-    customer = get_object_or_404(EndCustomer, id=customer_id)
+    customer = cached_get_or_404(request, EndCustomer, customer_id)
     if request.method == 'POST':
         user_id = request.POST.get('user_id')
         action = request.POST.get('action')
         
         if action == 'add':
-            user = get_object_or_404(User, id=user_id)
+            user = get_object_or_404(staff_candidates(User.objects.all()), id=user_id)
             profile, created = UserProfile.objects.get_or_create(
                 user=user,
                 defaults={
@@ -99,13 +116,43 @@ def manage_staff(request, customer_id):
         user_type=UserProfile.UserType.END_CUSTOMER_ADMIN,
         linked_customer=customer
     )
-    available_users = User.objects.exclude(
-        id__in=staff_profiles.values_list('user_id', flat=True)
-    )
     
     context = {
         'customer': customer,
         'staff_profiles': staff_profiles,
-        'available_users': available_users,
     }
     return render(request, 'end_customers/manage_staff.html', context)
+
+@login_required
+@customer_admin_required
+def search_staff(request, customer_id):
+    return search_response(request, staff_candidates(User.objects.all()), ('username', 'email'), user_label)
+
+@login_required
+@customer_admin_required
+def live_updates(request, customer_id):
+    # Pushes link, staff and invitation changes to the open dashboard
+    return event_stream(request, [customer_topic(customer_id)])
+
+@login_required
+@customer_admin_required
+def export(request, customer_id, dataset):
+    if dataset == 'companies':
+        queryset = FreightCompanyCustomer.objects.filter(end_customer_id=customer_id)
+        columns = exports.COMPANY_LINK_COLUMNS
+    elif dataset == 'staff':
+        queryset = UserProfile.objects.filter(
+            user_type__in=[UserProfile.UserType.END_CUSTOMER_ADMIN, UserProfile.UserType.END_CUSTOMER_STAFF],
+            linked_customer_id=customer_id
+        )
+        columns = exports.STAFF_COLUMNS
+    elif dataset == 'invitations':
+        queryset = Invitation.objects.filter(end_customer_id=customer_id)
+        columns = exports.INVITATION_COLUMNS
+    elif dataset == 'shipments':
+        # Scoped by the manager as well; the filter keeps superadmins to this customer
+        queryset = Shipment.objects.filter(end_customer_id=customer_id)
+        columns = exports.SHIPMENT_COLUMNS
+    else:
+        raise Http404('Unknown export')
+    return exports.export_response(request, queryset, columns, f'customer-{customer_id}-{dataset}')
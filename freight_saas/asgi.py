@@ -14,3 +14,15 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'freight_saas.settings')
 
 application = get_asgi_application()
+
+# Portal dashboards' live update streams are served outside Django's
+# request cycle once a view has authorized them
+from core.live import live_application  # noqa: E402
+
+application = live_application(application)
+
+# Load the company/customer graph in the background so the first requests
+# do not pay for it
+from core.graph import graph  # noqa: E402
+
+graph.rebuild_async()
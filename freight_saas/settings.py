@@ -42,16 +42,20 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Local apps
     'core.apps.CoreConfig',
     'superadmin.apps.SuperadminConfig',
     'major_clients.apps.MajorClientsConfig',
     'end_customers.apps.EndCustomersConfig',
+    'shipments.apps.ShipmentsConfig',
+    'rates.apps.RatesConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.instrumentation.SQLInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -139,3 +143,68 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# SQL instrumentation
+# Fraction of requests whose queries are recorded, and how much is kept per URL name
+
+SQL_INSTRUMENTATION_SAMPLE_RATE = float(os.getenv('SQL_INSTRUMENTATION_SAMPLE_RATE', '0.05'))
+
+SQL_INSTRUMENTATION_RING_SIZE = 200
+
+SQL_INSTRUMENTATION_SLOWEST = 5
+
+# A statement repeated this many times in one request is flagged as a likely N+1
+SQL_INSTRUMENTATION_REPEAT_THRESHOLD = 5
+
+# Take the SaaS dashboard totals and unfiltered admin changelist counts from
+# the PostgreSQL planner's estimate instead of the row count rollups. The
+# estimate costs no writes but only moves when the table is analyzed.
+DASHBOARD_ESTIMATED_COUNTS = os.environ.get('DASHBOARD_ESTIMATED_COUNTS', '').lower() in ('1', 'true')
+
+# Rebuild the in-process company/customer graph at least this often, in
+# seconds, even if no change notification arrives
+RELATIONSHIP_GRAPH_MAX_AGE = int(os.environ.get('RELATIONSHIP_GRAPH_MAX_AGE', 300))
+
+# Tracking events are buffered in each process and written in batches at
+# least this often, in seconds
+TRACKING_FLUSH_INTERVAL = float(os.environ.get('TRACKING_FLUSH_INTERVAL', 0.5))
+
+# Events a process will hold before it refuses new ones with a 503
+TRACKING_BUFFER_LIMIT = int(os.environ.get('TRACKING_BUFFER_LIMIT', 50000))
+
+# Days of tracking events kept; older daily partitions are dropped
+TRACKING_RETENTION_DAYS = int(os.environ.get('TRACKING_RETENTION_DAYS', 90))
+
+# Where build_lane_matrix writes the lane distance/transit matrix that every
+# process on the host maps read-only
+LANE_MATRIX_DIR = os.environ.get('LANE_MATRIX_DIR', os.path.join(BASE_DIR, 'var', 'lane_matrix'))
+
+# Days after expiry an invitation is kept before purge_invitations archives
+# and deletes it
+INVITATION_RETENTION_DAYS = int(os.environ.get('INVITATION_RETENTION_DAYS', 30))
+
+# Cached visibility, profiles, rate cards, tracking positions and dashboard
+# fragments are retired through version counters or by the writing process,
+# which only works when every worker shares this cache. With CACHE_DIR set,
+# the processes on one host share a file-based cache; otherwise each keeps a
+# local-memory one, and none of those are cached (see core.W001). The
+# directory holds rendered tenant pages, so it must be private to the app
+# (core.E001); the backend culls it past MAX_ENTRIES and drops expired
+# entries as they are read.
+CACHE_DIR = os.environ.get('CACHE_DIR')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+    } if CACHE_DIR else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Sessions are read through the cache, so a cached page needs no query
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Seconds a rendered dashboard fragment is kept; data changes retire it
+# sooner through version counters
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('FRAGMENT_CACHE_TIMEOUT', 600))
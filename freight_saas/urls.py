@@ -24,4 +24,7 @@ urlpatterns = [
     path('saas-admin/', include('superadmin.urls')),
     path('freight-portal/', include('major_clients.urls')),
     path('customer-portal/', include('end_customers.urls')),
+    path('shipments/', include('shipments.urls')),
+    path('rates/', include('rates.urls')),
+    path('', include('core.urls')),
 ]
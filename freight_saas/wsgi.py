@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'freight_saas.settings')
 
 application = get_wsgi_application()
+
+# Load the company/customer graph in the background so the first requests
+# do not pay for it
+from core.graph import graph  # noqa: E402
+
+graph.rebuild_async()
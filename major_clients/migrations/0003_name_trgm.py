@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:14
+
+from django.db import migrations
+
+# Trigram indexes exist on PostgreSQL only, so they are created here rather
+# than declared in Meta; admin search filters with UPPER(name) LIKE '%term%'
+INDEXES = {
+    'freightcompany_name_trgm': 'name',
+}
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON major_clients_freightcompany USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('end_customers', '0004_name_trgm'),
+        ('major_clients', '0002_freightcompany_address_freightcompany_email_and_more'),
+        ('superadmin', '0002_rowcount'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,88 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 10000
+
+
+def copy_links(through, FreightCompanyCustomer):
+    # Walk the old table in primary-key order so each batch is an index range
+    # scan and memory stays flat however many links there are
+    last_id = 0
+    while True:
+        batch = list(
+            through.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', 'freightcompany_id', 'endcustomer_id')[:BATCH_SIZE]
+        )
+        if not batch:
+            return
+        FreightCompanyCustomer.objects.bulk_create(
+            [FreightCompanyCustomer(freight_company_id=company_id, end_customer_id=customer_id)
+             for _, company_id, customer_id in batch],
+            ignore_conflicts=True
+        )
+        last_id = batch[-1][0]
+
+
+def merge_links(apps, schema_editor):
+    FreightCompany = apps.get_model('major_clients', 'FreightCompany')
+    EndCustomer = apps.get_model('end_customers', 'EndCustomer')
+    FreightCompanyCustomer = apps.get_model('major_clients', 'FreightCompanyCustomer')
+    # Each side of the old pair of many-to-many fields had rows the other
+    # missed, so the new table is the union of both
+    copy_links(FreightCompany.end_customers.through, FreightCompanyCustomer)
+    copy_links(EndCustomer.freight_companies.through, FreightCompanyCustomer)
+
+
+def split_links(apps, schema_editor):
+    FreightCompany = apps.get_model('major_clients', 'FreightCompany')
+    EndCustomer = apps.get_model('end_customers', 'EndCustomer')
+    FreightCompanyCustomer = apps.get_model('major_clients', 'FreightCompanyCustomer')
+    last_id = 0
+    while True:
+        batch = list(
+            FreightCompanyCustomer.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', 'freight_company_id', 'end_customer_id')[:BATCH_SIZE]
+        )
+        if not batch:
+            return
+        for through in (FreightCompany.end_customers.through, EndCustomer.freight_companies.through):
+            through.objects.bulk_create(
+                [through(freightcompany_id=company_id, endcustomer_id=customer_id)
+                 for _, company_id, customer_id in batch],
+                ignore_conflicts=True
+            )
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('end_customers', '0005_email_trgm'),
+        ('major_clients', '0003_name_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FreightCompanyCustomer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('SUSPENDED', 'Suspended')], default='ACTIVE', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('end_customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='company_links', to='end_customers.endcustomer')),
+                ('freight_company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='customer_links', to='major_clients.freightcompany')),
+            ],
+            options={
+                'verbose_name': 'Freight Company Customer',
+                'verbose_name_plural': 'Freight Company Customers',
+                'indexes': [models.Index(fields=['end_customer', 'freight_company'], name='fcc_customer_company_idx')],
+                'constraints': [models.UniqueConstraint(fields=('freight_company', 'end_customer'), name='freightcompanycustomer_company_customer_uniq')],
+            },
+        ),
+        migrations.RunPython(merge_links, split_links),
+        # Drops the old company-side table; the field comes back with the new
+        # through model once the customer-side field is gone too
+        migrations.RemoveField(
+            model_name='freightcompany',
+            name='end_customers',
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('end_customers', '0006_remove_endcustomer_freight_companies'),
+        ('major_clients', '0004_freightcompanycustomer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='freightcompany',
+            name='end_customers',
+            field=models.ManyToManyField(related_name='freight_companies', through='major_clients.FreightCompanyCustomer', to='end_customers.endcustomer'),
+        ),
+    ]
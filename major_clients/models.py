@@ -8,7 +8,11 @@ class FreightCompany(models.Model):
     email = models.EmailField(blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
-    end_customers = models.ManyToManyField('end_customers.EndCustomer', related_name='+')
+    end_customers = models.ManyToManyField(
+        'end_customers.EndCustomer',
+        through='FreightCompanyCustomer',
+        related_name='freight_companies'
+    )
     saas_provider = models.ForeignKey(
         SaaSProvider,
         on_delete=models.CASCADE,
@@ -21,3 +25,43 @@ class FreightCompany(models.Model):
     class Meta:
         verbose_name = "Freight Company"
         verbose_name_plural = "Freight Companies"
+        # Admin search is backed by a trigram index on UPPER(name), created on
+        # PostgreSQL only by migration 0003_name_trgm
+
+
+class FreightCompanyCustomer(models.Model):
+    """The one link between a freight company and an end customer."""
+    class Status(models.TextChoices):
+        ACTIVE = 'ACTIVE', 'Active'
+        SUSPENDED = 'SUSPENDED', 'Suspended'
+
+    freight_company = models.ForeignKey(
+        FreightCompany,
+        on_delete=models.CASCADE,
+        related_name='customer_links'
+    )
+    end_customer = models.ForeignKey(
+        'end_customers.EndCustomer',
+        on_delete=models.CASCADE,
+        related_name='company_links'
+    )
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.ACTIVE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.freight_company_id} -> {self.end_customer_id}"
+
+    class Meta:
+        verbose_name = "Freight Company Customer"
+        verbose_name_plural = "Freight Company Customers"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['freight_company', 'end_customer'],
+                name='freightcompanycustomer_company_customer_uniq'
+            ),
+        ]
+        indexes = [
+            # The unique constraint serves company -> customers; this serves
+            # customer -> companies
+            models.Index(fields=['end_customer', 'freight_company'], name='fcc_customer_company_idx'),
+        ]
@@ -1,3 +1,128 @@
-from django.test import TestCase
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from core.models import UserProfile
+from end_customers.models import EndCustomer
+from superadmin.models import SaaSProvider
+from .models import FreightCompany, FreightCompanyCustomer
+
+BEFORE = [('major_clients', '0003_name_trgm'), ('end_customers', '0005_email_trgm')]
+AFTER = [('major_clients', '0004_freightcompanycustomer')]
+
+
+class LinkMigrationTests(TransactionTestCase):
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_links_from_both_old_tables_are_merged(self):
+        apps = self.migrate(BEFORE)
+        provider = apps.get_model('superadmin', 'SaaSProvider').objects.create(
+            name='Provider', contact_email='provider@example.com'
+        )
+        Company = apps.get_model('major_clients', 'FreightCompany')
+        Customer = apps.get_model('end_customers', 'EndCustomer')
+        companies = [Company.objects.create(name=f'Carrier {i}', saas_provider_id=provider.pk) for i in range(2)]
+        customers = [Customer.objects.create(name=f'Shipper {i}') for i in range(3)]
+        # Each side of the old pair of fields had links the other missed
+        companies[0].end_customers.add(customers[0], customers[1])
+        customers[1].freight_companies.add(companies[0])
+        customers[2].freight_companies.add(companies[1])
+        old = {
+            (link.freightcompany_id, link.endcustomer_id)
+            for through in (Company.end_customers.through, Customer.freight_companies.through)
+            for link in through.objects.all()
+        }
+
+        apps = self.migrate(AFTER)
+        links = apps.get_model('major_clients', 'FreightCompanyCustomer').objects
+        self.assertEqual(set(links.values_list('freight_company_id', 'end_customer_id')), old)
+        self.assertEqual(links.count(), 3)
+
+
+class LinkQueryTests(TestCase):
+    def setUp(self):
+        provider = SaaSProvider.objects.create(name='Provider', contact_email='provider@example.com')
+        self.companies = [FreightCompany.objects.create(name=f'Carrier {i}', saas_provider=provider) for i in range(3)]
+        self.customers = [EndCustomer.objects.create(name=f'Shipper {i}') for i in range(3)]
+        for i, company in enumerate(self.companies):
+            company.end_customers.add(*self.customers[i:])
+
+    def test_both_directions_read_the_same_links(self):
+        by_company = {
+            (company.pk, customer.pk) for company in self.companies for customer in company.end_customers.all()
+        }
+        by_customer = {
+            (company.pk, customer.pk) for customer in self.customers for company in customer.freight_companies.all()
+        }
+        self.assertEqual(by_company, by_customer)
+        self.assertEqual(
+            by_company, set(FreightCompanyCustomer.objects.values_list('freight_company_id', 'end_customer_id'))
+        )
+
+    def test_unlinking_from_either_side_removes_the_one_row(self):
+        self.customers[2].freight_companies.remove(self.companies[0])
+        self.assertNotIn(self.customers[2], self.companies[0].end_customers.all())
+        self.companies[1].end_customers.remove(self.customers[1])
+        self.assertNotIn(self.companies[1], self.customers[1].freight_companies.all())
+        self.assertEqual(FreightCompanyCustomer.objects.count(), 4)
+
+
+class PortalDashboardTests(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': self.enterContext(tempfile.TemporaryDirectory()),
+        }}))
+        cache.clear()
+        provider = SaaSProvider.objects.create(name='Provider', contact_email='provider@example.com')
+        self.company = FreightCompany.objects.create(name='Carrier', saas_provider=provider)
+        self.customers = [EndCustomer.objects.create(name=f'Shipper {i}') for i in range(2)]
+        self.company.end_customers.add(*self.customers)
+        self.company_admin = User.objects.create_user('carrier')
+        UserProfile.objects.create(
+            user=self.company_admin, user_type=UserProfile.UserType.FREIGHT_ADMIN, linked_company=self.company
+        )
+        self.customer_admin = User.objects.create_user('shipper')
+        UserProfile.objects.create(
+            user=self.customer_admin, user_type=UserProfile.UserType.END_CUSTOMER_ADMIN,
+            linked_customer=self.customers[1]
+        )
+
+    def listed(self, user, url, names):
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [name for name in names if name in response.content.decode()]
+
+    def company_dashboard(self):
+        url = reverse('freight_portal:dashboard', args=[self.company.pk])
+        return self.listed(self.company_admin, url, [customer.name for customer in self.customers])
+
+    def customer_dashboard(self):
+        url = reverse('customer_portal:dashboard', args=[self.customers[1].pk])
+        return self.listed(self.customer_admin, url, [self.company.name])
+
+    def test_suspended_links_leave_both_dashboards(self):
+        self.assertEqual(self.company_dashboard(), ['Shipper 0', 'Shipper 1'])
+        self.assertEqual(self.customer_dashboard(), ['Carrier'])
+
+        link = FreightCompanyCustomer.objects.get(end_customer=self.customers[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            link.status = FreightCompanyCustomer.Status.SUSPENDED
+            link.save()
+
+        self.assertEqual(self.company_dashboard(), ['Shipper 0'])
+        self.assertEqual(self.customer_dashboard(), [])
@@ -5,6 +5,10 @@ app_name = 'freight_portal'
 
 urlpatterns = [
     path('<int:company_id>/', views.portal_dashboard, name='dashboard'),
+    path('<int:company_id>/live/', views.live_updates, name='live_updates'),
     path('<int:company_id>/end-customers/', views.manage_end_customers, name='manage_end_customers'),
+    path('<int:company_id>/end-customers/search/', views.search_end_customers, name='search_end_customers'),
     path('<int:company_id>/staff/', views.manage_staff, name='manage_staff'),
+    path('<int:company_id>/staff/search/', views.search_staff, name='search_staff'),
+    path('<int:company_id>/export/<slug:dataset>/', views.export, name='export'),
 ] 
\ No newline at end of file
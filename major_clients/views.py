@@ -5,9 +5,19 @@ from django.views.generic import ListView, CreateView, UpdateView
 from django.urls import reverse_lazy
 from django.contrib.auth.models import User
 from django.db.models import Q
-from .models import FreightCompany
+from django.http import Http404
+from .models import FreightCompany, FreightCompanyCustomer
 from end_customers.models import EndCustomer
-from core.models import UserProfile
+from core import exports
+from core.fragments import cached_fragment, tenant_version_key
+from core.identity import cached_get_or_404
+from core.live import event_stream, company_topic
+from core.models import Invitation, TenantStats, UserProfile
+from core.search import search_response, staff_candidates, user_label
+from core.stats import get_tenant_stats
+from shipments.models import Shipment
+
+CUSTOMER_PAGE_SIZE = 50
 
 def freight_admin_required(view_func):
     def wrapper(request, company_id, *args, **kwargs):
@@ -17,7 +27,9 @@ def freight_admin_required(view_func):
             
         # Allow superadmin access
         if request.user_profile.user_type == UserProfile.UserType.SAAS_PROVIDER:
-            company = get_object_or_404(FreightCompany, id=company_id)
+            # 404s for a missing company; the view gets this instance back from
+            # the request's identity map
+            cached_get_or_404(request, FreightCompany, company_id)
             return view_func(request, company_id, *args, **kwargs)
             
         # Check freight admin permissions
@@ -25,8 +37,9 @@ def freight_admin_required(view_func):
             messages.error(request, "You don't have permission to access this page.")
             return redirect('admin:index')
         
-        company = get_object_or_404(FreightCompany, id=company_id)
-        if request.user_profile.linked_company != company:
+        # The linked company exists whenever the id is set, so comparing ids
+        # needs no query
+        if request.user_profile.linked_company_id != company_id:
             messages.error(request, "You can only access your own company's portal.")
             return redirect('admin:index')
             
@@ -36,59 +49,79 @@ def freight_admin_required(view_func):
 @login_required
 @freight_admin_required
 def portal_dashboard(request, company_id):
-    company = get_object_or_404(FreightCompany, id=company_id)
-    end_customers = company.end_customers.all()
-    staff_users = UserProfile.objects.filter(
-        user_type=UserProfile.UserType.FREIGHT_ADMIN,
-        linked_company=company
+    company = cached_get_or_404(request, FreightCompany, company_id)
+
+    def get_context():
+        stats = get_tenant_stats(TenantStats.TenantType.COMPANY, company.id)
+        return {
+            'company': company,
+            # Only the links the graph lets through; suspended ones are not served
+            'end_customers': EndCustomer.objects.filter(
+                company_links__freight_company=company,
+                company_links__status=FreightCompanyCustomer.Status.ACTIVE
+            ),
+            'total_customers': stats.customer_count,
+            'total_staff': stats.staff_count,
+            'pending_invitations': stats.pending_invitation_count,
+        }
+
+    content = cached_fragment(
+        request, f'company:{company.id}:dashboard',
+        tenant_version_key(TenantStats.TenantType.COMPANY, company.id),
+        'major_clients/portal_dashboard_content.html', get_context
     )
-    
-    context = {
-        'company': company,
-        'end_customers': end_customers,
-        'staff_users': staff_users,
-        'total_customers': end_customers.count(),
-        'total_staff': staff_users.count(),
-    }
-    return render(request, 'major_clients/portal_dashboard.html', context)
+    return render(request, 'major_clients/portal_dashboard.html', {'company': company, 'content': content})
 
 @login_required
 @freight_admin_required
 def manage_end_customers(request, company_id):
-    company = get_object_or_404(FreightCompany, id=company_id)
+    company = cached_get_or_404(request, FreightCompany, company_id)
     if request.method == 'POST':
         customer_id = request.POST.get('customer_id')
         action = request.POST.get('action')
         
         if action == 'add':
-            customer = get_object_or_404(EndCustomer, id=customer_id)
+            customer = cached_get_or_404(request, EndCustomer, customer_id)
             company.end_customers.add(customer)
             messages.success(request, f'Added {customer.name} to your customers.')
         elif action == 'remove':
-            customer = get_object_or_404(EndCustomer, id=customer_id)
+            customer = cached_get_or_404(request, EndCustomer, customer_id)
             company.end_customers.remove(customer)
             messages.success(request, f'Removed {customer.name} from your customers.')
     
-    current_customers = company.end_customers.all()
-    available_customers = EndCustomer.objects.exclude(id__in=current_customers)
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        after = 0
+    page = list(company.end_customers.filter(id__gt=after).order_by('id')[:CUSTOMER_PAGE_SIZE + 1])
+    current_customers = page[:CUSTOMER_PAGE_SIZE]
     
     context = {
         'company': company,
         'current_customers': current_customers,
-        'available_customers': available_customers,
+        'next_after': current_customers[-1].id if len(page) > CUSTOMER_PAGE_SIZE else None,
+        'is_first_page': after == 0,
     }
     return render(request, 'major_clients/manage_end_customers.html', context)
 
+@login_required
+@freight_admin_required
+def search_end_customers(request, company_id):
+    company = cached_get_or_404(request, FreightCompany, company_id)
+    linked = FreightCompanyCustomer.objects.filter(freight_company=company).values('end_customer_id')
+    available_customers = EndCustomer.objects.exclude(id__in=linked)
+    return search_response(request, available_customers, ('name', 'email'), lambda customer: customer.name)
+
 @login_required
 @freight_admin_required
 def manage_staff(request, company_id):
-    company = get_object_or_404(FreightCompany, id=company_id)
+    company = cached_get_or_404(request, FreightCompany, company_id)
     if request.method == 'POST':
         user_id = request.POST.get('user_id')
         action = request.POST.get('action')
         
         if action == 'add':
-            user = get_object_or_404(User, id=user_id)
+            user = get_object_or_404(staff_candidates(User.objects.all()), id=user_id)
             profile, created = UserProfile.objects.get_or_create(
                 user=user,
                 defaults={
@@ -110,13 +143,43 @@ def manage_staff(request, company_id):
         user_type=UserProfile.UserType.FREIGHT_ADMIN,
         linked_company=company
     )
-    available_users = User.objects.exclude(
-        id__in=staff_profiles.values_list('user_id', flat=True)
-    )
     
     context = {
         'company': company,
         'staff_profiles': staff_profiles,
-        'available_users': available_users,
     }
     return render(request, 'major_clients/manage_staff.html', context)
+
+@login_required
+@freight_admin_required
+def search_staff(request, company_id):
+    return search_response(request, staff_candidates(User.objects.all()), ('username', 'email'), user_label)
+
+@login_required
+@freight_admin_required
+def live_updates(request, company_id):
+    # Pushes link, staff and invitation changes to the open dashboard
+    return event_stream(request, [company_topic(company_id)])
+
+@login_required
+@freight_admin_required
+def export(request, company_id, dataset):
+    if dataset == 'customers':
+        queryset = FreightCompanyCustomer.objects.filter(freight_company_id=company_id)
+        columns = exports.CUSTOMER_LINK_COLUMNS
+    elif dataset == 'staff':
+        queryset = UserProfile.objects.filter(
+            user_type=UserProfile.UserType.FREIGHT_ADMIN,
+            linked_company_id=company_id
+        )
+        columns = exports.STAFF_COLUMNS
+    elif dataset == 'invitations':
+        queryset = Invitation.objects.filter(freight_company_id=company_id)
+        columns = exports.INVITATION_COLUMNS
+    elif dataset == 'shipments':
+        # Scoped by the manager as well; the filter keeps superadmins to this company
+        queryset = Shipment.objects.filter(freight_company_id=company_id)
+        columns = exports.SHIPMENT_COLUMNS
+    else:
+        raise Http404('Unknown export')
+    return exports.export_response(request, queryset, columns, f'company-{company_id}-{dataset}')
@@ -0,0 +1,53 @@
+from django.contrib import admin
+from .models import Accessorial, CarrierLane, Location, RateCard, RateLane, WeightBreak
+
+
+class RateLaneInline(admin.TabularInline):
+    model = RateLane
+    extra = 0
+    show_change_link = True
+
+
+class AccessorialInline(admin.TabularInline):
+    model = Accessorial
+    extra = 0
+
+
+@admin.register(RateCard)
+class RateCardAdmin(admin.ModelAdmin):
+    list_display = ('name', 'freight_company', 'currency', 'fuel_surcharge_pct', 'is_active', 'updated_at')
+    list_filter = ('is_active', 'currency')
+    search_fields = ('name', 'freight_company__name')
+    raw_id_fields = ('freight_company',)
+    list_select_related = ('freight_company',)
+    inlines = [RateLaneInline, AccessorialInline]
+
+
+class WeightBreakInline(admin.TabularInline):
+    model = WeightBreak
+    extra = 0
+
+
+@admin.register(RateLane)
+class RateLaneAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'rate_card', 'minimum_charge')
+    search_fields = ('origin', 'destination', 'rate_card__name')
+    raw_id_fields = ('rate_card',)
+    list_select_related = ('rate_card__freight_company',)
+    inlines = [WeightBreakInline]
+
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ('code', 'kind', 'latitude', 'longitude', 'updated_at')
+    list_filter = ('kind',)
+    search_fields = ('code',)
+
+
+@admin.register(CarrierLane)
+class CarrierLaneAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'average_speed_kmh', 'handling_hours', 'is_active', 'updated_at')
+    list_filter = ('is_active',)
+    search_fields = ('freight_company__name', 'origin__code', 'destination__code')
+    raw_id_fields = ('freight_company', 'origin', 'destination')
+    list_select_related = ('freight_company',)
@@ -0,0 +1,193 @@
+import threading
+
+import numpy as np
+from django.core.cache import cache
+
+from core.versioning import get_version, versions_are_shared
+from .models import ANY_LOCATION, Accessorial, RateCard, RateLane, WeightBreak
+
+
+def card_version_key(company_id):
+    return f'rates:card:version:{company_id}'
+
+
+class CompiledCard:
+    """A carrier's active rate card as flat arrays.
+
+    Lane ``i`` runs from ``origins[i]`` to ``destinations[i]``; its weight
+    breaks are row ``i`` of ``break_weights`` and ``break_rates``, padded
+    with +inf weights so every row has the same width.
+    """
+
+    def __init__(self, company_id, currency, fuel_pct, lanes, breaks, accessorials):
+        self.company_id = company_id
+        self.currency = currency
+        self.fuel = fuel_pct / 100
+        ids = [lane[0] for lane in lanes]
+        self.origins = np.array([lane[1] for lane in lanes], dtype=object)
+        self.destinations = np.array([lane[2] for lane in lanes], dtype=object)
+        self.minimums = np.array([lane[3] for lane in lanes], dtype=np.float64)
+
+        by_lane = {lane_id: [] for lane_id in ids}
+        for lane_id, weight, rate in breaks:
+            by_lane[lane_id].append((weight, rate))
+        width = max((len(rows) for rows in by_lane.values()), default=0) or 1
+        self.break_weights = np.full((len(ids), width), np.inf)
+        self.break_rates = np.zeros((len(ids), width))
+        for i, lane_id in enumerate(ids):
+            rows = sorted(by_lane[lane_id])
+            self.break_weights[i, :len(rows)] = [weight for weight, _ in rows]
+            self.break_rates[i, :len(rows)] = [rate for _, rate in rows]
+
+        self.accessorials = dict(accessorials)
+
+
+def compile_card(company_id):
+    card = RateCard.objects.filter(freight_company_id=company_id, is_active=True).values_list(
+        'id', 'currency', 'fuel_surcharge_pct'
+    ).first()
+    if card is None:
+        return CompiledCard(company_id, None, 0, [], [], [])
+    card_id, currency, fuel_pct = card
+    lanes = RateLane.objects.filter(rate_card_id=card_id).order_by('id').values_list(
+        'id', 'origin', 'destination', 'minimum_charge'
+    )
+    breaks = WeightBreak.objects.filter(lane__rate_card_id=card_id).values_list(
+        'lane_id', 'min_weight_kg', 'rate_per_kg'
+    )
+    accessorials = Accessorial.objects.filter(rate_card_id=card_id).values_list('code', 'amount')
+    return CompiledCard(
+        company_id,
+        currency,
+        float(fuel_pct),
+        [(pk, origin, destination, float(minimum)) for pk, origin, destination, minimum in lanes],
+        [(lane_id, float(weight), float(rate)) for lane_id, weight, rate in breaks],
+        [(code, float(amount)) for code, amount in accessorials],
+    )
+
+
+_compiled = {}
+_lock = threading.Lock()
+
+
+def get_compiled(company_ids):
+    """Return compiled cards for ``company_ids``, recompiling only changed ones.
+
+    Cards are kept per process and tagged with their version counter, which
+    every rate card edit bumps. When the default cache is local to the
+    process, an edit in one worker would leave the others quoting from the
+    old card, so cards are compiled for every call instead.
+    """
+    if not versions_are_shared():
+        return [compile_card(company_id) for company_id in company_ids]
+    keys = {card_version_key(company_id): company_id for company_id in company_ids}
+    versions = cache.get_many(keys)
+    cards = []
+    for key, company_id in keys.items():
+        version = versions.get(key)
+        if version is None:
+            version = get_version(key)
+        entry = _compiled.get(company_id)
+        if entry is None or entry[0] != version:
+            entry = (version, compile_card(company_id))
+            with _lock:
+                _compiled[company_id] = entry
+        cards.append(entry[1])
+    return cards
+
+
+def _codes(values, vocabulary):
+    # Position of each value in the sorted vocabulary, or -1 if absent
+    if not len(vocabulary):
+        return np.full(np.shape(values), -1)
+    positions = np.minimum(np.searchsorted(vocabulary, values), len(vocabulary) - 1)
+    return np.where(vocabulary[positions] == values, positions, -1)
+
+
+def quote_matrix(origins, destinations, weights, accessorials, cards):
+    """Price every shipment on every card.
+
+    ``origins``, ``destinations`` and ``weights`` have one entry per
+    shipment and ``accessorials`` holds each shipment's set of requested
+    codes. Returns an (shipments × cards) float array with NaN where a card
+    has no lane for the route or lacks a requested accessorial.
+    """
+    n, c = len(weights), len(cards)
+    weights = np.asarray(weights, dtype=np.float64)
+    if not sum(len(card.origins) for card in cards):
+        return np.full((n, c), np.nan)
+
+    # Every location, plus the wildcard, gets an integer code for this batch
+    shipment_origins, origin_codes = np.unique(np.asarray(origins, dtype=object), return_inverse=True)
+    shipment_destinations, destination_codes = np.unique(np.asarray(destinations, dtype=object), return_inverse=True)
+    any_origin, any_destination = len(shipment_origins), len(shipment_destinations)
+    width = any_destination + 1
+
+    # Lane keys: card position, then origin code, then destination code
+    lane_keys, lane_rows = [], []
+    offset = 0
+    for position, card in enumerate(cards):
+        lane_origins = _codes(card.origins, shipment_origins)
+        lane_destinations = _codes(card.destinations, shipment_destinations)
+        lane_origins[card.origins == ANY_LOCATION] = any_origin
+        lane_destinations[card.destinations == ANY_LOCATION] = any_destination
+        usable = (lane_origins >= 0) & (lane_destinations >= 0)
+        keys = (position * (any_origin + 1) + lane_origins) * width + lane_destinations
+        lane_keys.append(keys[usable])
+        lane_rows.append(np.flatnonzero(usable) + offset)
+        offset += len(card.origins)
+    lane_keys, lane_rows = np.concatenate(lane_keys), np.concatenate(lane_rows)
+    order = np.argsort(lane_keys)
+    lane_keys, lane_rows = lane_keys[order], lane_rows[order]
+
+    # The most specific lane wins: exact, then any destination, then any
+    # origin, then any to any
+    cards_index = np.arange(c)[:, None]
+    lane = np.full((c, n), -1)
+    for origin, destination in (
+        (origin_codes, destination_codes),
+        (origin_codes, any_destination),
+        (any_origin, destination_codes),
+        (any_origin, any_destination),
+    ):
+        keys = (cards_index * (any_origin + 1) + origin) * width + destination
+        keys = np.broadcast_to(keys, (c, n))
+        found = _codes(keys, lane_keys)
+        lane = np.where((lane < 0) & (found >= 0), lane_rows[np.maximum(found, 0)], lane)
+
+    # Weight breaks of every card's lanes stacked into one table
+    break_width = max(card.break_weights.shape[1] for card in cards)
+    break_weights = np.full((offset, break_width), np.inf)
+    break_rates = np.zeros((offset, break_width))
+    minimums = np.empty(offset)
+    start = 0
+    for card in cards:
+        end = start + len(card.origins)
+        break_weights[start:end, :card.break_weights.shape[1]] = card.break_weights
+        break_rates[start:end, :card.break_rates.shape[1]] = card.break_rates
+        minimums[start:end] = card.minimums
+        start = end
+
+    rows = np.maximum(lane, 0)
+    # The applicable break is the last one whose minimum the weight reaches
+    reached = (break_weights[rows] <= weights[None, :, None]).sum(axis=2)
+    rate = np.take_along_axis(break_rates[rows], np.maximum(reached - 1, 0)[..., None], axis=2)[..., 0]
+    linehaul = np.maximum(rate * weights[None, :], minimums[rows])
+    fuel = np.array([card.fuel for card in cards])[:, None]
+    total = linehaul * (1 + fuel)
+
+    # Requested accessorials as a shipments × codes matrix, priced per card
+    codes = sorted({code for requested in accessorials for code in requested})
+    if codes:
+        column = {code: i for i, code in enumerate(codes)}
+        requested = np.zeros((n, len(codes)))
+        for i, shipment_codes in enumerate(accessorials):
+            for code in shipment_codes:
+                requested[i, column[code]] = 1
+        prices = np.array([[card.accessorials.get(code, np.nan) for code in codes] for card in cards])
+        total = total + (requested @ np.nan_to_num(prices).T).T
+        missing = (requested @ np.isnan(prices).T).T > 0
+        total[missing] = np.nan
+
+    total[lane < 0] = np.nan
+    return total.T
@@ -0,0 +1,36 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Roads are rarely straight; great-circle distances are scaled by this
+# typical detour factor
+ROAD_FACTOR = 1.2
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def decode_geohash(code):
+    """Return the (latitude, longitude) at the centre of a geohash cell."""
+    latitude, longitude = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in code.lower():
+        value = GEOHASH_ALPHABET.index(char)
+        for bit in (16, 8, 4, 2, 1):
+            interval = longitude if even else latitude
+            middle = (interval[0] + interval[1]) / 2
+            if value & bit:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return (latitude[0] + latitude[1]) / 2, (longitude[0] + longitude[1]) / 2
+
+
+def road_distances(latitudes_a, longitudes_a, latitudes_b, longitudes_b):
+    """Road distance estimates in km between every point of a and every point of b."""
+    lat_a = np.radians(np.asarray(latitudes_a, dtype=np.float64))[:, None]
+    lon_a = np.radians(np.asarray(longitudes_a, dtype=np.float64))[:, None]
+    lat_b = np.radians(np.asarray(latitudes_b, dtype=np.float64))[None, :]
+    lon_b = np.radians(np.asarray(longitudes_b, dtype=np.float64))[None, :]
+    h = np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(h, 1))) * ROAD_FACTOR
@@ -0,0 +1,305 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .geo import road_distances
+from .models import CarrierLane, Location, normalize_location
+
+# Seconds a process goes without checking for a newly published matrix
+CHECK_INTERVAL = 1.0
+
+# Generations kept on disk; a process still mapping an older one keeps its
+# pages, the files just lose their names
+KEEP_GENERATIONS = 2
+
+
+def matrix_dir():
+    return Path(settings.LANE_MATRIX_DIR)
+
+
+class MatrixLocked(Exception):
+    pass
+
+
+def _locked(root):
+    root.mkdir(parents=True, exist_ok=True)
+    handle = open(root / '.lock', 'w')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        raise MatrixLocked('another lane matrix build is running')
+    return handle
+
+
+def _read_current(root):
+    try:
+        return (root / 'CURRENT').read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_atomic(path, text):
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+def _transit(distances, speeds, handling):
+    speeds = np.asarray(speeds, dtype=np.float64)
+    hours = distances / np.where(speeds > 0, speeds, np.nan) + np.asarray(handling, dtype=np.float64)
+    return hours.astype(np.float32)
+
+
+def _coordinates(codes):
+    found = dict(
+        (code, (lat, lon)) for code, lat, lon in
+        Location.objects.filter(code__in=codes).values_list('code', 'latitude', 'longitude')
+    )
+    lat = np.array([found.get(code, (None, None))[0] for code in codes], dtype=np.float64)
+    lon = np.array([found.get(code, (None, None))[1] for code in codes], dtype=np.float64)
+    return lat, lon
+
+
+def lanes_state():
+    """Something that changes whenever a lane or location is added, edited or deleted.
+
+    Read from the database rather than a cache counter, so a build job sees
+    the changes every web worker makes whatever the cache backend.
+    """
+    state = []
+    for model in (CarrierLane, Location):
+        row = model.objects.aggregate(count=Count('pk'), latest=Max('updated_at'))
+        state.append([row['count'], row['latest'] and row['latest'].isoformat()])
+    return state
+
+
+def build_lane_matrix(full=False, version=None):
+    """Bring the on-disk lane matrix up to date with the active lanes.
+
+    The matrix covers every location an active lane starts or ends at:
+    ``distance.npy`` holds the (locations × locations) road distances in km
+    and ``transit.npy`` the (carriers × locations × locations) transit hours,
+    NaN where a carrier runs no such lane. Both are float32.
+
+    While lanes only change between known locations and carriers, the
+    current files are patched in place, and processes mapping them see the
+    new cells straight away. A new location or carrier needs a bigger
+    matrix, so a new generation is written and published by switching the
+    ``CURRENT`` pointer. Returns ``(mode, cells written)``.
+    """
+    root = matrix_dir()
+    lock = _locked(root)
+    try:
+        started = timezone.now()
+        keys = list(CarrierLane.objects.filter(is_active=True).values_list(
+            'freight_company_id', 'origin_id', 'destination_id'
+        ))
+        codes = sorted({origin for _, origin, _ in keys} | {destination for _, _, destination in keys})
+        company_ids = sorted({company_id for company_id, _, _ in keys})
+
+        current = _read_current(root)
+        meta = None
+        if current and not full:
+            try:
+                meta = json.loads((root / current / 'meta.json').read_text())
+            except FileNotFoundError:
+                meta = None
+        if meta is not None and set(codes) <= set(meta['locations']) and set(company_ids) <= set(meta['companies']):
+            written = _patch(root / current, meta, keys, started, version)
+            return 'incremental', written
+        written = _rebuild(root, codes, company_ids, started, version)
+        return 'full', written
+    finally:
+        lock.close()
+
+
+def _rebuild(root, codes, company_ids, started, version):
+    name = f'gen-{time.time_ns()}'
+    tmp = root / f'.{name}'
+    tmp.mkdir()
+    lat, lon = _coordinates(codes)
+    distance = np.lib.format.open_memmap(tmp / 'distance.npy', mode='w+', dtype=np.float32, shape=(len(codes), len(codes)))
+    distance[:] = road_distances(lat, lon, lat, lon)
+    transit = np.lib.format.open_memmap(
+        tmp / 'transit.npy', mode='w+', dtype=np.float32, shape=(len(company_ids), len(codes), len(codes))
+    )
+    transit[:] = np.nan
+
+    location_index = {code: i for i, code in enumerate(codes)}
+    company_index = {company_id: i for i, company_id in enumerate(company_ids)}
+    lanes = CarrierLane.objects.filter(is_active=True).values_list(
+        'freight_company_id', 'origin_id', 'destination_id', 'average_speed_kmh', 'handling_hours'
+    )
+    written = _write_lanes(distance, transit, location_index, company_index, lanes)
+    distance.flush()
+    transit.flush()
+    del distance, transit
+
+    (tmp / 'meta.json').write_text(json.dumps({
+        'locations': codes,
+        'companies': company_ids,
+        'built_at': started.isoformat(),
+        'version': version,
+    }))
+    tmp.rename(root / name)
+    _write_atomic(root / 'CURRENT', name)
+
+    generations = sorted(path for path in root.iterdir() if path.name.startswith('gen-'))
+    for path in generations[:-KEEP_GENERATIONS]:
+        shutil.rmtree(path, ignore_errors=True)
+    return written
+
+
+def _write_lanes(distance, transit, location_index, company_index, lanes):
+    rows = [
+        (company_index[company_id], location_index[origin], location_index[destination], speed, handling)
+        for company_id, origin, destination, speed, handling in lanes
+        if company_id in company_index and origin in location_index and destination in location_index
+    ]
+    if not rows:
+        return 0
+    c, o, d, speeds, handling = (np.array(column) for column in zip(*rows))
+    transit[c, o, d] = _transit(distance[o, d].astype(np.float64), speeds, handling)
+    return len(rows)
+
+
+def _patch(path, meta, keys, started, version):
+    location_index = {code: i for i, code in enumerate(meta['locations'])}
+    company_index = {company_id: i for i, company_id in enumerate(meta['companies'])}
+    built_at = datetime.fromisoformat(meta['built_at'])
+    distance = np.load(path / 'distance.npy', mmap_mode='r+')
+    transit = np.load(path / 'transit.npy', mmap_mode='r+')
+    written = 0
+
+    # Moved locations change a whole row and column of distances
+    moved = list(Location.objects.filter(
+        updated_at__gte=built_at, code__in=location_index
+    ).values_list('code', flat=True))
+    if moved:
+        lat, lon = _coordinates(meta['locations'])
+        for code in moved:
+            i = location_index[code]
+            distance[i, :] = road_distances(lat[i:i + 1], lon[i:i + 1], lat, lon)[0]
+            distance[:, i] = distance[i, :]
+
+    # Cells of lanes since deleted or deactivated
+    active = np.zeros(transit.shape, dtype=bool)
+    if keys:
+        c, o, d = (np.array(column) for column in zip(*(
+            (company_index[company_id], location_index[origin], location_index[destination])
+            for company_id, origin, destination in keys
+        )))
+        active[c, o, d] = True
+    stale = ~active & ~np.isnan(transit)
+    transit[stale] = np.nan
+    written += int(stale.sum())
+
+    changed = CarrierLane.objects.filter(is_active=True).filter(
+        Q(updated_at__gte=built_at) | Q(origin__in=moved) | Q(destination__in=moved)
+    ).values_list('freight_company_id', 'origin_id', 'destination_id', 'average_speed_kmh', 'handling_hours')
+    written += _write_lanes(distance, transit, location_index, company_index, changed)
+    distance.flush()
+    transit.flush()
+
+    meta['built_at'] = started.isoformat()
+    meta['version'] = version
+    _write_atomic(path / 'meta.json', json.dumps(meta))
+    return written
+
+
+class _Snapshot:
+    def __init__(self, path):
+        meta = json.loads((path / 'meta.json').read_text())
+        self.name = path.name
+        self.locations = {code: i for i, code in enumerate(meta['locations'])}
+        self.companies = {company_id: i for i, company_id in enumerate(meta['companies'])}
+        # Read-only shared mappings: every process on the host reads the same
+        # pages from the page cache
+        self.distance = np.load(path / 'distance.npy', mmap_mode='r')
+        self.transit = np.load(path / 'transit.npy', mmap_mode='r')
+
+
+class LaneMatrix:
+    """Distance and transit lookups against the published lane matrix."""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._snapshot = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    def _get(self):
+        now = time.monotonic()
+        if now - self._checked >= CHECK_INTERVAL:
+            with self._lock:
+                if now - self._checked >= CHECK_INTERVAL:
+                    root = Path(self.directory) if self.directory else matrix_dir()
+                    name = _read_current(root)
+                    if name is None:
+                        self._snapshot = None
+                    elif self._snapshot is None or self._snapshot.name != name:
+                        try:
+                            self._snapshot = _Snapshot(root / name)
+                        except FileNotFoundError:
+                            # Replaced while we read it; try again next time
+                            pass
+                    self._checked = now
+        return self._snapshot
+
+    def distance(self, origin, destination):
+        """Road distance in km, or None for a location outside the matrix."""
+        snapshot = self._get()
+        if snapshot is None:
+            return None
+        o = snapshot.locations.get(normalize_location(origin))
+        d = snapshot.locations.get(normalize_location(destination))
+        if o is None or d is None:
+            return None
+        value = float(snapshot.distance[o, d])
+        return None if np.isnan(value) else value
+
+    def transit(self, company_id, origin, destination):
+        """Transit hours on a carrier's lane, or None if it does not run it."""
+        snapshot = self._get()
+        if snapshot is None:
+            return None
+        c = snapshot.companies.get(company_id)
+        o = snapshot.locations.get(normalize_location(origin))
+        d = snapshot.locations.get(normalize_location(destination))
+        if c is None or o is None or d is None:
+            return None
+        value = float(snapshot.transit[c, o, d])
+        return None if np.isnan(value) else value
+
+    def transit_matrix(self, company_ids, origins, destinations):
+        """Transit hours as a (shipments × carriers) array, NaN where unknown."""
+        n, c = len(origins), len(company_ids)
+        snapshot = self._get()
+        if snapshot is None or not snapshot.companies or not n or not c:
+            return np.full((n, c), np.nan)
+
+        def index(values, positions):
+            unique, inverse = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+            found = np.array([positions.get(normalize_location(value), -1) for value in unique], dtype=np.intp)
+            return found[inverse]
+
+        o = index(origins, snapshot.locations)
+        d = index(destinations, snapshot.locations)
+        carriers = np.array([snapshot.companies.get(company_id, -1) for company_id in company_ids], dtype=np.intp)
+        hours = snapshot.transit[np.maximum(carriers, 0)[None, :], np.maximum(o, 0)[:, None], np.maximum(d, 0)[:, None]]
+        known = (carriers >= 0)[None, :] & (o >= 0)[:, None] & (d >= 0)[:, None]
+        return np.where(known, hours.astype(np.float64), np.nan)
+
+
+lane_matrix = LaneMatrix()
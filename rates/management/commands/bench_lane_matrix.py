@@ -0,0 +1,134 @@
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from core.models import FreightCompany
+from rates.geo import road_distances
+from rates.lanes import LaneMatrix, build_lane_matrix
+from rates.models import CarrierLane, Location
+from superadmin.models import SaaSProvider
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Times building, patching and reading the lane distance/transit matrix'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locations', type=int, default=500)
+        parser.add_argument('--carriers', type=int, default=20)
+        parser.add_argument('--lanes', type=int, default=2000, help='Lanes per carrier')
+        parser.add_argument('--changes', type=int, default=200, help='Lanes edited before the incremental build')
+        parser.add_argument('--shipments', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory, override_settings(LANE_MATRIX_DIR=directory):
+            try:
+                with transaction.atomic():
+                    self.run(options, directory)
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def run(self, options, directory):
+        rng = random.Random(0)
+        provider = SaaSProvider.objects.create(
+            name='Benchmark Provider',
+            contact_email=f'bench-{time.time_ns()}@example.com'
+        )
+        companies = FreightCompany.objects.bulk_create(
+            [FreightCompany(name=f'Benchmark Carrier {i}', saas_provider=provider) for i in range(options['carriers'])]
+        )
+        locations = Location.objects.bulk_create([
+            Location(code=f'BENCH{i:05d}', latitude=rng.uniform(36, 60), longitude=rng.uniform(-9, 25))
+            for i in range(options['locations'])
+        ])
+        codes = [location.code for location in locations]
+        routes = set()
+        for company in companies:
+            for _ in range(options['lanes']):
+                routes.add((company.id, rng.choice(codes), rng.choice(codes)))
+        CarrierLane.objects.bulk_create([
+            CarrierLane(
+                freight_company_id=company_id, origin_id=origin, destination_id=destination,
+                average_speed_kmh=rng.uniform(45, 80), handling_hours=rng.choice([0, 2, 4, 12])
+            )
+            for company_id, origin, destination in routes
+        ])
+
+        start = time.perf_counter()
+        mode, written = build_lane_matrix()
+        sizes = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(directory) for name in names
+        )
+        self.stdout.write(
+            f'{mode} build: {written} lanes, {len(codes)} locations in {time.perf_counter() - start:.2f}s, '
+            f'{sizes / 1e6:.1f}MB on disk'
+        )
+
+        matrix = LaneMatrix()
+        company_ids = [company.id for company in companies]
+        origins = [rng.choice(codes) for _ in range(options['shipments'])]
+        destinations = [rng.choice(codes) for _ in range(options['shipments'])]
+        matrix.transit_matrix(company_ids, origins[:1], destinations[:1])
+
+        # Edit, deactivate and delete some lanes and move a location, which a
+        # process that already mapped the matrix must see without reloading
+        lanes = list(CarrierLane.objects.filter(freight_company__in=companies).order_by('?')[:options['changes'] * 3])
+        edited, deactivated, deleted = (
+            lanes[:options['changes']], lanes[options['changes']:options['changes'] * 2], lanes[options['changes'] * 2:]
+        )
+        for lane in edited:
+            lane.average_speed_kmh = 30
+            lane.save()
+        CarrierLane.objects.filter(pk__in=[lane.pk for lane in deactivated]).update(is_active=False)
+        CarrierLane.objects.filter(pk__in=[lane.pk for lane in deleted]).delete()
+        moved = locations[0]
+        moved.latitude, moved.longitude = 48.85, 2.35
+        moved.save()
+
+        start = time.perf_counter()
+        mode, written = build_lane_matrix()
+        self.stdout.write(f'{mode} build: {written} cells written in {time.perf_counter() - start:.3f}s')
+
+        n = options['shipments']
+        start = time.perf_counter()
+        for origin, destination in zip(origins, destinations):
+            matrix.transit(company_ids[0], origin, destination)
+        single = time.perf_counter() - start
+        start = time.perf_counter()
+        hours = matrix.transit_matrix(company_ids, origins, destinations)
+        batch = time.perf_counter() - start
+        self.stdout.write(
+            f'{n} single lookups in {single * 1000:.1f}ms ({single / n * 1e6:.2f}us each); '
+            f'{n} x {len(company_ids)} batch in {batch * 1000:.1f}ms'
+        )
+
+        # Every cell against a direct calculation from the database
+        coordinates = {code: (lat, lon) for code, lat, lon in Location.objects.filter(
+            code__in=codes
+        ).values_list('code', 'latitude', 'longitude')}
+        expected = {}
+        for company_id, origin, destination, speed, handling in CarrierLane.objects.filter(
+            freight_company__in=companies, is_active=True
+        ).values_list('freight_company_id', 'origin_id', 'destination_id', 'average_speed_kmh', 'handling_hours'):
+            (lat_a, lon_a), (lat_b, lon_b) = coordinates[origin], coordinates[destination]
+            km = road_distances([lat_a], [lon_a], [lat_b], [lon_b])[0, 0]
+            expected[company_id, origin, destination] = km / speed + handling
+        mismatches = 0
+        for i, (origin, destination) in enumerate(zip(origins, destinations)):
+            for j, company_id in enumerate(company_ids):
+                want = expected.get((company_id, origin, destination), np.nan)
+                got = hours[i, j]
+                if not (np.isnan(want) and np.isnan(got)) and not np.isclose(want, got, rtol=1e-4):
+                    mismatches += 1
+        self.stdout.write(f'Checked {n * len(company_ids)} cells against the database: {mismatches} mismatches')
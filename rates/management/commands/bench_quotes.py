@@ -0,0 +1,133 @@
+import math
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import FreightCompany
+from rates.engine import get_compiled, quote_matrix
+from rates.models import ANY_LOCATION, Accessorial, RateCard, RateLane, WeightBreak
+from superadmin.models import SaaSProvider
+
+ACCESSORIALS = ['LIFTGATE', 'RESIDENTIAL', 'HAZMAT', 'INSIDE']
+
+
+class Rollback(Exception):
+    pass
+
+
+def reference_price(card, origin, destination, weight, codes):
+    # Straightforward per-shipment pricing the vectorized engine must match
+    lanes = {(o, d): i for i, (o, d) in enumerate(zip(card.origins, card.destinations))}
+    for key in ((origin, destination), (origin, ANY_LOCATION), (ANY_LOCATION, destination), (ANY_LOCATION, ANY_LOCATION)):
+        if key in lanes:
+            lane = lanes[key]
+            break
+    else:
+        return math.nan
+    rate = card.break_rates[lane, 0]
+    for minimum, break_rate in zip(card.break_weights[lane], card.break_rates[lane]):
+        if minimum <= weight:
+            rate = break_rate
+    total = max(rate * weight, card.minimums[lane]) * (1 + card.fuel)
+    for code in codes:
+        if code not in card.accessorials:
+            return math.nan
+        total += card.accessorials[code]
+    return total
+
+
+class Command(BaseCommand):
+    help = 'Times a shipments x carriers quote matrix and checks it against per-shipment pricing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shipments', type=int, default=10000)
+        parser.add_argument('--carriers', type=int, default=20)
+        parser.add_argument('--locations', type=int, default=60)
+        parser.add_argument('--lanes', type=int, default=400, help='Exact lanes per carrier')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--check', type=int, default=2000, help='Shipments to verify against the reference')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(0)
+        locations = [f'LOC{i:03d}' for i in range(options['locations'])]
+        provider = SaaSProvider.objects.create(
+            name='Benchmark Provider',
+            contact_email=f'bench-{time.time_ns()}@example.com'
+        )
+        companies = FreightCompany.objects.bulk_create(
+            [FreightCompany(name=f'Benchmark Carrier {i}', saas_provider=provider) for i in range(options['carriers'])]
+        )
+        cards = RateCard.objects.bulk_create([
+            RateCard(freight_company=company, name='Standard', fuel_surcharge_pct=rng.choice([0, 8.5, 12, 15]))
+            for company in companies
+        ])
+
+        lanes = []
+        for card in cards:
+            routes = {(rng.choice(locations), rng.choice(locations)) for _ in range(options['lanes'])}
+            # Some carriers cover everything else from or to a hub, some not at all
+            routes |= {(rng.choice(locations), ANY_LOCATION), (ANY_LOCATION, rng.choice(locations))}
+            if rng.random() < 0.5:
+                routes.add((ANY_LOCATION, ANY_LOCATION))
+            lanes += [
+                RateLane(rate_card=card, origin=origin, destination=destination, minimum_charge=rng.randint(40, 120))
+                for origin, destination in routes
+            ]
+        lanes = RateLane.objects.bulk_create(lanes)
+        WeightBreak.objects.bulk_create([
+            WeightBreak(lane=lane, min_weight_kg=minimum, rate_per_kg=round(rng.uniform(0.05, 0.9) / (1 + i), 4))
+            for lane in lanes
+            for i, minimum in enumerate([0, 100, 500, 1000, 2500, 5000, 10000][:rng.randint(1, 7)])
+        ])
+        Accessorial.objects.bulk_create([
+            Accessorial(rate_card=card, code=code, amount=rng.randint(15, 90))
+            for card in cards
+            for code in ACCESSORIALS
+            if rng.random() < 0.75
+        ])
+
+        n = options['shipments']
+        origins = [rng.choice(locations) for _ in range(n)]
+        destinations = [rng.choice(locations) for _ in range(n)]
+        weights = [round(rng.uniform(1, 12000), 1) for _ in range(n)]
+        accessorials = [
+            frozenset(code for code in ACCESSORIALS if rng.random() < 0.1)
+            for _ in range(n)
+        ]
+
+        company_ids = [company.id for company in companies]
+        start = time.perf_counter()
+        compiled = get_compiled(company_ids)
+        self.stdout.write(f'Compiled {len(compiled)} cards, {len(lanes)} lanes in {time.perf_counter() - start:.3f}s')
+
+        timings = []
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            compiled = get_compiled(company_ids)
+            prices = quote_matrix(origins, destinations, weights, accessorials, compiled)
+            timings.append(time.perf_counter() - start)
+        self.stdout.write(
+            f'{n} shipments x {len(compiled)} carriers: best {min(timings) * 1000:.1f}ms, '
+            f'median {sorted(timings)[len(timings) // 2] * 1000:.1f}ms, '
+            f'{np.isnan(prices).mean():.0%} unpriced'
+        )
+
+        mismatches = 0
+        for i in range(min(options['check'], n)):
+            for j, card in enumerate(compiled):
+                expected = reference_price(card, origins[i], destinations[i], weights[i], accessorials[i])
+                actual = prices[i, j]
+                if not (math.isnan(expected) and math.isnan(actual)) and not math.isclose(expected, actual):
+                    mismatches += 1
+        self.stdout.write(f'Checked {min(options["check"], n)} shipments against the reference: {mismatches} mismatches')
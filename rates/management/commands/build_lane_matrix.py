@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rates.lanes import MatrixLocked, build_lane_matrix, lanes_state
+
+
+class Command(BaseCommand):
+    help = 'Precomputes the lane distance/transit matrix the quoting workers map from disk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Write a new generation even if a patch would do')
+        parser.add_argument('--watch', action='store_true', help='Keep running and patch the matrix when lanes change')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between checks with --watch')
+
+    def handle(self, *args, **options):
+        built = None
+        full = options['full']
+        while True:
+            version = lanes_state()
+            if version != built:
+                start = time.perf_counter()
+                try:
+                    mode, written = build_lane_matrix(full=full, version=version)
+                except MatrixLocked as e:
+                    raise CommandError(str(e))
+                self.stdout.write(self.style.SUCCESS(
+                    f'{mode.capitalize()} build: {written} cells written in {time.perf_counter() - start:.2f}s'
+                ))
+                built, full = version, False
+            if not options['watch']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('major_clients', '0005_freightcompany_end_customers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateCard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('currency', models.CharField(default='EUR', max_length=3)),
+                ('fuel_surcharge_pct', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('freight_company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rate_cards', to='major_clients.freightcompany')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Accessorial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=32)),
+                ('name', models.CharField(blank=True, max_length=200)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('rate_card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accessorials', to='rates.ratecard')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RateLane',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.CharField(max_length=64)),
+                ('destination', models.CharField(max_length=64)),
+                ('minimum_charge', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('rate_card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lanes', to='rates.ratecard')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WeightBreak',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_weight_kg', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('rate_per_kg', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('lane', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='breaks', to='rates.ratelane')),
+            ],
+            options={
+                'ordering': ['min_weight_kg'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ratecard',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('freight_company',), name='ratecard_one_active_per_company'),
+        ),
+        migrations.AddConstraint(
+            model_name='accessorial',
+            constraint=models.UniqueConstraint(fields=('rate_card', 'code'), name='accessorial_card_code_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='ratelane',
+            constraint=models.UniqueConstraint(fields=('rate_card', 'origin', 'destination'), name='ratelane_card_route_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='weightbreak',
+            constraint=models.UniqueConstraint(fields=('lane', 'min_weight_kg'), name='weightbreak_lane_weight_uniq'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('major_clients', '0005_freightcompany_end_customers'),
+        ('rates', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=64, unique=True)),
+                ('kind', models.CharField(choices=[('postal_code', 'Postal code'), ('geohash', 'Geohash')], default='postal_code', max_length=20)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CarrierLane',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('average_speed_kmh', models.FloatField(default=60)),
+                ('handling_hours', models.FloatField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('freight_company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='carrier_lanes', to='major_clients.freightcompany')),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rates.location', to_field='code')),
+                ('origin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rates.location', to_field='code')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['updated_at'], name='carrierlane_updated_idx')],
+                'constraints': [models.UniqueConstraint(fields=('freight_company', 'origin', 'destination'), name='carrierlane_company_route_uniq')],
+            },
+        ),
+    ]
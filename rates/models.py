@@ -0,0 +1,162 @@
+from django.core.exceptions import ValidationError
+from django.db import models
+
+from major_clients.models import FreightCompany
+
+# Lane origin or destination that matches any location
+ANY_LOCATION = '*'
+
+
+class RateCard(models.Model):
+    freight_company = models.ForeignKey(
+        FreightCompany,
+        on_delete=models.CASCADE,
+        related_name='rate_cards'
+    )
+    name = models.CharField(max_length=200)
+    currency = models.CharField(max_length=3, default='EUR')
+    # Percentage added on top of the linehaul charge
+    fuel_surcharge_pct = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.freight_company} - {self.name}'
+
+    class Meta:
+        constraints = [
+            # Quotes use the one active card of each carrier
+            models.UniqueConstraint(
+                fields=['freight_company'],
+                condition=models.Q(is_active=True),
+                name='ratecard_one_active_per_company'
+            ),
+        ]
+
+
+class RateLane(models.Model):
+    rate_card = models.ForeignKey(RateCard, on_delete=models.CASCADE, related_name='lanes')
+    # Location codes as shipments use them, or '*' for any location
+    origin = models.CharField(max_length=64)
+    destination = models.CharField(max_length=64)
+    minimum_charge = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f'{self.origin} → {self.destination}'
+
+    def save(self, *args, **kwargs):
+        # Lanes are matched case-insensitively
+        self.origin = self.origin.strip().upper()
+        self.destination = self.destination.strip().upper()
+        super().save(*args, **kwargs)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['rate_card', 'origin', 'destination'], name='ratelane_card_route_uniq'),
+        ]
+
+
+class WeightBreak(models.Model):
+    lane = models.ForeignKey(RateLane, on_delete=models.CASCADE, related_name='breaks')
+    # The rate applies from this weight up to the next break
+    min_weight_kg = models.DecimalField(max_digits=10, decimal_places=2)
+    rate_per_kg = models.DecimalField(max_digits=10, decimal_places=4)
+
+    def __str__(self):
+        return f'{self.min_weight_kg} kg+: {self.rate_per_kg}/kg'
+
+    class Meta:
+        ordering = ['min_weight_kg']
+        constraints = [
+            models.UniqueConstraint(fields=['lane', 'min_weight_kg'], name='weightbreak_lane_weight_uniq'),
+        ]
+
+
+class Accessorial(models.Model):
+    rate_card = models.ForeignKey(RateCard, on_delete=models.CASCADE, related_name='accessorials')
+    # e.g. LIFTGATE or RESIDENTIAL; quotes ask for services by code
+    code = models.CharField(max_length=32)
+    name = models.CharField(max_length=200, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return self.code
+
+    def save(self, *args, **kwargs):
+        self.code = self.code.strip().upper()
+        super().save(*args, **kwargs)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['rate_card', 'code'], name='accessorial_card_code_uniq'),
+        ]
+
+
+def normalize_location(code):
+    # 'nl 3011-ab' and 'NL3011AB' are the same place
+    return ''.join(ch for ch in str(code).upper() if ch.isalnum())
+
+
+class Location(models.Model):
+    class Kind(models.TextChoices):
+        POSTAL_CODE = 'postal_code', 'Postal code'
+        GEOHASH = 'geohash', 'Geohash'
+
+    code = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=20, choices=Kind.choices, default=Kind.POSTAL_CODE)
+    # Geohash locations get these from their code when left empty
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.code
+
+    def clean(self):
+        from .geo import GEOHASH_ALPHABET
+        if self.kind == self.Kind.GEOHASH and not all(ch in GEOHASH_ALPHABET for ch in self.code.lower()):
+            raise ValidationError({'code': 'Not a valid geohash.'})
+
+    def save(self, *args, **kwargs):
+        self.code = normalize_location(self.code)
+        if self.kind == self.Kind.GEOHASH and (self.latitude is None or self.longitude is None):
+            from .geo import decode_geohash
+            self.latitude, self.longitude = decode_geohash(self.code)
+        super().save(*args, **kwargs)
+
+
+class CarrierLane(models.Model):
+    """A route a carrier runs, with what it takes to run it.
+
+    Distances come from the two locations; the transit time is the distance
+    at the lane's average speed plus its fixed handling time.
+    """
+    freight_company = models.ForeignKey(
+        FreightCompany,
+        on_delete=models.CASCADE,
+        related_name='carrier_lanes'
+    )
+    # Keyed by the normalized location codes
+    origin = models.ForeignKey(Location, to_field='code', on_delete=models.CASCADE, related_name='+')
+    destination = models.ForeignKey(Location, to_field='code', on_delete=models.CASCADE, related_name='+')
+    average_speed_kmh = models.FloatField(default=60)
+    # Loading, cross-docking and the like, whatever the distance
+    handling_hours = models.FloatField(default=0)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.freight_company}: {self.origin_id} → {self.destination_id}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['freight_company', 'origin', 'destination'],
+                name='carrierlane_company_route_uniq'
+            ),
+        ]
+        indexes = [
+            # The matrix job reads the lanes changed since its last run
+            models.Index(fields=['updated_at'], name='carrierlane_updated_idx'),
+        ]
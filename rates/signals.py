@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.versioning import bump_version
+from .engine import card_version_key
+from .models import Accessorial, RateCard, RateLane, WeightBreak
+
+
+def invalidate_card(company_id):
+    # Bumped after commit, or a quote compiling meanwhile could cache the
+    # old rows under the new version
+    transaction.on_commit(lambda: bump_version(card_version_key(company_id)))
+
+
+@receiver(post_save, sender=RateCard)
+@receiver(post_delete, sender=RateCard)
+def invalidate_rate_card(sender, instance, **kwargs):
+    invalidate_card(instance.freight_company_id)
+
+
+@receiver(post_save, sender=RateLane)
+@receiver(post_delete, sender=RateLane)
+@receiver(post_save, sender=Accessorial)
+@receiver(post_delete, sender=Accessorial)
+def invalidate_card_row(sender, instance, **kwargs):
+    company_id = RateCard.objects.filter(pk=instance.rate_card_id).values_list('freight_company_id', flat=True).first()
+    if company_id is not None:
+        invalidate_card(company_id)
+
+
+@receiver(post_save, sender=WeightBreak)
+@receiver(post_delete, sender=WeightBreak)
+def invalidate_weight_break(sender, instance, **kwargs):
+    company_id = RateLane.objects.filter(pk=instance.lane_id).values_list(
+        'rate_card__freight_company_id', flat=True
+    ).first()
+    if company_id is not None:
+        invalidate_card(company_id)
+
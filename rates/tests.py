@@ -0,0 +1,168 @@
+import math
+import tempfile
+from decimal import Decimal
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+
+from major_clients.models import FreightCompany
+from superadmin.models import SaaSProvider
+from .engine import compile_card, get_compiled, quote_matrix
+from .geo import road_distances
+from .lanes import LaneMatrix, build_lane_matrix, lanes_state
+from .management.commands.bench_quotes import reference_price
+from .models import ANY_LOCATION, Accessorial, CarrierLane, Location, RateCard, RateLane, WeightBreak
+
+
+class RatesTestCase(TestCase):
+    def setUp(self):
+        provider = SaaSProvider.objects.create(name='Provider', contact_email='provider@example.com')
+        self.company = FreightCompany.objects.create(name='Carrier', saas_provider=provider)
+        self.card = RateCard.objects.create(freight_company=self.company, name='Standard')
+
+
+class AccessorialTests(RatesTestCase):
+    def test_full_clean_accepts_an_accessorial(self):
+        accessorial = Accessorial(rate_card=self.card, code='liftgate', amount=Decimal('25.00'))
+        accessorial.full_clean()
+        accessorial.save()
+        self.assertEqual(accessorial.code, 'LIFTGATE')
+
+
+class CompiledCardTests(RatesTestCase):
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_compiles_on_every_call(self):
+        Accessorial.objects.create(rate_card=self.card, code='LIFTGATE', amount=Decimal('25.00'))
+        self.assertEqual(get_compiled([self.company.pk])[0].accessorials, {'LIFTGATE': 25.0})
+        # Edited by another worker, whose bump this cache never sees
+        Accessorial.objects.filter(rate_card=self.card).update(amount=Decimal('30.00'))
+        self.assertEqual(get_compiled([self.company.pk])[0].accessorials, {'LIFTGATE': 30.0})
+
+
+class LaneStateTests(RatesTestCase):
+    def test_changes_with_every_lane_edit(self):
+        Location.objects.create(code='NL3011', latitude=51.92, longitude=4.48)
+        Location.objects.create(code='DE10115', latitude=52.53, longitude=13.38)
+        lane = CarrierLane.objects.create(freight_company=self.company, origin_id='NL3011', destination_id='DE10115')
+        states = [lanes_state()]
+        lane.is_active = False
+        lane.save()
+        states.append(lanes_state())
+        lane.delete()
+        states.append(lanes_state())
+        self.assertEqual(len({str(state) for state in states}), 3)
+
+
+class QuoteMatrixTests(RatesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.card.fuel_surcharge_pct = Decimal('10')
+        self.card.save()
+        self.lane(self.card, 'NL1', 'DE1', 30, [(0, '0.5'), (100, '0.4'), (500, '0.3')])
+        self.lane(self.card, 'NL1', ANY_LOCATION, 80, [(0, '1.0')])
+        self.lane(self.card, ANY_LOCATION, ANY_LOCATION, 200, [(0, '2.0')])
+        Accessorial.objects.create(rate_card=self.card, code='LIFTGATE', amount=Decimal('25'))
+
+        self.other = FreightCompany.objects.create(name='Other', saas_provider=self.company.saas_provider)
+        card = RateCard.objects.create(freight_company=self.other, name='Standard')
+        self.lane(card, ANY_LOCATION, 'DE1', 30, [(0, '0.2')])
+
+    def lane(self, card, origin, destination, minimum, breaks):
+        lane = RateLane.objects.create(rate_card=card, origin=origin, destination=destination, minimum_charge=minimum)
+        for weight, rate in breaks:
+            WeightBreak.objects.create(lane=lane, min_weight_kg=weight, rate_per_kg=Decimal(rate))
+
+    def test_matches_per_lane_pricing(self):
+        shipments = [
+            # Under the minimum charge
+            ('NL1', 'DE1', 50, frozenset()),
+            # Exactly on a weight break
+            ('NL1', 'DE1', 100, frozenset()),
+            # The second carrier has no liftgate
+            ('NL1', 'DE1', 600, frozenset({'LIFTGATE'})),
+            # Any destination beats any to any
+            ('NL1', 'FR1', 10, frozenset()),
+            ('BE1', 'DE1', 1000, frozenset()),
+            # Only the first carrier covers it, and nobody has this service
+            ('BE1', 'FR1', 100, frozenset({'HAZMAT'})),
+        ]
+        cards = [compile_card(self.company.pk), compile_card(self.other.pk)]
+        origins, destinations, weights, accessorials = zip(*shipments)
+        prices = quote_matrix(list(origins), list(destinations), list(weights), list(accessorials), cards)
+
+        nan = math.nan
+        expected = [
+            [33.0, 30.0],
+            [44.0, 30.0],
+            [223.0, nan],
+            [88.0, nan],
+            [2200.0, 200.0],
+            [nan, nan],
+        ]
+        np.testing.assert_allclose(prices, expected)
+        reference = [[reference_price(card, *shipment) for card in cards] for shipment in shipments]
+        np.testing.assert_allclose(prices, reference)
+
+    def test_carrier_without_a_card_prices_nothing(self):
+        no_card = FreightCompany.objects.create(name='None', saas_provider=self.company.saas_provider)
+        cards = [compile_card(self.company.pk), compile_card(no_card.pk)]
+        prices = quote_matrix(['BE1'], ['FR1'], [100], [frozenset()], cards)
+        np.testing.assert_allclose(prices, [[220.0, math.nan]])
+
+
+class LaneMatrixTests(RatesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(override_settings(LANE_MATRIX_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+        # Amsterdam and Berlin
+        self.ams = Location.objects.create(code='u173z', kind=Location.Kind.GEOHASH)
+        self.ber = Location.objects.create(code='u33db', kind=Location.Kind.GEOHASH)
+        self.lane = CarrierLane.objects.create(
+            freight_company=self.company, origin=self.ams, destination=self.ber,
+            average_speed_kmh=60, handling_hours=2
+        )
+        self.km = road_distances([self.ams.latitude], [self.ams.longitude], [self.ber.latitude], [self.ber.longitude])[0, 0]
+
+    def test_build_then_lookup(self):
+        self.assertEqual(build_lane_matrix(), ('full', 1))
+        matrix = LaneMatrix()
+        self.assertAlmostEqual(matrix.distance('U173Z', 'u33db'), self.km, delta=0.1)
+        self.assertAlmostEqual(matrix.transit(self.company.pk, 'u173z', 'u33db'), self.km / 60 + 2, places=3)
+        # Only the lanes a carrier runs have a transit time
+        self.assertIsNone(matrix.transit(self.company.pk, 'u33db', 'u173z'))
+        self.assertIsNone(matrix.distance('u173z', 'NL3011'))
+        np.testing.assert_allclose(
+            matrix.transit_matrix([self.company.pk, self.company.pk + 1], ['u173z', 'u33db'], ['u33db', 'u173z']),
+            [[self.km / 60 + 2, math.nan], [math.nan, math.nan]], rtol=1e-5
+        )
+
+    def test_changed_lane_is_patched_in_place(self):
+        build_lane_matrix()
+        matrix = LaneMatrix()
+        self.assertAlmostEqual(matrix.transit(self.company.pk, 'u173z', 'u33db'), self.km / 60 + 2, places=3)
+
+        self.lane.average_speed_kmh = 80
+        self.lane.save()
+        self.assertEqual(build_lane_matrix(), ('incremental', 1))
+        # The mapping a process already holds sees the new cells
+        self.assertAlmostEqual(matrix.transit(self.company.pk, 'u173z', 'u33db'), self.km / 80 + 2, places=3)
+
+        self.lane.is_active = False
+        self.lane.save()
+        self.assertEqual(build_lane_matrix(), ('incremental', 1))
+        self.assertIsNone(matrix.transit(self.company.pk, 'u173z', 'u33db'))
+
+    def test_new_location_needs_a_full_build(self):
+        build_lane_matrix()
+        paris = Location.objects.create(code='u09tv', kind=Location.Kind.GEOHASH)
+        CarrierLane.objects.create(freight_company=self.company, origin=self.ber, destination=paris)
+        self.assertEqual(build_lane_matrix(), ('full', 2))
+
+    def test_invalid_geohash_is_rejected(self):
+        # 'a' is not in the geohash alphabet
+        with self.assertRaises(ValidationError) as caught:
+            Location(code='u33da', kind=Location.Kind.GEOHASH).full_clean()
+        self.assertIn('code', caught.exception.message_dict)
+        Location(code='u33dc', kind=Location.Kind.GEOHASH).full_clean()
+        Location(code='NL3011AB').full_clean()
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'rates'
+
+urlpatterns = [
+    path('<int:customer_id>/quote/', views.quote, name='quote'),
+]
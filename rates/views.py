@@ -0,0 +1,94 @@
+import math
+from itertools import islice
+
+import numpy as np
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from core.identity import cached_get_or_404
+from end_customers.models import EndCustomer
+from end_customers.views import customer_admin_required
+from major_clients.models import FreightCompany, FreightCompanyCustomer
+from shipments.views import request_records
+from .engine import get_compiled, quote_matrix
+from .lanes import lane_matrix
+
+MAX_QUOTE_ROWS = 10000
+MAX_ERRORS = 50
+
+
+def _accessorials(value):
+    # A JSON list, or "LIFTGATE;RESIDENTIAL" from a CSV cell
+    if isinstance(value, str):
+        value = value.split(';')
+    if not isinstance(value, (list, tuple)):
+        return frozenset()
+    return frozenset(str(code).strip().upper() for code in value if str(code).strip())
+
+
+@login_required
+@customer_admin_required
+@require_POST
+def quote(request, customer_id):
+    """Price a batch of shipments with every carrier the customer works with."""
+    customer = cached_get_or_404(request, EndCustomer, customer_id)
+    try:
+        records = list(islice(request_records(request), MAX_QUOTE_ROWS + 1))
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if len(records) > MAX_QUOTE_ROWS:
+        return JsonResponse({'error': f'quote at most {MAX_QUOTE_ROWS} shipments per request'}, status=400)
+
+    rows, origins, destinations, weights, accessorials, errors = [], [], [], [], [], []
+    for i, record in enumerate(records, start=1):
+        origin = str(record.get('origin') or '').strip().upper()
+        destination = str(record.get('destination') or '').strip().upper()
+        try:
+            weight = float(record.get('weight_kg'))
+        except (TypeError, ValueError):
+            weight = math.nan
+        if not origin or not destination or not math.isfinite(weight) or weight <= 0:
+            if len(errors) < MAX_ERRORS:
+                errors.append({'row': i, 'error': 'origin, destination and a positive weight_kg are required'})
+            continue
+        rows.append(i)
+        origins.append(origin)
+        destinations.append(destination)
+        weights.append(weight)
+        accessorials.append(_accessorials(record.get('accessorials')))
+
+    company_ids = list(FreightCompanyCustomer.objects.filter(
+        end_customer=customer,
+        status=FreightCompanyCustomer.Status.ACTIVE
+    ).order_by('freight_company_id').values_list('freight_company_id', flat=True))
+    names = dict(FreightCompany.objects.filter(pk__in=company_ids).values_list('pk', 'name'))
+    cards = get_compiled(company_ids)
+    prices = quote_matrix(origins, destinations, weights, accessorials, cards)
+
+    # Amounts in different currencies cannot be ranked against each other
+    currencies = {card.currency for card in cards if card.currency}
+    cheapest = [None] * len(rows)
+    if len(currencies) == 1:
+        priced = ~np.isnan(prices).all(axis=1)
+        best = np.nanargmin(np.where(priced[:, None], prices, 0), axis=1)
+        cheapest = [company_ids[j] if ok else None for j, ok in zip(best.tolist(), priced.tolist())]
+
+    rounded = np.round(prices, 2)
+    transit = np.round(lane_matrix.transit_matrix(company_ids, origins, destinations), 1)
+    return JsonResponse({
+        'carriers': [
+            {'id': card.company_id, 'name': names.get(card.company_id), 'currency': card.currency}
+            for card in cards
+        ],
+        'quotes': [
+            {
+                'row': row,
+                'prices': [None if math.isnan(p) else p for p in line],
+                'transit_hours': [None if math.isnan(h) else h for h in hours],
+                'cheapest': best_id,
+            }
+            for row, line, hours, best_id in zip(rows, rounded.tolist(), transit.tolist(), cheapest)
+        ],
+        'errors': errors,
+    })
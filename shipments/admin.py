@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import Shipment
+
+@admin.register(Shipment)
+class ShipmentAdmin(admin.ModelAdmin):
+    list_display = ('reference', 'freight_company', 'end_customer', 'status', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('reference',)
+    raw_id_fields = ('freight_company', 'end_customer')
+    list_select_related = ('freight_company', 'end_customer')
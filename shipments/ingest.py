@@ -0,0 +1,194 @@
+from collections import Counter
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+
+from core.importing import chunked
+from core.models import DataScope
+from major_clients.models import FreightCompanyCustomer
+from .models import Shipment
+
+BATCH_SIZE = 1000
+
+# Only the first few problems are reported back; the counts cover the rest
+MAX_ERRORS = 50
+
+UPDATE_FIELDS = [
+    'end_customer', 'status', 'origin', 'destination', 'weight_kg',
+    'pickup_date', 'delivery_date', 'updated_at',
+]
+
+STATUSES = {value for value, _ in Shipment.Status.choices}
+
+
+class RowError(ValueError):
+    pass
+
+
+def _text(record, field, max_length):
+    value = str(record.get(field) or '').strip()
+    if len(value) > max_length:
+        raise RowError(f'{field} is longer than {max_length} characters')
+    return value
+
+
+def _date(record, field):
+    value = str(record.get(field) or '').strip()
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise RowError(f'{field} must be an ISO date')
+
+
+def _weight(record):
+    value = str(record.get('weight_kg') or '').strip()
+    if not value:
+        return None
+    try:
+        weight = Decimal(value)
+    except InvalidOperation:
+        raise RowError('weight_kg must be a number')
+    if not weight.is_finite() or weight < 0 or weight >= 10 ** 8:
+        raise RowError('weight_kg is out of range')
+    return weight.quantize(Decimal('0.01'))
+
+
+class ShipmentIngester:
+    """Upserts a carrier's shipments from records, one batch at a time.
+
+    Each record needs a ``reference``; ``customer_id``, ``status``,
+    ``origin``, ``destination``, ``weight_kg``, ``pickup_date`` and
+    ``delivery_date`` are optional. A batch is validated without touching
+    the database, written with one ``INSERT ... ON CONFLICT DO UPDATE`` on
+    (freight_company, reference), and its DataScope rows are created or
+    corrected in bulk, all inside one transaction.
+    """
+
+    def __init__(self, freight_company, batch_size=BATCH_SIZE):
+        self.freight_company = freight_company
+        self.batch_size = batch_size
+        self.stats = Counter()
+        self.errors = []
+
+    def run(self, records):
+        for number, batch in enumerate(chunked(records, self.batch_size)):
+            shipments = self.validate(batch, number * self.batch_size)
+            if shipments:
+                with transaction.atomic():
+                    self.write(shipments)
+        return self.stats
+
+    def error(self, row, message):
+        self.stats['invalid'] += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'row': row, 'error': message})
+
+    def validate(self, batch, offset):
+        built = []
+        for i, record in enumerate(batch, start=offset + 1):
+            try:
+                built.append((i, self.build(record)))
+            except RowError as e:
+                built.append((i, e))
+
+        # The graph falls back to a query per row when it is cold, so the
+        # batch's customers are checked together
+        customer_ids = {
+            shipment.end_customer_id for _, shipment in built
+            if isinstance(shipment, Shipment) and shipment.end_customer_id is not None
+        }
+        linked = set(FreightCompanyCustomer.objects.filter(
+            freight_company=self.freight_company,
+            end_customer_id__in=customer_ids,
+            status=FreightCompanyCustomer.Status.ACTIVE
+        ).values_list('end_customer_id', flat=True)) if customer_ids else set()
+
+        shipments = {}
+        for i, shipment in built:
+            if isinstance(shipment, RowError):
+                self.error(i, str(shipment))
+                continue
+            if shipment.end_customer_id is not None and shipment.end_customer_id not in linked:
+                self.error(i, f'customer {shipment.end_customer_id} is not a customer of this company')
+                continue
+            if shipment.reference in shipments:
+                # The last copy wins, as it would have if sent separately
+                self.stats['duplicate'] += 1
+            shipments[shipment.reference] = shipment
+        return list(shipments.values())
+
+    def build(self, record):
+        reference = _text(record, 'reference', 64)
+        if not reference:
+            raise RowError('reference is required')
+        status = _text(record, 'status', 20).upper() or Shipment.Status.CREATED
+        if status not in STATUSES:
+            raise RowError(f'unknown status {status!r}')
+
+        customer_id = str(record.get('customer_id') or '').strip() or None
+        if customer_id is not None:
+            try:
+                customer_id = int(customer_id)
+            except ValueError:
+                raise RowError(f'customer {customer_id} is not a customer of this company')
+
+        return Shipment(
+            freight_company=self.freight_company,
+            end_customer_id=customer_id,
+            reference=reference,
+            status=status,
+            origin=_text(record, 'origin', 200),
+            destination=_text(record, 'destination', 200),
+            weight_kg=_weight(record),
+            pickup_date=_date(record, 'pickup_date'),
+            delivery_date=_date(record, 'delivery_date'),
+        )
+
+    def write(self, shipments):
+        # bulk_create skips auto_now, so stamp both sides of the upsert here
+        now = timezone.now()
+        for shipment in shipments:
+            shipment.created_at = shipment.updated_at = now
+
+        Shipment.objects.bulk_create(
+            shipments,
+            update_conflicts=True,
+            unique_fields=['freight_company', 'reference'],
+            update_fields=UPDATE_FIELDS,
+        )
+        self.write_scopes(shipments)
+        self.stats['rows'] += len(shipments)
+
+    def write_scopes(self, shipments):
+        # ScopedModel.save writes one DataScope row per save; here the batch
+        # needs one read and at most one insert and one update
+        content_type = ContentType.objects.get_for_model(Shipment)
+        existing = {
+            scope.object_id: scope
+            for scope in DataScope.objects.filter(
+                content_type=content_type,
+                object_id__in=[shipment.pk for shipment in shipments]
+            ).only('id', 'object_id', 'freight_company_id', 'end_customer_id')
+        }
+        created, changed = [], []
+        for shipment in shipments:
+            scope = existing.get(shipment.pk)
+            if scope is None:
+                created.append(DataScope(
+                    content_type=content_type,
+                    object_id=shipment.pk,
+                    freight_company_id=shipment.freight_company_id,
+                    end_customer_id=shipment.end_customer_id
+                ))
+            elif scope.end_customer_id != shipment.end_customer_id:
+                scope.end_customer_id = shipment.end_customer_id
+                changed.append(scope)
+        DataScope.objects.bulk_create(created)
+        DataScope.objects.bulk_update(changed, ['end_customer'])
+        self.stats['created'] += len(created)
+        self.stats['updated'] += len(shipments) - len(created)
@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import EndCustomer, FreightCompany
+from major_clients.models import FreightCompanyCustomer
+from shipments.ingest import ShipmentIngester
+from superadmin.models import SaaSProvider
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measures shipment ingestion throughput (rows/s) at several batch sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000, 10000])
+        parser.add_argument('--rows', type=int, default=20000)
+        parser.add_argument('--customers', type=int, default=50)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{connection.vendor}, {options["rows"]} rows per run')
+        self.stdout.write(f"{'batch':>8} {'insert rows/s':>14} {'upsert rows/s':>14}")
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    row = self.run_size(size, options['rows'], options['customers'])
+                    raise Rollback
+            except Rollback:
+                pass
+            self.stdout.write(f'{size:>8} {row[0]:>14,.0f} {row[1]:>14,.0f}')
+
+    def run_size(self, size, rows, customers):
+        provider = SaaSProvider.objects.create(
+            name='Benchmark Provider',
+            contact_email=f'bench-{time.time_ns()}@example.com'
+        )
+        company = FreightCompany.objects.create(name='Benchmark Carrier', saas_provider=provider)
+        customer_ids = [c.id for c in EndCustomer.objects.bulk_create(
+            [EndCustomer(name=f'Benchmark Customer {i}') for i in range(customers)]
+        )]
+        FreightCompanyCustomer.objects.bulk_create(
+            [FreightCompanyCustomer(freight_company=company, end_customer_id=c) for c in customer_ids]
+        )
+
+        records = [
+            {
+                'reference': f'BENCH-{i}',
+                'customer_id': str(customer_ids[i % customers]),
+                'status': 'IN_TRANSIT',
+                'origin': 'Rotterdam',
+                'destination': 'Hamburg',
+                'weight_kg': '1250.50',
+                'pickup_date': '2026-01-15',
+            }
+            for i in range(rows)
+        ]
+        # The first pass inserts every row, the second updates every row
+        return self.time_run(company, size, records), self.time_run(company, size, records)
+
+    def time_run(self, company, size, records):
+        ingester = ShipmentIngester(company, batch_size=size)
+        start = time.perf_counter()
+        ingester.run(iter(records))
+        return len(records) / (time.perf_counter() - start)
@@ -0,0 +1,63 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.importing import chunked
+from core.models import FreightCompany
+from shipments.models import Shipment, TrackingEvent
+from shipments.tracking import write_events
+from superadmin.models import SaaSProvider
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measures how many tracking events/s the batched writer stores at several flush sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[500, 1000, 5000])
+        parser.add_argument('--events', type=int, default=50000)
+        parser.add_argument('--shipments', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{connection.vendor}, {options["events"]} events per run')
+        self.stdout.write(f"{'flush':>8} {'events/s':>10}")
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    rate = self.run_size(size, options['events'], options['shipments'])
+                    raise Rollback
+            except Rollback:
+                pass
+            self.stdout.write(f'{size:>8} {rate:>10,.0f}')
+
+    def run_size(self, size, events, shipment_count):
+        provider = SaaSProvider.objects.create(
+            name='Benchmark Provider',
+            contact_email=f'bench-{time.time_ns()}@example.com'
+        )
+        company = FreightCompany.objects.create(name='Benchmark Carrier', saas_provider=provider)
+        shipments = Shipment.objects.bulk_create(
+            [Shipment(freight_company=company, reference=f'BENCH-{i}') for i in range(shipment_count)]
+        )
+
+        rng = random.Random(size)
+        now = timezone.now()
+        rows = [
+            (
+                shipments[i % shipment_count].id, company.id, None, TrackingEvent.Kind.POSITION, '',
+                rng.uniform(-90, 90), rng.uniform(-180, 180), now - timedelta(seconds=events - i), now,
+            )
+            for i in range(events)
+        ]
+
+        start = time.perf_counter()
+        for batch in chunked(rows, size):
+            write_events(batch)
+        return events / (time.perf_counter() - start)
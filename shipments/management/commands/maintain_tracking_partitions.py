@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shipments.models import TrackingEvent
+from shipments.partitions import drop_partitions_before, ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = 'Creates upcoming daily tracking-event partitions and drops the ones past retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.TRACKING_RETENTION_DAYS,
+                            help='Days of events to keep')
+        parser.add_argument('--ahead', type=int, default=3, help='Days of partitions to create in advance')
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        cutoff = today - timedelta(days=options['days'])
+
+        if not is_partitioned():
+            # No partitions to drop, so fall back to deleting the rows
+            deleted, _ = TrackingEvent._base_manager.filter(recorded_at__date__lt=cutoff).delete()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} events recorded before {cutoff}.'))
+            return
+
+        # The writer creates partitions on demand too; this keeps that DDL
+        # off the ingestion path
+        ensure_partitions(today + timedelta(days=i) for i in range(options['ahead'] + 1))
+        dropped = drop_partitions_before(cutoff)
+        for name in dropped:
+            self.stdout.write(f'Dropped {name}')
+        self.stdout.write(self.style.SUCCESS(f'Dropped {len(dropped)} partitions before {cutoff}.'))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('end_customers', '0006_remove_endcustomer_freight_companies'),
+        ('major_clients', '0005_freightcompany_end_customers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Shipment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('CREATED', 'Created'), ('IN_TRANSIT', 'In Transit'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')], default='CREATED', max_length=20)),
+                ('origin', models.CharField(blank=True, max_length=200)),
+                ('destination', models.CharField(blank=True, max_length=200)),
+                ('weight_kg', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('pickup_date', models.DateField(blank=True, null=True)),
+                ('delivery_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('end_customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shipments', to='end_customers.endcustomer')),
+                ('freight_company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shipments', to='major_clients.freightcompany')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('freight_company', 'reference'), name='shipment_company_reference_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def partition_table(apps, schema_editor):
+    # Django cannot declare a partitioned table, so on PostgreSQL the table
+    # CreateModel made is swapped for one partitioned by day on recorded_at.
+    # The primary key has to include the partition key.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    model = apps.get_model('shipments', 'TrackingEvent')
+    table = model._meta.db_table
+    schema_editor.execute(
+        f'CREATE TABLE {table}_new (LIKE {table} INCLUDING DEFAULTS INCLUDING IDENTITY) '
+        f'PARTITION BY RANGE (recorded_at)'
+    )
+    # Also discards the deferred index and foreign key SQL for the old table
+    schema_editor.delete_model(model)
+    schema_editor.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    schema_editor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, recorded_at)')
+    for field in model._meta.local_fields:
+        if field.remote_field and field.db_constraint:
+            target = field.target_field
+            schema_editor.execute(
+                f'ALTER TABLE {table} ADD CONSTRAINT {table}_{field.column}_fk '
+                f'FOREIGN KEY ({field.column}) REFERENCES {target.model._meta.db_table} ({target.column}) '
+                f'DEFERRABLE INITIALLY DEFERRED'
+            )
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('end_customers', '0006_remove_endcustomer_freight_companies'),
+        ('major_clients', '0005_freightcompany_end_customers'),
+        ('shipments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('POSITION', 'Position'), ('STATUS', 'Status')], default='POSITION', max_length=10)),
+                ('status', models.CharField(blank=True, choices=[('CREATED', 'Created'), ('IN_TRANSIT', 'In Transit'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('recorded_at', models.DateTimeField()),
+                ('received_at', models.DateTimeField()),
+                ('end_customer', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='end_customers.endcustomer')),
+                ('freight_company', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='major_clients.freightcompany')),
+                ('shipment', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='tracking_events', to='shipments.shipment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['shipment', '-recorded_at'], name='trackingevent_shipment_idx')],
+            },
+        ),
+        migrations.RunPython(partition_table, migrations.RunPython.noop),
+    ]
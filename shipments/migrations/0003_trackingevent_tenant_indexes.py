@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0002_trackingevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trackingevent',
+            index=models.Index(fields=['freight_company', '-recorded_at'], name='trackingevent_company_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trackingevent',
+            index=models.Index(condition=models.Q(('end_customer__isnull', False)), fields=['end_customer', '-recorded_at'], name='trackingevent_customer_idx'),
+        ),
+    ]
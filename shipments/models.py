@@ -0,0 +1,87 @@
+from django.db import models
+
+from core.models import ScopedModel, TenantScopedModel
+from end_customers.models import EndCustomer
+from major_clients.models import FreightCompany
+
+
+class Shipment(ScopedModel):
+    class Status(models.TextChoices):
+        CREATED = 'CREATED', 'Created'
+        IN_TRANSIT = 'IN_TRANSIT', 'In Transit'
+        DELIVERED = 'DELIVERED', 'Delivered'
+        CANCELLED = 'CANCELLED', 'Cancelled'
+
+    freight_company = models.ForeignKey(
+        FreightCompany,
+        on_delete=models.CASCADE,
+        related_name='shipments'
+    )
+    end_customer = models.ForeignKey(
+        EndCustomer,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='shipments'
+    )
+    # The carrier's own id for the shipment; re-sending it updates the row
+    reference = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.CREATED)
+    origin = models.CharField(max_length=200, blank=True)
+    destination = models.CharField(max_length=200, blank=True)
+    weight_kg = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    pickup_date = models.DateField(null=True, blank=True)
+    delivery_date = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.reference
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['freight_company', 'reference'], name='shipment_company_reference_uniq'),
+        ]
+
+
+class TrackingEvent(TenantScopedModel):
+    """A GPS or status ping for a shipment.
+
+    Rows are only ever appended. On PostgreSQL the table is partitioned by
+    day on ``recorded_at`` (see ``shipments.partitions``), and retention
+    drops whole partitions instead of deleting rows.
+    """
+    class Kind(models.TextChoices):
+        POSITION = 'POSITION', 'Position'
+        STATUS = 'STATUS', 'Status'
+
+    # Unconstrained: events outlive their shipment until retention drops
+    # them, and deleting a shipment must not scan every partition
+    shipment = models.ForeignKey(
+        Shipment,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='tracking_events'
+    )
+    kind = models.CharField(max_length=10, choices=Kind.choices, default=Kind.POSITION)
+    status = models.CharField(max_length=20, choices=Shipment.Status.choices, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # When the device took the reading, which is what partitions the table
+    recorded_at = models.DateTimeField()
+    received_at = models.DateTimeField()
+
+    class Meta:
+        # Each index is paid for on every one of the inserts, so the tenant
+        # indexes are the ones scoped reads and the tenant keys' cascading
+        # deletes need: by time rather than id, so a tenant's recent events
+        # come from the newest partitions. Most events carry no customer.
+        indexes = [
+            models.Index(fields=['shipment', '-recorded_at'], name='trackingevent_shipment_idx'),
+            models.Index(fields=['freight_company', '-recorded_at'], name='trackingevent_company_idx'),
+            models.Index(
+                fields=['end_customer', '-recorded_at'], name='trackingevent_customer_idx',
+                condition=models.Q(end_customer__isnull=False)
+            ),
+        ]
@@ -0,0 +1,84 @@
+from datetime import datetime, time, timedelta, timezone
+
+from django.db import connection, transaction
+
+from .models import TrackingEvent
+
+TABLE = TrackingEvent._meta.db_table
+
+# Days this process has already created or found, so a flush normally
+# issues no DDL at all
+_ensured = set()
+
+
+def is_partitioned():
+    return connection.vendor == 'postgresql'
+
+
+def partition_name(day):
+    return f'{TABLE}_p{day:%Y%m%d}'
+
+
+def ensure_partitions(days):
+    """Create the daily partitions covering ``days`` if they do not exist.
+
+    Bounds are UTC midnights, so a partition always holds 24 hours whatever
+    the session time zone.
+    """
+    if not is_partitioned():
+        return
+    missing = set(days) - _ensured
+    if not missing:
+        return
+    with connection.cursor() as cursor:
+        for day in sorted(missing):
+            start = datetime.combine(day, time(), tzinfo=timezone.utc)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF {TABLE} '
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{(start + timedelta(days=1)).isoformat()}')"
+            )
+    # Only remembered once committed; a rolled back CREATE leaves no partition
+    transaction.on_commit(lambda: _ensured.update(missing))
+
+
+def list_partitions():
+    """Return ``{day: (partition name, detach pending)}`` for the daily partitions."""
+    if not is_partitioned():
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, i.inhdetachpending FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass',
+            [TABLE]
+        )
+        rows = cursor.fetchall()
+    prefix = f'{TABLE}_p'
+    partitions = {}
+    for name, pending in rows:
+        try:
+            day = datetime.strptime(name[len(prefix):], '%Y%m%d').date()
+        except ValueError:
+            continue
+        partitions[day] = name, pending
+    return partitions
+
+
+def drop_partitions_before(day):
+    """Drop every daily partition that ends on or before ``day``.
+
+    Each partition is detached concurrently first, so writers and readers of
+    the parent table are never blocked behind the drop. That cannot run in a
+    transaction, so call this in autocommit mode.
+    """
+    dropped = []
+    with connection.cursor() as cursor:
+        for partition_day, (name, pending) in sorted(list_partitions().items()):
+            if partition_day >= day:
+                continue
+            # An interrupted concurrent detach has to be finished, not restarted
+            mode = 'FINALIZE' if pending else 'CONCURRENTLY'
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name} {mode}')
+            cursor.execute(f'DROP TABLE {name}')
+            _ensured.discard(partition_day)
+            dropped.append(name)
+    return dropped
@@ -0,0 +1,79 @@
+import tempfile
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from end_customers.models import EndCustomer
+from major_clients.models import FreightCompany, FreightCompanyCustomer
+from superadmin.models import SaaSProvider
+from .ingest import ShipmentIngester
+from .models import Shipment, TrackingEvent
+from .tracking import COLUMNS, latest_position, write_events
+
+
+class ShipmentIngesterTests(TestCase):
+    def setUp(self):
+        provider = SaaSProvider.objects.create(name='Provider', contact_email='provider@example.com')
+        self.company = FreightCompany.objects.create(name='Carrier', saas_provider=provider)
+        self.customers = EndCustomer.objects.bulk_create([EndCustomer(name=f'C{i}') for i in range(20)])
+        FreightCompanyCustomer.objects.bulk_create([
+            FreightCompanyCustomer(freight_company=self.company, end_customer=customer)
+            for customer in self.customers[:10]
+        ])
+
+    def test_customers_are_checked_once_per_batch(self):
+        records = [
+            {'reference': f'R{i}', 'customer_id': str(customer.pk)}
+            for i, customer in enumerate(self.customers)
+        ]
+        records.insert(3, {'reference': 'BAD', 'customer_id': 'x'})
+        ingester = ShipmentIngester(self.company, batch_size=7)
+        with CaptureQueriesContext(connection) as ctx:
+            stats = ingester.run(iter(records))
+
+        link_queries = [query for query in ctx.captured_queries if 'freightcompanycustomer' in query['sql']]
+        self.assertEqual(len(link_queries), 3)
+
+        self.assertEqual(stats['rows'], 10)
+        self.assertEqual(stats['invalid'], 11)
+        self.assertEqual([error['row'] for error in ingester.errors], [4] + list(range(12, 22)))
+        self.assertEqual(
+            set(Shipment.objects.values_list('end_customer_id', flat=True)),
+            {customer.pk for customer in self.customers[:10]}
+        )
+
+
+class LatestPositionTests(TestCase):
+    def setUp(self):
+        provider = SaaSProvider.objects.create(name='Provider', contact_email='provider@example.com')
+        self.company = FreightCompany.objects.create(name='Carrier', saas_provider=provider)
+        self.shipment = Shipment.objects.create(freight_company=self.company, reference='R1')
+        self.now = timezone.now()
+
+    def row(self, latitude, minutes_ago):
+        recorded_at = self.now - timedelta(minutes=minutes_ago)
+        return (
+            self.shipment.pk, self.company.pk, None, TrackingEvent.Kind.POSITION, '',
+            latitude, 4.0, recorded_at, self.now,
+        )
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_reads_the_database(self):
+        write_events([self.row(51.0, 10)])
+        self.assertEqual(latest_position(self.shipment.pk)['latitude'], 51.0)
+        # Flushed by another worker, whose cache update never reaches this one
+        TrackingEvent._base_manager.create(**dict(zip(COLUMNS, self.row(52.0, 5))))
+        self.assertEqual(latest_position(self.shipment.pk)['latitude'], 52.0)
+
+    def test_shared_cache_keeps_the_newest_position(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory,
+        }}):
+            write_events([self.row(51.0, 10)])
+            # A late event from a device that was offline
+            write_events([self.row(50.0, 20)])
+            with self.assertNumQueries(0):
+                self.assertEqual(latest_position(self.shipment.pk)['latitude'], 51.0)
@@ -0,0 +1,215 @@
+import atexit
+import io
+import logging
+import os
+import threading
+from datetime import timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from core.importing import chunked
+from core.versioning import versions_are_shared
+from .models import TrackingEvent
+from .partitions import ensure_partitions, is_partitioned
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT or COPY
+FLUSH_SIZE = 5000
+
+# The flusher wakes early once this many events are waiting
+WAKE_SIZE = 1000
+
+LATEST_TIMEOUT = 60 * 60 * 24
+
+# Order of the tuples handed to TrackingWriter.submit
+COLUMNS = (
+    'shipment_id', 'freight_company_id', 'end_customer_id', 'kind', 'status',
+    'latitude', 'longitude', 'recorded_at', 'received_at',
+)
+KIND, LATITUDE, LONGITUDE, RECORDED_AT = (
+    COLUMNS.index(name) for name in ('kind', 'latitude', 'longitude', 'recorded_at')
+)
+
+
+def latest_key(shipment_id):
+    return f'shipments:tracking:latest:{shipment_id}'
+
+
+def _utc(value):
+    return value.astimezone(timezone.utc).isoformat()
+
+
+def _position(row):
+    return {
+        'latitude': row[LATITUDE],
+        'longitude': row[LONGITUDE],
+        # Always UTC, so cached timestamps compare correctly as strings
+        'recorded_at': _utc(row[RECORDED_AT]),
+    }
+
+
+def _query_position(shipment_id):
+    row = TrackingEvent._base_manager.filter(
+        shipment_id=shipment_id,
+        kind=TrackingEvent.Kind.POSITION
+    ).order_by('-recorded_at').values_list(*COLUMNS).first()
+    return None if row is None else _position(row)
+
+
+def latest_position(shipment_id):
+    """Return the newest known position of a shipment, or None.
+
+    Only the process that flushes a batch moves the cached positions
+    forward, so with a cache local to each process every read goes to the
+    database instead.
+    """
+    if not versions_are_shared():
+        return _query_position(shipment_id)
+    key = latest_key(shipment_id)
+    position = cache.get(key)
+    if position is None:
+        position = _query_position(shipment_id)
+        if position is None:
+            return None
+        # add, not set: a flush that landed meanwhile has the newer position
+        cache.add(key, position, LATEST_TIMEOUT)
+    return position
+
+
+def update_latest(rows):
+    """Move the cached latest positions forward for a written batch."""
+    if not versions_are_shared():
+        return
+    newest = {}
+    for row in rows:
+        if row[KIND] != TrackingEvent.Kind.POSITION:
+            continue
+        shipment_id = row[0]
+        if shipment_id not in newest or row[RECORDED_AT] > newest[shipment_id][RECORDED_AT]:
+            newest[shipment_id] = row
+    if not newest:
+        return
+
+    keys = {latest_key(shipment_id): row for shipment_id, row in newest.items()}
+    cached = cache.get_many(keys)
+    # Devices buffer while offline, so a late event must not move a shipment back
+    cache.set_many({
+        key: _position(row)
+        for key, row in keys.items()
+        if key not in cached or cached[key]['recorded_at'] < _utc(row[RECORDED_AT])
+    }, LATEST_TIMEOUT)
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if hasattr(value, 'astimezone'):
+        return _utc(value)
+    # Kinds and statuses are validated choices, so nothing needs escaping
+    return str(value)
+
+
+def write_events(rows):
+    """Write a batch of event tuples: COPY on PostgreSQL, bulk INSERT elsewhere."""
+    ensure_partitions(row[RECORDED_AT].astimezone(timezone.utc).date() for row in rows)
+    if is_partitioned():
+        data = io.StringIO()
+        for row in rows:
+            data.write('\t'.join(_copy_value(value) for value in row))
+            data.write('\n')
+        data.seek(0)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {TrackingEvent._meta.db_table} ({", ".join(COLUMNS)}) FROM STDIN', data
+            )
+    else:
+        TrackingEvent._base_manager.bulk_create(
+            [TrackingEvent(**dict(zip(COLUMNS, row))) for row in rows]
+        )
+    update_latest(rows)
+
+
+class TrackingWriter:
+    """Buffers tracking events in memory and writes them from one thread.
+
+    ``submit`` only appends to a list, so a request never waits on the
+    database. A daemon thread flushes the buffer every
+    ``TRACKING_FLUSH_INTERVAL`` seconds, or sooner once it fills up. Events
+    still buffered when the process is killed are lost; a clean exit flushes
+    them first.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._buffer = []
+        self._thread = None
+        self._pid = None
+
+    def submit(self, rows):
+        """Queue event tuples ordered as ``COLUMNS``; False if the buffer is full."""
+        with self._lock:
+            if len(self._buffer) + len(rows) > settings.TRACKING_BUFFER_LIMIT:
+                return False
+            self._buffer.extend(rows)
+            pending = len(self._buffer)
+            self._start()
+        if pending >= WAKE_SIZE:
+            self._wake.set()
+        return True
+
+    def _start(self):
+        # A thread started before a fork does not exist in the child
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='tracking-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(settings.TRACKING_FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing tracking events failed')
+                # Reconnect on the next flush instead of reusing a broken connection
+                connection.close()
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        for i, batch in enumerate(chunked(rows, FLUSH_SIZE)):
+            try:
+                write_events(batch)
+            except Exception:
+                # Put the unwritten events back, oldest first, as far as they fit
+                self._requeue(rows[i * FLUSH_SIZE:])
+                raise
+        return len(rows)
+
+    def _requeue(self, rows):
+        with self._lock:
+            room = max(settings.TRACKING_BUFFER_LIMIT - len(self._buffer), 0)
+            if len(rows) > room:
+                logger.error('Dropped %d tracking events, the buffer is full', len(rows) - room)
+            self._buffer[:0] = rows[:room]
+
+    def pending(self):
+        return len(self._buffer)
+
+
+writer = TrackingWriter()
+
+
+@atexit.register
+def _flush_on_exit():
+    if writer.pending():
+        try:
+            writer.flush()
+        except Exception:
+            logger.exception('Flushing tracking events at exit failed')
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = 'shipments'
+
+urlpatterns = [
+    path('<int:company_id>/ingest/', views.ingest, name='ingest'),
+    path('<int:company_id>/track/', views.track, name='track'),
+    path('<int:company_id>/<int:shipment_id>/position/', views.position, name='position'),
+]
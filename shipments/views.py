@@ -0,0 +1,169 @@
+import json
+import math
+from datetime import timedelta, timezone as dt_timezone
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET, require_POST
+
+from core.identity import cached_get_or_404
+from core.importing import detect_format, iter_records
+from major_clients.models import FreightCompany
+from major_clients.views import freight_admin_required
+from .ingest import BATCH_SIZE, MAX_ERRORS, RowError, ShipmentIngester
+from .models import Shipment, TrackingEvent
+from .tracking import latest_position, writer
+
+MAX_BATCH_SIZE = 10000
+
+# Events accepted in one tracking request
+MAX_EVENTS = 5000
+
+# Device clocks drift; readings further ahead than this are rejected
+MAX_CLOCK_SKEW = timedelta(minutes=10)
+
+EVENT_KINDS = {value for value, _ in TrackingEvent.Kind.choices}
+STATUSES = {value for value, _ in Shipment.Status.choices}
+
+
+def request_records(request):
+    """Yield records from an uploaded file, a JSON array body, or a CSV/JSONL body."""
+    upload = request.FILES.get('file')
+    if upload is not None:
+        return iter_records(upload, request.POST.get('format') or detect_format(upload.name))
+
+    content_type = request.content_type
+    if content_type == 'application/json':
+        records = json.loads(request.body)
+        if not isinstance(records, list):
+            raise ValueError('expected a JSON array of shipments')
+        return (record if isinstance(record, dict) else {} for record in records)
+    # Streamed from the request body, so large pushes are read in constant memory
+    return iter_records(request, 'csv' if content_type == 'text/csv' else 'jsonl')
+
+
+@login_required
+@freight_admin_required
+@require_POST
+def ingest(request, company_id):
+    company = cached_get_or_404(request, FreightCompany, company_id)
+    try:
+        batch_size = min(int(request.GET.get('batch_size', BATCH_SIZE)), MAX_BATCH_SIZE)
+    except ValueError:
+        batch_size = BATCH_SIZE
+
+    ingester = ShipmentIngester(company, batch_size=max(batch_size, 1))
+    try:
+        stats = ingester.run(request_records(request))
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'stats': stats, 'errors': ingester.errors})
+
+
+def _coordinate(record, field, limit):
+    value = record.get(field)
+    if value in (None, ''):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{field} must be a number')
+    if not math.isfinite(value) or abs(value) > limit:
+        raise RowError(f'{field} is out of range')
+    return value
+
+
+def _recorded_at(record, now):
+    value = record.get('recorded_at')
+    if not value:
+        return now
+    try:
+        recorded_at = parse_datetime(str(value))
+    except ValueError:
+        recorded_at = None
+    if recorded_at is None:
+        raise RowError('recorded_at must be an ISO datetime')
+    if timezone.is_naive(recorded_at):
+        recorded_at = timezone.make_aware(recorded_at, dt_timezone.utc)
+    # Each day past the bounds would otherwise create its own partition
+    if recorded_at > now + MAX_CLOCK_SKEW:
+        raise RowError('recorded_at is in the future')
+    if recorded_at < now - timedelta(days=settings.TRACKING_RETENTION_DAYS):
+        raise RowError('recorded_at is older than the retention period')
+    return recorded_at
+
+
+def tracking_row(record, shipment, now):
+    """Validate one tracking record into a row for ``TrackingWriter.submit``."""
+    kind = str(record.get('kind') or TrackingEvent.Kind.POSITION).upper()
+    if kind not in EVENT_KINDS:
+        raise RowError(f'unknown kind {kind!r}')
+    status = str(record.get('status') or '').upper()
+    if status and status not in STATUSES:
+        raise RowError(f'unknown status {status!r}')
+    latitude = _coordinate(record, 'latitude', 90)
+    longitude = _coordinate(record, 'longitude', 180)
+    if kind == TrackingEvent.Kind.POSITION and (latitude is None or longitude is None):
+        raise RowError('a position needs latitude and longitude')
+    if kind == TrackingEvent.Kind.STATUS and not status:
+        raise RowError('a status event needs a status')
+    return (
+        shipment[0], shipment[1], shipment[2], kind, status,
+        latitude, longitude, _recorded_at(record, now), now,
+    )
+
+
+@login_required
+@freight_admin_required
+@require_POST
+def track(request, company_id):
+    company = cached_get_or_404(request, FreightCompany, company_id)
+    try:
+        records = list(islice(request_records(request), MAX_EVENTS + 1))
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if len(records) > MAX_EVENTS:
+        return JsonResponse({'error': f'send at most {MAX_EVENTS} events per request'}, status=400)
+
+    # One query resolves every shipment the request mentions
+    references = {str(record.get('reference') or '') for record in records}
+    shipments = {
+        reference: (shipment_id, company.id, end_customer_id)
+        for reference, shipment_id, end_customer_id in Shipment._base_manager.filter(
+            freight_company=company, reference__in=references
+        ).values_list('reference', 'id', 'end_customer_id')
+    }
+
+    now = timezone.now()
+    rows, errors, invalid = [], [], 0
+    for i, record in enumerate(records, start=1):
+        try:
+            shipment = shipments.get(str(record.get('reference') or ''))
+            if shipment is None:
+                raise RowError('unknown shipment reference')
+            rows.append(tracking_row(record, shipment, now))
+        except RowError as e:
+            invalid += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append({'row': i, 'error': str(e)})
+
+    if rows and not writer.submit(rows):
+        # Shed load instead of letting the buffer, and memory, grow
+        response = JsonResponse({'error': 'tracking is busy, retry shortly'}, status=503)
+        response['Retry-After'] = '1'
+        return response
+    return JsonResponse({'accepted': len(rows), 'invalid': invalid, 'errors': errors}, status=202)
+
+
+@login_required
+@freight_admin_required
+@require_GET
+def position(request, company_id, shipment_id):
+    company = cached_get_or_404(request, FreightCompany, company_id)
+    if not Shipment._base_manager.filter(pk=shipment_id, freight_company=company).exists():
+        raise Http404('No Shipment matches the given query.')
+    return JsonResponse({'shipment': shipment_id, 'position': latest_position(shipment_id)})
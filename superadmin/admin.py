@@ -1,28 +1,62 @@
 from django.contrib import admin
 from django.contrib.admin import AdminSite
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db.models import Count, Prefetch
 from django.urls import reverse
 from django.utils.html import format_html
-from major_clients.models import FreightCompany
+from major_clients.models import FreightCompany, FreightCompanyCustomer
 from end_customers.models import EndCustomer
 from core.models import UserProfile
+from .paginator import EstimatedCountPaginator
 
-class FreightCompanyAdmin(admin.ModelAdmin):
+class SaasAutocompleteSelect(AutocompleteSelect):
+    def get_url(self):
+        # The site is mounted inside the saas_admin app namespace
+        return reverse('saas_admin:saas_admin:autocomplete')
+
+class SaasAutocompleteMixin:
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.autocomplete_fields:
+            kwargs['widget'] = SaasAutocompleteSelect(db_field, self.admin_site, using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+class SaasModelAdmin(SaasAutocompleteMixin, admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+class FreightCompanyAdmin(SaasModelAdmin):
     list_display = ('name', 'end_customers_count', 'view_end_customers')
     search_fields = ('name',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(customer_count=Count('customer_links'))
+
     def end_customers_count(self, obj):
-        return obj.end_customers.count()
+        return obj.customer_count
     end_customers_count.short_description = 'End Customers'
+    end_customers_count.admin_order_field = 'customer_count'
 
     def view_end_customers(self, obj):
         url = reverse('saas_admin:end_customers_by_company', args=[obj.id])
         return format_html('<a href="{}">View End Customers</a>', url)
     view_end_customers.short_description = 'End Customers'
 
-class EndCustomerAdmin(admin.ModelAdmin):
+class FreightCompanyCustomerInline(SaasAutocompleteMixin, admin.TabularInline):
+    model = FreightCompanyCustomer
+    fields = ('freight_company', 'status', 'created_at')
+    readonly_fields = ('created_at',)
+    autocomplete_fields = ('freight_company',)
+    extra = 0
+
+class EndCustomerAdmin(SaasModelAdmin):
     list_display = ('name', 'freight_companies_list')
     search_fields = ('name',)
-    filter_horizontal = ('freight_companies',)
+    inlines = [FreightCompanyCustomerInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('freight_companies', queryset=FreightCompany.objects.only('id', 'name'))
+        )
 
     def freight_companies_list(self, obj):
         return ", ".join([company.name for company in obj.freight_companies.all()])
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from .models import RowCount
+
+
+def estimated_count(model):
+    """Planner estimate of a table's size from pg_class, or None elsewhere."""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 until the table has been analyzed
+    return row[0] if row and row[0] >= 0 else None
+
+
+def get_counts(*models):
+    """Return ``{model: count}`` from the rollup table in one query."""
+    counts = {}
+    if settings.DASHBOARD_ESTIMATED_COUNTS:
+        for model in models:
+            estimate = estimated_count(model)
+            if estimate is not None:
+                counts[model] = estimate
+
+    missing = [model for model in models if model not in counts]
+    if missing:
+        stored = dict(RowCount.objects.filter(
+            model_label__in=[model._meta.label for model in missing]
+        ).values_list('model_label', 'count'))
+        for model in missing:
+            if model._meta.label in stored:
+                counts[model] = stored[model._meta.label]
+            else:
+                counts[model] = refresh_count(model)
+    return counts
+
+
+def adjust_count(model, delta):
+    updated = RowCount.objects.filter(model_label=model._meta.label).update(count=F('count') + delta)
+    if not updated:
+        refresh_count(model)
+
+
+def refresh_count(model):
+    """Recount a table exactly and store the result, fixing any drift."""
+    count = model._default_manager.count()
+    RowCount.objects.update_or_create(model_label=model._meta.label, defaults={'count': count})
+    return count
@@ -0,0 +1,7 @@
+from django import forms
+from .models import SaaSProvider
+
+class TenantImportForm(forms.Form):
+    saas_provider = forms.ModelChoiceField(queryset=SaaSProvider.objects.all())
+    file = forms.FileField(help_text='CSV or JSONL records with type=company|customer|link.')
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('jsonl', 'JSONL')], initial='csv')
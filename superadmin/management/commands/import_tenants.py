@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importing import detect_format, iter_records
+from superadmin.models import SaaSProvider
+from superadmin.tenant_import import BATCH_SIZE, TenantImporter, read_checkpoint, write_checkpoint
+
+
+class Command(BaseCommand):
+    help = ('Imports freight companies, end customers and links from CSV/JSONL. '
+            'Each record has type=company|customer|link; companies and customers are '
+            'matched on name, links reference company and customer names.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--provider', required=True, help='Contact email of the owning SaaS provider')
+        parser.add_argument('--format', choices=['csv', 'jsonl'])
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--checkpoint', help='File recording progress; rerun with it to resume')
+
+    def handle(self, *args, **options):
+        try:
+            saas_provider = SaaSProvider.objects.get(contact_email=options['provider'])
+        except SaaSProvider.DoesNotExist:
+            raise CommandError(f"No SaaS provider with contact email {options['provider']}.")
+
+        path = options['path']
+        checkpoint = options['checkpoint']
+        skip = read_checkpoint(checkpoint, path) if checkpoint else 0
+        if skip:
+            self.stdout.write(f'Resuming after record {skip}')
+
+        def progress(consumed, rate):
+            if checkpoint:
+                write_checkpoint(checkpoint, path, consumed)
+            self.stdout.write(f'{consumed} records ({rate:,.0f} records/s)')
+
+        importer = TenantImporter(saas_provider, options['batch_size'], progress)
+        with open(path, 'rb') as f:
+            stats = importer.run(iter_records(f, options['format'] or detect_format(path)), skip=skip)
+
+        self.stdout.write(', '.join(f'{key}: {value}' for key, value in sorted(stats.items())))
+        self.stdout.write(self.style.SUCCESS('Import finished.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from end_customers.models import EndCustomer
+from major_clients.models import FreightCompany
+from superadmin.counters import refresh_count
+
+
+class Command(BaseCommand):
+    help = 'Recounts the tables behind the SaaS dashboard totals, fixing drift from bulk writes'
+
+    def handle(self, *args, **options):
+        for model in (FreightCompany, EndCustomer):
+            count = refresh_count(model)
+            self.stdout.write(f'{model._meta.label}: {count}')
@@ -12,3 +12,12 @@ class SaaSProvider(models.Model):
     class Meta:
         verbose_name = "SaaS Provider"
         verbose_name_plural = "SaaS Providers"
+
+class RowCount(models.Model):
+    """Running row count for a large table, kept current by signals."""
+    model_label = models.CharField(max_length=100, unique=True)
+    count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.model_label}: {self.count}"
@@ -0,0 +1,22 @@
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from .counters import get_counts
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that skips ``COUNT(*)`` for unfiltered querysets.
+
+    An unfiltered changelist counts the whole table on every page view; the
+    rollup in :mod:`superadmin.counters` (or the planner estimate, when
+    ``DASHBOARD_ESTIMATED_COUNTS`` is on) already knows that number.
+    Filtered and searched querysets still get an exact count.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where and not query.is_sliced:
+            model = self.object_list.model
+            return get_counts(model)[model]
+        return super().count
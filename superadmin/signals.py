@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from end_customers.models import EndCustomer
+from major_clients.models import FreightCompany
+from .counters import adjust_count
+
+
+@receiver(post_save, sender=FreightCompany)
+@receiver(post_save, sender=EndCustomer)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_count(sender, 1)
+
+
+@receiver(post_delete, sender=FreightCompany)
+@receiver(post_delete, sender=EndCustomer)
+def count_deleted(sender, instance, **kwargs):
+    adjust_count(sender, -1)
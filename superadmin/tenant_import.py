@@ -0,0 +1,189 @@
+import json
+import os
+import time
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Q
+
+from core.graph import invalidate_graph
+from core.importing import chunked
+from core.profiles import invalidate_profile
+from core.scoping import invalidate_company
+from core.stats import COMPANY, CUSTOMER, PROVIDER, adjust_stats, refresh_stats
+from end_customers.models import EndCustomer
+from major_clients.models import FreightCompany, FreightCompanyCustomer
+from .counters import adjust_count
+
+BATCH_SIZE = 5000
+
+TENANT_FIELDS = ('email', 'phone', 'address')
+
+
+class TenantImporter:
+    """Upserts freight companies, end customers and their links from records.
+
+    Each record has a ``type`` of ``company``, ``customer`` or ``link``.
+    Companies and customers are matched on ``name`` and carry optional
+    ``email``, ``phone`` and ``address``; links name a ``company`` and a
+    ``customer``. Names are only matched within the importing provider:
+    its own companies, and customers linked to them or to no one yet. A
+    name that matches more than one of those is ambiguous and its records
+    are rejected rather than guessed at. Records are applied in batches, one transaction per batch,
+    and ``progress`` is called after each commit with the number of records
+    consumed so far, which is what a checkpoint needs to resume.
+    """
+
+    def __init__(self, saas_provider, batch_size=BATCH_SIZE, progress=None):
+        self.saas_provider = saas_provider
+        self.batch_size = batch_size
+        self.progress = progress
+        self.stats = Counter()
+
+    def run(self, records, skip=0):
+        consumed = skip
+        start = time.perf_counter()
+        for batch in chunked(islice(records, skip, None), self.batch_size):
+            with transaction.atomic():
+                self.apply(batch)
+            consumed += len(batch)
+            self.stats['records'] += len(batch)
+            if self.progress:
+                self.progress(consumed, self.stats['records'] / (time.perf_counter() - start))
+        return self.stats
+
+    def apply(self, batch):
+        by_type = {'company': [], 'customer': [], 'link': []}
+        for record in batch:
+            kind = (record.get('type') or '').strip().lower()
+            if kind in by_type:
+                by_type[kind].append(record)
+            else:
+                self.stats['skipped'] += 1
+
+        self.upsert(FreightCompany, self.companies(), by_type['company'], {'saas_provider': self.saas_provider})
+        self.upsert(EndCustomer, self.customers(), by_type['customer'], {})
+        self.link(by_type['link'])
+
+    def companies(self):
+        return FreightCompany.objects.filter(saas_provider=self.saas_provider)
+
+    def customers(self):
+        # Customers another provider's companies serve are theirs to update;
+        # a same-named customer of ours is a different tenant
+        return EndCustomer.objects.filter(
+            Q(freight_companies__saas_provider=self.saas_provider) | Q(freight_companies__isnull=True)
+        ).distinct()
+
+    def match(self, queryset, names):
+        """Return ``{name: obj}`` for names matching exactly one row, and the ambiguous names."""
+        found, ambiguous = {}, set()
+        for obj in queryset.filter(name__in=names):
+            if obj.name in found:
+                ambiguous.add(obj.name)
+            found[obj.name] = obj
+        for name in ambiguous:
+            del found[name]
+        return found, ambiguous
+
+    def upsert(self, model, queryset, records, defaults):
+        rows = {}
+        for record in records:
+            name = (record.get('name') or '').strip()
+            if not name:
+                self.stats['skipped'] += 1
+                continue
+            rows[name] = {field: (record.get(field) or None) for field in TENANT_FIELDS}
+        if not rows:
+            return
+
+        existing, ambiguous = self.match(queryset, rows)
+        for name in ambiguous:
+            del rows[name]
+        self.stats['ambiguous'] += len(ambiguous)
+        changed = []
+        for name, values in rows.items():
+            obj = existing.get(name)
+            if obj is None:
+                continue
+            if any(getattr(obj, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(obj, field, value)
+                changed.append(obj)
+
+        created = model.objects.bulk_create([
+            model(name=name, **values, **defaults)
+            for name, values in rows.items() if name not in existing
+        ])
+        model.objects.bulk_update(changed, TENANT_FIELDS)
+        if created:
+            # bulk_create sends no post_save either, so keep the dashboard totals current
+            adjust_count(model, len(created))
+            if model is FreightCompany:
+                adjust_stats({(PROVIDER, self.saas_provider.pk): {'company_count': len(created)}})
+        if changed:
+            # bulk_update sends no post_save, so refresh cached profile snapshots here
+            for user_id in model.objects.filter(
+                pk__in=[obj.pk for obj in changed]
+            ).values_list('admin_profiles__user_id', flat=True):
+                if user_id:
+                    invalidate_profile(user_id)
+        label = model._meta.model_name
+        self.stats[f'{label}_created'] += len(created)
+        self.stats[f'{label}_updated'] += len(changed)
+
+    def link(self, records):
+        pairs = set()
+        for record in records:
+            company = (record.get('company') or '').strip()
+            customer = (record.get('customer') or '').strip()
+            if company and customer:
+                pairs.add((company, customer))
+            else:
+                self.stats['skipped'] += 1
+        if not pairs:
+            return
+
+        companies, ambiguous_companies = self.match(self.companies(), {company for company, _ in pairs})
+        customers, ambiguous_customers = self.match(self.customers(), {customer for _, customer in pairs})
+        resolved = []
+        for company, customer in pairs:
+            if company in ambiguous_companies or customer in ambiguous_customers:
+                self.stats['ambiguous'] += 1
+            elif company in companies and customer in customers:
+                resolved.append((companies[company].pk, customers[customer].pk))
+            else:
+                self.stats['skipped'] += 1
+
+        FreightCompanyCustomer.objects.bulk_create(
+            [FreightCompanyCustomer(freight_company_id=c, end_customer_id=e) for c, e in resolved],
+            ignore_conflicts=True
+        )
+        # Direct through-table inserts skip m2m_changed
+        invalidate_graph()
+        for company_id in {c for c, _ in resolved}:
+            invalidate_company(company_id)
+        # Which pairs were new is unknown with ignore_conflicts, so recount
+        refresh_stats(COMPANY, {c for c, _ in resolved})
+        refresh_stats(CUSTOMER, {e for _, e in resolved})
+        refresh_stats(PROVIDER, set(FreightCompany.objects.filter(
+            pk__in={c for c, _ in resolved}
+        ).values_list('saas_provider_id', flat=True)))
+        self.stats['links'] += len(resolved)
+
+
+def read_checkpoint(path, source):
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    return checkpoint.get('records', 0) if checkpoint.get('source') == source else 0
+
+
+def write_checkpoint(path, source, records):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'source': source, 'records': records}, f)
+    os.replace(tmp, path)
@@ -1,3 +1,167 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from end_customers.models import EndCustomer
+from core.models import UserProfile
+from major_clients.models import FreightCompany, FreightCompanyCustomer
+from .counters import get_counts, refresh_count
+from .models import SaaSProvider
+from .tenant_import import TenantImporter
+
+
+class TenantImporterTests(TestCase):
+    def setUp(self):
+        self.provider_a = SaaSProvider.objects.create(name='A', contact_email='a@example.com')
+        self.provider_b = SaaSProvider.objects.create(name='B', contact_email='b@example.com')
+        self.theirs = FreightCompany.objects.create(name='Acme', saas_provider=self.provider_b, email='b@acme.test')
+        self.their_customer = EndCustomer.objects.create(name='Shipper', email='b@shipper.test')
+        self.theirs.end_customers.add(self.their_customer)
+
+    def test_names_are_matched_within_the_importing_provider(self):
+        stats = TenantImporter(self.provider_a).run([
+            {'type': 'company', 'name': 'Acme', 'email': 'a@acme.test'},
+            {'type': 'customer', 'name': 'Shipper', 'email': 'a@shipper.test'},
+            {'type': 'link', 'company': 'Acme', 'customer': 'Shipper'},
+        ])
+
+        self.theirs.refresh_from_db()
+        self.their_customer.refresh_from_db()
+        self.assertEqual(self.theirs.email, 'b@acme.test')
+        self.assertEqual(self.their_customer.email, 'b@shipper.test')
+        self.assertEqual(list(self.theirs.end_customers.all()), [self.their_customer])
+
+        ours = FreightCompany.objects.get(name='Acme', saas_provider=self.provider_a)
+        our_customer = ours.end_customers.get()
+        self.assertNotEqual(our_customer, self.their_customer)
+        self.assertEqual(our_customer.email, 'a@shipper.test')
+        self.assertEqual(stats['links'], 1)
+
+    def test_ambiguous_names_are_rejected(self):
+        FreightCompany.objects.bulk_create([
+            FreightCompany(name='Twin', saas_provider=self.provider_a),
+            FreightCompany(name='Twin', saas_provider=self.provider_a),
+        ])
+        stats = TenantImporter(self.provider_a).run([
+            {'type': 'company', 'name': 'Twin', 'email': 'twin@example.com'},
+            {'type': 'customer', 'name': 'New Shipper'},
+            {'type': 'link', 'company': 'Twin', 'customer': 'New Shipper'},
+        ])
+
+        self.assertEqual(stats['ambiguous'], 2)
+        self.assertFalse(FreightCompany.objects.filter(name='Twin', email='twin@example.com').exists())
+        self.assertFalse(FreightCompanyCustomer.objects.filter(freight_company__name='Twin').exists())
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        provider = SaaSProvider.objects.create(name='Provider', contact_email='provider@example.com')
+        self.companies = FreightCompany.objects.bulk_create([
+            FreightCompany(name=f'Carrier {i}', saas_provider=provider) for i in range(7)
+        ])
+        customers = EndCustomer.objects.bulk_create([EndCustomer(name=f'Shipper {i}') for i in range(4)])
+        for i, company in enumerate(self.companies):
+            company.end_customers.add(*customers[:i % 5])
+        user = User.objects.create_user('provider')
+        UserProfile.objects.create(user=user, user_type=UserProfile.UserType.SAAS_PROVIDER)
+        self.client.force_login(user)
+
+    @mock.patch('superadmin.views.DASHBOARD_PAGE_SIZE', 3)
+    def test_pages_list_every_company_once_with_its_link_count(self):
+        rows, after, pages = [], None, 0
+        while True:
+            response = self.client.get(reverse('saas_admin:dashboard'), {'after': after} if after else {})
+            self.assertEqual(response.status_code, 200)
+            rows += [(company.pk, company.customer_count) for company in response.context['freight_companies']]
+            pages += 1
+            after = response.context['next_after']
+            if after is None:
+                break
+
+        self.assertEqual(pages, 3)
+        # What the dashboard counted per company before the rollups
+        expected = [(company.pk, company.end_customers.count()) for company in FreightCompany.objects.order_by('pk')]
+        self.assertEqual(rows, expected)
+        self.assertEqual(response.context['total_companies'], FreightCompany.objects.count())
+        self.assertEqual(response.context['total_customers'], EndCustomer.objects.count())
+
+    def test_only_the_first_page_is_cached(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory,
+        }}):
+            self.client.force_login(User.objects.get(username='provider'))
+            self.client.get(reverse('saas_admin:dashboard'))
+            entries = len(os.listdir(directory))
+            for company in self.companies:
+                response = self.client.get(reverse('saas_admin:dashboard'), {'after': company.pk})
+                self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(os.listdir(directory)), entries)
+
+
+class RowCountTests(TestCase):
+    def test_counts_follow_creates_and_deletes(self):
+        self.assertEqual(get_counts(EndCustomer), {EndCustomer: 0})
+        customers = [EndCustomer.objects.create(name=f'Shipper {i}') for i in range(3)]
+        customers[0].delete()
+        self.assertEqual(get_counts(EndCustomer)[EndCustomer], EndCustomer.objects.count())
+
+    def test_refresh_fixes_drift(self):
+        get_counts(EndCustomer)
+        # bulk_create sends no signals
+        EndCustomer.objects.bulk_create([EndCustomer(name='Shipper')])
+        self.assertEqual(get_counts(EndCustomer)[EndCustomer], 0)
+        self.assertEqual(refresh_count(EndCustomer), 1)
+        self.assertEqual(get_counts(EndCustomer)[EndCustomer], 1)
+
+
+class ChangelistTests(TestCase):
+    def setUp(self):
+        provider = SaaSProvider.objects.create(name='Provider', contact_email='provider@example.com')
+        self.companies = FreightCompany.objects.bulk_create([
+            FreightCompany(name=name, saas_provider=provider) for name in ('Acme Freight', 'Blue Lines', 'acme east')
+        ])
+        self.customers = EndCustomer.objects.bulk_create([EndCustomer(name=f'Shipper {i}') for i in range(3)])
+        self.companies[0].end_customers.add(*self.customers)
+        self.companies[1].end_customers.add(self.customers[0])
+        self.client.force_login(User.objects.create_superuser('root', 'root@example.com', 'secret'))
+
+    def changelist(self, model, **params):
+        url = reverse(f'saas_admin:saas_admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_company_changelist_matches_per_row_counts(self):
+        cl = self.changelist(FreightCompany)
+        self.assertEqual(cl.result_count, FreightCompany.objects.count())
+        self.assertEqual(
+            {company.pk: company.customer_count for company in cl.result_list},
+            {company.pk: company.end_customers.count() for company in FreightCompany.objects.all()}
+        )
+
+    def test_search_finds_the_same_rows_as_a_plain_filter(self):
+        cl = self.changelist(FreightCompany, q='ACME')
+        self.assertEqual(
+            sorted(company.pk for company in cl.result_list),
+            sorted(FreightCompany.objects.filter(name__icontains='acme').values_list('pk', flat=True))
+        )
+        self.assertEqual(cl.result_count, 2)
+
+    def test_customer_changelist_lists_each_customers_companies(self):
+        cl = self.changelist(EndCustomer)
+        self.assertEqual(cl.result_count, EndCustomer.objects.count())
+        listed = {
+            customer.pk: {company.name for company in customer.freight_companies.all()}
+            for customer in cl.result_list
+        }
+        links = FreightCompanyCustomer.objects.values_list('end_customer_id', 'freight_company__name')
+        expected = {customer.pk: set() for customer in self.customers}
+        for customer_id, name in links:
+            expected[customer_id].add(name)
+        self.assertEqual(listed, expected)
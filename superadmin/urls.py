@@ -8,6 +8,10 @@ urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     path('companies/', views.FreightCompanyListView.as_view(), name='freight_company_list'),
     path('companies/create/', views.FreightCompanyCreateView.as_view(), name='freight_company_create'),
+    path('import/', views.import_tenants, name='import_tenants'),
+    path('sql-stats/', views.sql_stats, name='sql_stats'),
+    path('sql-stats.json', views.sql_stats_json, name='sql_stats_json'),
     path('companies/<int:company_id>/end-customers/', views.end_customers_by_company, name='end_customers_by_company'),
+    path('export/<slug:dataset>/', views.export, name='export'),
     path('admin/', saas_admin_site.urls),
 ] 
\ No newline at end of file
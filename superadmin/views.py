@@ -1,11 +1,22 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, JsonResponse
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.generic import ListView, CreateView, DetailView
 from django.urls import reverse_lazy
 from major_clients.models import FreightCompany
 from end_customers.models import EndCustomer
-from core.models import UserProfile
+from core.models import Invitation, TenantStats, UserProfile
+from core.importing import iter_records
+from core.stats import get_stats
+from core import exports, instrumentation
+from core.fragments import DIRECTORY_VERSION_KEY, cached_fragment, render_fragment
+from .counters import get_counts
+from .forms import TenantImportForm
+from .tenant_import import TenantImporter
+
+DASHBOARD_PAGE_SIZE = 25
 
 def saas_admin_required(view_func):
     def wrapper(request, *args, **kwargs):
@@ -18,16 +29,39 @@ def saas_admin_required(view_func):
 @login_required
 @saas_admin_required
 def dashboard(request):
-    freight_companies = FreightCompany.objects.all()
-    end_customers = EndCustomer.objects.all()
-    
-    context = {
-        'freight_companies': freight_companies,
-        'end_customers': end_customers,
-        'total_companies': freight_companies.count(),
-        'total_customers': end_customers.count(),
-    }
-    return render(request, 'superadmin/dashboard.html', context)
+    # Keyset pagination: each page starts after the last id of the previous
+    # one, so deep pages cost the same as the first
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        after = 0
+
+    def get_context():
+        page = list(FreightCompany.objects.filter(id__gt=after).order_by('id')[:DASHBOARD_PAGE_SIZE + 1])
+        freight_companies = page[:DASHBOARD_PAGE_SIZE]
+        # One stats row per company instead of counting its links
+        stats = get_stats(TenantStats.TenantType.COMPANY, [company.id for company in freight_companies])
+        for company in freight_companies:
+            company.customer_count = stats[company.id].customer_count
+        counts = get_counts(FreightCompany, EndCustomer)
+        return {
+            'freight_companies': freight_companies,
+            'next_after': freight_companies[-1].id if len(page) > DASHBOARD_PAGE_SIZE else None,
+            'is_first_page': after == 0,
+            'total_companies': counts[FreightCompany],
+            'total_customers': counts[EndCustomer],
+        }
+
+    if after:
+        # Later pages are cheap keyset scans; caching one per cursor a client
+        # sends would let the cache grow without bound
+        content = render_fragment(request, 'superadmin/dashboard_content.html', get_context)
+    else:
+        content = cached_fragment(
+            request, 'directory:dashboard', DIRECTORY_VERSION_KEY,
+            'superadmin/dashboard_content.html', get_context
+        )
+    return render(request, 'superadmin/dashboard.html', {'content': content})
 
 class FreightCompanyListView(ListView):
     model = FreightCompany
@@ -58,3 +92,61 @@ def end_customers_by_company(request, company_id):
         'end_customers': end_customers,
     }
     return render(request, 'superadmin/end_customers_by_company.html', context)
+
+@login_required
+@saas_admin_required
+def export(request, dataset):
+    if dataset == 'companies':
+        queryset = FreightCompany.objects.all()
+        columns = exports.TENANT_COLUMNS + [('saas_provider', 'saas_provider__name')]
+    elif dataset == 'customers':
+        queryset = EndCustomer.objects.all()
+        columns = exports.TENANT_COLUMNS
+    elif dataset == 'staff':
+        queryset = UserProfile.objects.all()
+        columns = exports.STAFF_COLUMNS
+    elif dataset == 'invitations':
+        queryset = Invitation.objects.all()
+        columns = exports.INVITATION_COLUMNS
+    else:
+        raise Http404('Unknown export')
+    return exports.export_response(request, queryset, columns, dataset)
+
+@login_required
+@saas_admin_required
+def import_tenants(request):
+    if request.method == 'POST':
+        form = TenantImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            importer = TenantImporter(form.cleaned_data['saas_provider'])
+            stats = importer.run(iter_records(form.cleaned_data['file'], form.cleaned_data['format']))
+            summary = ', '.join(f'{key}: {value}' for key, value in sorted(stats.items()))
+            messages.success(request, f"Import finished. {summary}")
+            return redirect('saas_admin:dashboard')
+    else:
+        form = TenantImportForm()
+
+    return render(request, 'superadmin/import_tenants.html', {'form': form})
+
+@login_required
+@saas_admin_required
+def sql_stats(request):
+    if request.method == 'POST' and request.POST.get('action') == 'reset':
+        instrumentation.reset()
+        messages.success(request, "SQL statistics cleared.")
+        return redirect('saas_admin:sql_stats')
+
+    context = {
+        'views': instrumentation.snapshot(),
+        'sample_rate': settings.SQL_INSTRUMENTATION_SAMPLE_RATE,
+        'repeat_threshold': settings.SQL_INSTRUMENTATION_REPEAT_THRESHOLD,
+    }
+    return render(request, 'superadmin/sql_stats.html', context)
+
+@login_required
+@saas_admin_required
+def sql_stats_json(request):
+    return JsonResponse({
+        'sample_rate': settings.SQL_INSTRUMENTATION_SAMPLE_RATE,
+        'views': instrumentation.snapshot(),
+    })